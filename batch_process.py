@@ -3,7 +3,7 @@ import glob
 import shutil
 import sys
 from pdf_process_tools.process import run_pdf_processing
-from vector_utils import load_texts_from_output, build_faiss_index, model
+from vector_utils import load_texts_from_output, build_faiss_index, get_model, mark_index_source, save_embeddings
 import pickle
 import numpy as np
 import json
@@ -191,19 +191,22 @@ def build_vector_index(doc_output_dir):
         with open(os.path.join(index_dir, "texts.pkl"), 'wb') as f:
             pickle.dump(texts, f)
         
-        np.save(os.path.join(index_dir, "embeddings.npy"), embeddings)
+        save_embeddings(os.path.join(index_dir, "embeddings.npy"), embeddings)
         
         # 保存元数据
         metadata = {
             "num_texts": len(texts),
             "embedding_dim": embeddings.shape[1],
-            "model_path": getattr(model, 'model_name_or_path', "unknown"),
+            "model_path": getattr(get_model(), 'model_name_or_path', "unknown"),
             "created_at": str(pd.Timestamp.now()) if 'pd' in globals() else "unknown"
         }
         
         with open(os.path.join(index_dir, "metadata.json"), 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
+        # 记录索引对应的文本标识，检索时据此直接复用本索引
+        mark_index_source(doc_output_dir)
+        
         print(f"   ✅ 向量索引已保存: {len(texts)} 个文本片段")
         
     except Exception as e:
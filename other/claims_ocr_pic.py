@@ -1,27 +1,107 @@
 import os
+import functools
+import json
+import hashlib
+import numpy as np
 from PIL import Image
 from paddleocr import PaddleOCR
+from paddleocr.tools.infer.predict_system import sorted_boxes
+
+# 识别阶段每批文本行数：所有页面的文本行合并为一次识别调用，由该参数控制内部分批
+# CPU 上分批并不并行执行，取 1 可避免按大批次预分配推理内存
+REC_BATCH_NUM = 1
+
+# 识别置信度低于该值的文本行丢弃（与 PaddleOCR 默认的 drop_score 一致，批量识别时需自行过滤）
+DROP_SCORE = 0.5
+
+# 按图像内容缓存每页OCR文本（重跑同一文档时跳过检测与识别）；默认关闭（None），
+# 需要时设为绝对路径，例如 os.path.join(os.path.expanduser("~"), ".cache", "pdf_process_tools", "ocr_pages")
+OCR_CACHE_DIR = None
+
+# 影响识别结果的OCR设置，计入缓存键：设置变化后旧的缓存结果不再命中
+OCR_CACHE_SETTINGS = ("ch", "use_angle_cls", "sorted_boxes", DROP_SCORE)
+
+@functools.lru_cache(maxsize=None)
+def get_ocr():
+    """本进程共享的 PaddleOCR 实例，首次调用时才加载模型（origin_ocr / description_ocr0 同样经由此处获取）"""
+    return PaddleOCR(use_angle_cls=True, lang='ch', show_log=False, rec_batch_num=REC_BATCH_NUM)
+
+def ocr_cache_path(img):
+    """图像内容（像素 + 尺寸）与OCR设置的 blake2b 摘要对应的缓存文件路径，哈希远快于一次OCR"""
+    digest = hashlib.blake2b(np.ascontiguousarray(img).data, digest_size=16)
+    digest.update(str(img.shape).encode("utf-8"))
+    digest.update(repr(OCR_CACHE_SETTINGS).encode("utf-8"))
+    return os.path.join(os.path.abspath(OCR_CACHE_DIR), digest.hexdigest() + ".json")
+
+def batch_ocr_texts(ocr, images):
+    """
+    多页批量OCR：逐页只做检测，再把所有页面的文本行裁剪合并，一次 det=False 调用完成识别
+
+    注：PaddleOCR.ocr 仅在 det=False 时接受图片列表，检测无法跨页批量
+
+    命中 OCR_CACHE_DIR 缓存的页面直接读取结果，未命中的页面识别后写回缓存
+
+    Returns:
+        list: 每页的文本行列表（排序与置信度过滤同 ocr.ocr(img, cls=True)）
+    """
+    page_texts = [None] * len(images)
+    cache_paths = {}  # 未命中缓存的页序号 -> 缓存文件路径
+    if OCR_CACHE_DIR is not None:
+        os.makedirs(os.path.abspath(OCR_CACHE_DIR), exist_ok=True)
+        for idx, img in enumerate(images):
+            path = ocr_cache_path(img)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    page_texts[idx] = json.load(f)
+            else:
+                cache_paths[idx] = path
+
+    crops = []
+    line_counts = []
+    pending = [idx for idx, texts in enumerate(page_texts) if texts is None]
+    for idx in pending:
+        img = images[idx]
+        det_result = ocr.ocr(img, det=True, rec=False)
+        boxes = det_result[0] if det_result and det_result[0] else []
+        # 仅检测时返回的行框未排序，沿用 PaddleOCR 的 sorted_boxes 排序（同一行内按 x 自左而右）
+        boxes = sorted_boxes(np.array(boxes)) if len(boxes) else []
+        for box in boxes:
+            y0, x0 = max(int(box[:, 1].min()), 0), max(int(box[:, 0].min()), 0)
+            crops.append(img[y0:int(box[:, 1].max()), x0:int(box[:, 0].max())])
+        line_counts.append(len(boxes))
+
+    # 以嵌套列表传入：所有文本行作为同一张“图”的行列表，方向分类与识别各只调用一次，按 rec_batch_num 分批
+    rec_results = ocr.ocr([crops], det=False, cls=True)[0] if crops else []
+
+    start = 0
+    for idx, count in zip(pending, line_counts):
+        page_texts[idx] = [text for text, score in rec_results[start:start + count] if score >= DROP_SCORE]
+        start += count
+        if idx in cache_paths:
+            with open(cache_paths[idx], "w", encoding="utf-8") as f:
+                json.dump(page_texts[idx], f, ensure_ascii=False)
+    return page_texts
 
 def ocr_claims_with_paddleocr(claims_dir, output_dir, header_height=150, footer_height=200):
     os.makedirs(output_dir, exist_ok=True)
     pages = sorted([f for f in os.listdir(claims_dir) if f.endswith(".png")])
 
-    ocr = PaddleOCR(use_angle_cls=True, lang='ch')  # 初始化 OCR 模型
+    ocr = get_ocr()  # 获取共享的 OCR 模型
 
     full_text = []
 
+    # 先裁剪出所有页面的正文区域（去除页眉和页脚），再统一批量OCR
+    body_images = []
     for page in pages:
         page_path = os.path.join(claims_dir, page)
-        image = Image.open(page_path)
-        width, height = image.size
+        image = np.array(Image.open(page_path).convert("RGB"))
+        height = image.shape[0]
+        body_images.append(image[header_height:height - footer_height])
 
-        # 裁剪正文区域（去除页眉和页脚）
-        body_box = (0, header_height, width, height - footer_height)
-        body_image = image.crop(body_box)
+    page_lines = batch_ocr_texts(ocr, body_images)
 
-        # OCR 识别正文区域
-        result = ocr.ocr(np.array(body_image), cls=True)
-        page_text = "\n".join([line[1][0] for line in result[0]])  # 提取文字部分
+    for page, lines in zip(pages, page_lines):
+        page_text = "\n".join(lines)  # 提取文字部分
 
         # 保存单页结果
         txt_name = os.path.splitext(page)[0] + ".txt"
@@ -41,7 +121,6 @@ def ocr_claims_with_paddleocr(claims_dir, output_dir, header_height=150, footer_
 
 # 示例调用
 if __name__ == "__main__":
-    import numpy as np  # 必须引入
     claims_img_dir = r"/workspace/split_pdf/split_pages/CN218108941U/claims"   # 输入路径
     output_text_dir = r"/workspace/output/ocr/claims"                # 输出路径
     ocr_claims_with_paddleocr(claims_img_dir, output_text_dir)
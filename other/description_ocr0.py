@@ -1,17 +1,19 @@
 import os
 import re
 import fitz  # PyMuPDF
-from paddleocr import PaddleOCR
-from PIL import Image
 import cv2
 import numpy as np
+from claims_ocr_pic import get_ocr, batch_ocr_texts
 
-ocr = PaddleOCR(use_angle_cls=True, lang="ch", show_log=False)  # 移除 structure 参数
+# 每批渲染并OCR的页数：批内识别合并调用，批间逐批写出，内存只与批大小相关
+OCR_CHUNK_PAGES = 8
+
+# 专利段落编号，如 [0001]
+PARA_NUMBER_PATTERN = re.compile(r"\[(\d{4})\]")
 
 def restructure_paragraphs(text):
     """按专利格式重组段落"""
-    pattern = re.compile(r"\[(\d{4})\]")
-    matches = list(pattern.finditer(text))
+    matches = list(PARA_NUMBER_PATTERN.finditer(text))
 
     if not matches:
         return [text.strip()]
@@ -38,87 +40,108 @@ def restructure_paragraphs(text):
 
     return paragraphs
 
-def detect_tables(image_path):
+def detect_tables(img_bgr):
     """
     使用OpenCV检测表格区域（替代PaddleOCR的structure功能）
     返回表格区域的坐标列表
     """
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
     
     # 二值化
     thresh = cv2.adaptiveThreshold(
         ~gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, -10
     )
     
-    # 检测横线和竖线
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (50, 1))
-    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 50))
+    # 线条检测在半分辨率上进行：表格线缩小 2 倍后依旧清晰，形态学运算的像素量减为 1/4
+    # INTER_AREA 会把细线平均成灰色，取 >0 重新二值化，保证线条不丢
+    small = cv2.resize(thresh, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    _, small = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY)
+
+    # 检测横线和竖线（核长度随分辨率减半）
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 25))
     
-    horizontal_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    vertical_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+    horizontal_lines = cv2.morphologyEx(small, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+    vertical_lines = cv2.morphologyEx(small, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
     
-    # 合并横线和竖线
-    table_mask = cv2.addWeighted(horizontal_lines, 0.5, vertical_lines, 0.5, 0.0)
+    # 合并横线和竖线（轮廓只关心非零区域，按位或即可，无需加权）
+    table_mask = cv2.bitwise_or(horizontal_lines, vertical_lines)
     table_mask = cv2.dilate(table_mask, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)), iterations=1)
     
     # 查找轮廓
     contours, _ = cv2.findContours(table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # 过滤小区域，保留表格
+    # 过滤小区域，保留表格（坐标换算回原分辨率）
     table_areas = []
     for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
+        x, y, w, h = (v * 2 for v in cv2.boundingRect(contour))
         if w > 100 and h > 50:  # 过滤小区域
             table_areas.append((x, y, x + w, y + h))
     
     return table_areas
 
+def write_complete_paragraphs(f, pending_text, final=False):
+    """
+    写出 pending_text 中已完整的段落，返回尚未完整的剩余文本
+
+    段落以 [NNNN] 编号分隔：最后一个编号之后的内容可能延续到后续页面，留待下次处理；
+    final=True 时全部写出。切分位置均在编号处，结果与对整篇文本调用 restructure_paragraphs 一致
+    """
+    if final:
+        done, rest = pending_text, ""
+    else:
+        matches = list(PARA_NUMBER_PATTERN.finditer(pending_text))
+        # 至少两个编号时才能确定前面的段落已结束（只有编号前的文字时不能单独成段）
+        if len(matches) < 2:
+            return pending_text
+        cut = matches[-1].start()
+        done, rest = pending_text[:cut], pending_text[cut:]
+
+    for para in restructure_paragraphs(done):
+        f.write(para.strip() + "\n\n")
+    return rest
+
 def extract_text_and_tables(pdf_path, output_text_path, table_output_dir):
-    """提取PDF中的文本和表格"""
+    """提取PDF中的文本和表格（按 OCR_CHUNK_PAGES 页一批处理并写出，内存占用不随页数增长）"""
     os.makedirs(table_output_dir, exist_ok=True)
 
     doc = fitz.open(pdf_path)
-    results = []
-
-    for page_num in range(len(doc)):
-        print(f"正在处理第{page_num + 1}/{len(doc)}页")
-        page = doc.load_page(page_num)
-        text = page.get_text("text").strip()
-
-        # 生成高分辨率页面图像
-        pix = page.get_pixmap(dpi=300)
-        img_path = f"temp_page_{page_num + 1}.png"
-        pix.save(img_path)
-
-        # 1. 提取文本内容
-        ocr_result = ocr.ocr(img_path, cls=True)
-        lines = []
-        for line in ocr_result[0]:
-            if isinstance(line, list) and len(line) >= 2:
-                lines.append(line[1][0])
-        page_text = "\n".join(lines)
-        results.append(page_text)
-
-        # 2. 使用OpenCV检测并提取表格区域
-        table_areas = detect_tables(img_path)
-        for i, (x1, y1, x2, y2) in enumerate(table_areas):
-            img = Image.open(img_path)
-            table_img = img.crop((x1, y1, x2, y2))
-            table_path = os.path.join(table_output_dir, f"page_{page_num + 1}_table_{i + 1}.jpg")
-            table_img.save(table_path)
-
-        print(f"第{page_num + 1}页：提取到表格 {len(table_areas)} 个")
-
-    # 合并所有页面文本并结构化处理
-    full_text = "\n".join(results)
-    paragraphs = restructure_paragraphs(full_text)
-
-    # 保存结果
+    total_pages = len(doc)
+    pending_text = None  # 尚未写出的文本（末尾段落可能跨页）
+
     with open(output_text_path, "w", encoding="utf-8") as f:
-        for para in paragraphs:
-            f.write(para.strip() + "\n\n")
+        for chunk_start in range(0, total_pages, OCR_CHUNK_PAGES):
+            page_images = []  # 本批页面图像，批量OCR后即释放
+
+            for page_num in range(chunk_start, min(chunk_start + OCR_CHUNK_PAGES, total_pages)):
+                print(f"正在处理第{page_num + 1}/{total_pages}页")
+                page = doc.load_page(page_num)
+
+                # 生成高分辨率页面图像（直接由像素构造数组，不再写临时文件再读回）
+                pix = page.get_pixmap(dpi=300, alpha=False)
+                img_rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+
+                # 1. 文本内容留待本批页面渲染完后批量OCR（与原先读入的图片文件一致，传 BGR）
+                page_images.append(img_bgr)
+
+                # 2. 使用OpenCV检测并提取表格区域
+                table_areas = detect_tables(img_bgr)
+                for i, (x1, y1, x2, y2) in enumerate(table_areas):
+                    table_path = os.path.join(table_output_dir, f"page_{page_num + 1}_table_{i + 1}.jpg")
+                    cv2.imwrite(table_path, img_bgr[y1:y2, x1:x2])
+
+                print(f"第{page_num + 1}页：提取到表格 {len(table_areas)} 个")
+
+            # 各页文本以换行相接，写出已完整的段落
+            for lines in batch_ocr_texts(get_ocr(), page_images):
+                page_text = "\n".join(lines)
+                pending_text = page_text if pending_text is None else pending_text + "\n" + page_text
+            pending_text = write_complete_paragraphs(f, pending_text)
+
+        write_complete_paragraphs(f, pending_text or "", final=True)
 
+    doc.close()
     print(f"\n[🎉] 文本与表格提取完成！文本输出：{output_text_path}，表格图片保存目录：{table_output_dir}")
 
 # 示例用法
@@ -1,12 +1,14 @@
 import fitz  # PyMuPDF
-from paddleocr import PaddleOCR
-
-# 初始化PaddleOCR
-ocr = PaddleOCR(use_angle_cls=True, lang="ch")  # 可以根据实际需求调整语言参数
+import numpy as np
+from claims_ocr_pic import get_ocr, batch_ocr_texts
 
 def extract_text_from_pdf(pdf_path, output_path):
+    """
+    文字型页面直接取文本层；图片型页面先只渲染为内存数组，全部页面扫描完后一次批量OCR再按页回填
+    """
     doc = fitz.open(pdf_path)
     results = []
+    ocr_pages = []  # 图片型页面 (页序号, 图像)，全部收集后批量OCR
 
     for page_num in range(len(doc)):
         print(f"正在处理第{page_num + 1}页")
@@ -16,19 +18,23 @@ def extract_text_from_pdf(pdf_path, output_path):
         text = page.get_text("text").strip()
         if not text:
             # 如果提取到的文本为空，则认为是图片型PDF，进行OCR识别
-            pix = page.get_pixmap()  # 获取当前页作为图片
-            img_path = f"temp_page_{page_num + 1}.png"
-            pix.save(img_path)
-            ocr_result = ocr.ocr(img_path, cls=True)
-            
-            # 解析OCR结果
-            text = "\n".join([line[1][0] for line in ocr_result[0]])
+            pix = page.get_pixmap(alpha=False)  # 获取当前页作为图片
+            img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            ocr_pages.append((page_num, img))
             print(f"第{page_num + 1}页是图片型PDF")
         else:
             print(f"第{page_num + 1}页是文字型PDF")
 
         results.append(text)
 
+    doc.close()
+
+    # 所有图片型页面一起OCR，回填到对应页
+    if ocr_pages:
+        page_lines = batch_ocr_texts(get_ocr(), [img for _, img in ocr_pages])
+        for (page_num, _), lines in zip(ocr_pages, page_lines):
+            results[page_num] = "\n".join(lines)
+
     # 将结果保存到文件
     with open(output_path, "w", encoding='utf-8') as f:
         for result in results:
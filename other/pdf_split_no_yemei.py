@@ -1,4 +1,5 @@
 import os
+import hashlib
 import fitz  # PyMuPDF
 from pdf2image import convert_from_path
 from PIL import Image
@@ -19,11 +20,33 @@ FOOTER_HEIGHT_PX = 200
 DPI = 200
 POINTS_PER_INCH = 72
 
+# 页眉识别区域的最大高度与逐步扩大的步长（按 DPI 计的像素），只渲染页面顶部这一条
+HEADER_SCAN_MAX_PX = 500
+HEADER_SCAN_STEP_PX = 100
+
+# 页眉分类渲染用的分辨率：页眉为大号中文字，100 DPI 即可稳定识别，像素量仅为 DPI 的 1/4
+# 扫描区域的物理范围不变（像素常量按比例换算）；个别小字号页眉识别不稳时可调到 150
+HEADER_OCR_DPI = 100
+
+# 页眉区域OCR结果缓存：图像内容摘要 -> 识别文本（版式相同的页眉条只识别一次）
+_HEADER_OCR_CACHE = {}
+
 def px_to_pt(px, dpi=DPI):
     """将像素值转换为点值(1点=1/72英寸)"""
     return px * POINTS_PER_INCH / dpi
 
-def dynamic_extract_header(image, max_height=500, step=100, lang='chi_sim'):
+def ocr_header_region(region, lang='chi_sim'):
+    """识别页眉区域文本，按图像内容摘要缓存结果"""
+    digest = hashlib.blake2b(region.tobytes(), digest_size=16)
+    digest.update(f"{region.size}:{lang}".encode("utf-8"))
+    key = digest.hexdigest()
+    ocr_text = _HEADER_OCR_CACHE.get(key)
+    if ocr_text is None:
+        ocr_text = pytesseract.image_to_string(region, lang=lang).strip().replace("\n", "").replace(" ", "")
+        _HEADER_OCR_CACHE[key] = ocr_text
+    return ocr_text
+
+def dynamic_extract_header(image, max_height=HEADER_SCAN_MAX_PX, step=HEADER_SCAN_STEP_PX, lang='chi_sim'):
     """基于 OCR 文本逐字符扫描关键词集，优先返回最先出现的匹配章节"""
     width, height = image.size
     final_text = ""
@@ -31,7 +54,7 @@ def dynamic_extract_header(image, max_height=500, step=100, lang='chi_sim'):
     for h in range(step, max_height + step, step):
         crop_box = (0, 0, width, min(h, height))
         region = image.crop(crop_box)
-        ocr_text = pytesseract.image_to_string(region, lang=lang).strip().replace("\n", "").replace(" ", "")
+        ocr_text = ocr_header_region(region, lang=lang)
         final_text = ocr_text
 
         # 记录每个关键词在文本中的位置
@@ -44,6 +67,9 @@ def dynamic_extract_header(image, max_height=500, step=100, lang='chi_sim'):
                     keyword_hits.append((idx, kw, section))
 
         if not keyword_hits:
+            # 裁剪区域已覆盖整张图像时，更大的 h 只会重复同一区域
+            if h >= height:
+                break
             continue
 
         # 按关键词首次出现位置排序
@@ -98,10 +124,20 @@ def split_pdf_by_dynamic_header(pdf_path, output_root="split_pdfs"):
 
     for idx in range(total_pages):
         page = pdf_document.load_page(idx)
-        pix = page.get_pixmap(dpi=DPI)
+        # 只渲染页眉识别需要的顶部区域
+        rect = page.rect
+        header_clip = fitz.Rect(rect.x0, rect.y0, rect.x1, min(rect.y1, rect.y0 + px_to_pt(HEADER_SCAN_MAX_PX)))
+        pix = page.get_pixmap(dpi=HEADER_OCR_DPI, clip=header_clip, alpha=False)
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        pix = None  # Image.frombytes 已复制像素，立即释放 pixmap
         
-        section, ocr_text = dynamic_extract_header(img)
+        section, ocr_text = dynamic_extract_header(
+            img,
+            max_height=HEADER_SCAN_MAX_PX * HEADER_OCR_DPI // DPI,
+            step=HEADER_SCAN_STEP_PX * HEADER_OCR_DPI // DPI,
+        )
+        img.close()
+        img = None
 
         # 日志记录
         log_entry = f"第 {idx + 1} 页 - 匹配章节: {section}\nOCR结果:\n{ocr_text}\n{'-' * 40}\n"
@@ -130,13 +166,11 @@ def split_pdf_by_dynamic_header(pdf_path, output_root="split_pdfs"):
 
             new_pdf = fitz.open()
             
-            for page_num in range(start, end + 1):
-                new_pdf.insert_pdf(pdf_document, from_page=page_num, to_page=page_num)
-                
-                if page_num != start:  # 当前章节第一页不裁剪
-                    new_page = new_pdf[-1]
-                    new_rect = crop_page_content(new_page)
-                    new_page.set_cropbox(new_rect)
+            # 整个区间一次插入，再对除第一页外的页面裁剪页眉页脚
+            new_pdf.insert_pdf(pdf_document, from_page=start, to_page=end)
+            for new_page in new_pdf.pages(1):  # 当前章节第一页不裁剪
+                new_rect = crop_page_content(new_page)
+                new_page.set_cropbox(new_rect)
 
             output_filename = f"pages_{start+1}-{end+1}.pdf"
             if len(ranges) == 1:
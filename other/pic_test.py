@@ -1,15 +1,51 @@
 import os
 import re
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance
 from paddleocr import PaddleOCR, PPStructure
 import fitz  # PyMuPDF
 
+# 渲染 / 结构分析 / OCR 三个阶段之间的队列容量
+PIPELINE_QUEUE_SIZE = 4
+
+# 后台写图线程数：图片/表格裁剪的 PNG 编码与写盘不阻塞 OCR 阶段
+IMAGE_WRITER_WORKERS = 2
+
+# 页面渲染缩放倍数（相对 72 DPI）
+TEXT_PAGE_ZOOM = 2.0
+IMAGE_PAGE_ZOOM = 3.0
+
+# 逐行调试输出走 logging：debug=False 时 logger.debug 在级别判断处即返回，热循环中无需 if 分支
+logger = logging.getLogger(__name__)
+
+# 段落处理用到的正则，模块加载时编译一次
+SOFT_BREAK_DASH_PATTERN = re.compile(r'-\s+')
+CJK_SPACE_PATTERN = re.compile(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])')
+BRACKET_LINE_PATTERN = re.compile(r'^[\[\(\【（［]+.*\d+.*[\]）\】］]*')
+PARA_NUMBER_PATTERN = re.compile(
+    r'^('
+    r'[\[\(\【（\［]+\d+[\]）\】］]*'  # 有前括号
+    r'|'                             # 或 
+    r'\d+[\]）\】\］]+'               # 有后括号
+    r')'
+    r'[\.\。]?'          # 可选结束符
+    r'\s*'               # 后续空格
+)
+
+# 3x3 高斯去噪的一维核（与 GaussianBlur((3, 3), 0) 相同），按行/列分离卷积
+GAUSSIAN_KERNEL_3 = cv2.getGaussianKernel(3, 0)
+
+# PIL ImageFilter.SMOOTH 的卷积核，用于以 OpenCV 实现锐化
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
 def fix_chinese_soft_breaks(s):
     """修复中文换行导致的拆词问题"""
-    s = re.sub(r'-\s+', '', s)
-    s = re.sub(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])', '', s)
+    s = SOFT_BREAK_DASH_PATTERN.sub('', s)
+    s = CJK_SPACE_PATTERN.sub('', s)
     return s
 
 def preprocess_image(img):
@@ -22,58 +58,47 @@ def preprocess_image(img):
     
     # 图片增强
     # 1. 高斯去噪
-    denoised = cv2.GaussianBlur(gray, (3, 3), 0)
-    
-    # 2. 对比度增强
-    pil_img = Image.fromarray(denoised)
-    enhancer = ImageEnhance.Contrast(pil_img)
-    enhanced = enhancer.enhance(1.5)  # 增强对比度
+    denoised = cv2.sepFilter2D(gray, -1, GAUSSIAN_KERNEL_3, GAUSSIAN_KERNEL_3)
     
-    # 3. 锐化
-    sharpness_enhancer = ImageEnhance.Sharpness(enhanced)
-    sharpened = sharpness_enhancer.enhance(1.2)
+    # 2. 对比度增强（等价于 ImageEnhance.Contrast(1.5)：以灰度均值为中心拉伸）
+    mean = int(denoised.mean() + 0.5)
+    enhanced = cv2.addWeighted(denoised, 1.5, denoised, 0, -0.5 * mean)
     
-    # 转换回opencv格式
-    processed_img = np.array(sharpened)
+    # 3. 锐化（等价于 ImageEnhance.Sharpness(1.2)：与 PIL SMOOTH 平滑图做外插）
+    smoothed = cv2.filter2D(enhanced, -1, SMOOTH_KERNEL)
+    processed_img = cv2.addWeighted(enhanced, 1.2, smoothed, -0.2, 0)
     
     return processed_img
 
-def process_text_with_paragraphs(text_lines, debug=False):
-    """修改版：仅处理带括号的编号"""
-    text_output = []
-    current_para = []
-    merged_lines = []
+def order_by_y(items, ys):
+    """按 y 坐标稳定排序：一次 numpy argsort，代替逐元素调用 Python key 函数"""
+    order = np.argsort(np.asarray(ys, dtype=np.float32), kind='stable')
+    return [items[i] for i in order]
 
-    # 第一阶段：智能合并被拆分的段落行（保持原逻辑）
-    buffer = ""
+def merge_bracket_lines(text_lines):
+    """第一阶段：智能合并被拆分的段落行，逐条产出合并后的行"""
+    buffer_parts = []  # 当前合并行的片段，到边界时再一次性 join
     for line in (l.strip() for l in text_lines if l.strip()):
         # 仅检测带括号的编号作为新段落起始
-        if re.match(r'^[\[\(\【（［]+.*\d+.*[\]）\】］]*', line):  # 修改行合并条件
-            if buffer:
-                merged_lines.append(buffer)
-                buffer = ""
-        buffer = f"{buffer} {line}".strip() if buffer else line
-    
-    if buffer:
-        merged_lines.append(buffer)
+        if BRACKET_LINE_PATTERN.match(line):  # 修改行合并条件
+            if buffer_parts:
+                yield " ".join(buffer_parts)
+                buffer_parts = []
+        buffer_parts.append(line)
+    
+    if buffer_parts:
+        yield " ".join(buffer_parts)
 
-    # 第二阶段：精确匹配带括号的编号
-    para_pattern = re.compile(
-        r'^('
-        r'[\[\(\【（\［]+\d+[\]）\】］]*'  # 有前括号
-        r'|'                             # 或 
-        r'\d+[\]）\】\］]+'               # 有后括号
-        r')'
-        r'[\.\。]?'          # 可选结束符
-        r'\s*'               # 后续空格
-    )
+def iter_paragraphs(text_lines):
+    """修改版：仅处理带括号的编号；段落一旦闭合即产出，便于流式写盘"""
+    current_para = []
 
-    for line in merged_lines:
-        if debug:
-            print(f"处理合并行: {line[:60]}...")
+    # 第二阶段：精确匹配带括号的编号（PARA_NUMBER_PATTERN）
+    for line in merge_bracket_lines(text_lines):
+        logger.debug("处理合并行: %s...", line[:60])
 
         # 仅匹配带括号的编号
-        match = para_pattern.match(line)
+        match = PARA_NUMBER_PATTERN.match(line)
         if match:
             # 计算编号部分长度（保持原逻辑）
             match_len = match.end()
@@ -81,8 +106,7 @@ def process_text_with_paragraphs(text_lines, debug=False):
 
             # 保存上一个段落（保持原逻辑）
             if current_para:
-                joined = fix_chinese_soft_breaks(" ".join(current_para))
-                text_output.append(joined)
+                yield fix_chinese_soft_breaks(" ".join(current_para))
                 current_para = []
             
             if remaining:
@@ -92,20 +116,113 @@ def process_text_with_paragraphs(text_lines, debug=False):
             if current_para:
                 current_para.append(line)
             else:
-                cleaned = fix_chinese_soft_breaks(line)
-                text_output.append(cleaned)
+                yield fix_chinese_soft_breaks(line)
 
     # 处理最后一段（保持原逻辑）
     if current_para:
-        joined = fix_chinese_soft_breaks(" ".join(current_para))
-        text_output.append(joined)
+        yield fix_chinese_soft_breaks(" ".join(current_para))
+
+def process_text_with_paragraphs(text_lines):
+    """修改版：仅处理带括号的编号（返回段落列表）"""
+    return list(iter_paragraphs(text_lines))
+
+def render_page(pdf_document, page_num):
+    """将PDF页面渲染为高分辨率BGR图像"""
+    page = pdf_document[page_num]
+    
+    # 转换为高分辨率图片：有文本层的页面 2 倍缩放已足够OCR，纯扫描页保留 3 倍
+    zoom = TEXT_PAGE_ZOOM if page.get_text("text").strip() else IMAGE_PAGE_ZOOM
+    mat = fitz.Matrix(zoom, zoom)
+    pix = page.get_pixmap(matrix=mat, alpha=False)
+    
+    # 直接读取像素缓冲区转为numpy数组，省去PNG编码/解码
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
 
-    return text_output
+def analyze_structure(structure_engine, original_img):
+    """
+    PPStructure结构化分析
+    
+    Returns:
+        结构分析结果，失败时为 None
+    """
+    print("🔬 尝试PPStructure结构化分析...")
+    try:
+        return structure_engine(original_img)
+    except Exception as e:
+        print(f"⚠️ PPStructure分析失败: {str(e)}")
+        return None
+
+def ocr_fallback(ocr_engine, processed_img):
+    """
+    纯OCR模式（整页检测 + 识别），返回置信度过滤后的文本行
+    
+    回退恰好发生在 PPStructure 的结果不可信时，因此不复用其行框，整页重新检测以找回其漏检的文字
+    
+    注：PaddleOCR.ocr 仅在 det=False 时接受图片列表，整页检测+识别无法跨页批量调用；
+    跨页并行由 extract_image_pdf_enhanced 的流水线完成，识别阶段的批量由 rec_batch_num 控制
+    """
+    lines = []
+    try:
+        # 使用预处理后的图片进行OCR
+        ocr_result = ocr_engine.ocr(processed_img, cls=True)
+        
+        if ocr_result and ocr_result[0]:
+            # 按照y坐标排序OCR结果
+            ocr_lines = order_by_y(ocr_result[0], [line[0][0][1] for line in ocr_result[0]])
+            
+            for line in ocr_lines:
+                text = line[1][0]
+                confidence = line[1][1]
+                
+                # 置信度过滤
+                if confidence > 0.6:
+                    lines.append(text)
+                    logger.debug("  OCR: %s (置信度: %.2f)", text, confidence)
+        else:
+            print("  ⚠️ OCR返回空结果")
+    
+    except Exception as e:
+        print(f"❌ OCR处理失败: {str(e)}")
+    
+    return lines
+
+def _run_stage(work, in_queue, out_queue):
+    """
+    流水线中间阶段：从 in_queue 取任务处理后放入 out_queue，收到 None 时向下游转发并退出
+
+    上游传来的或本阶段抛出的异常对象放入 out_queue 交给下游，由消费方重新抛出
+    """
+    try:
+        while True:
+            item = in_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                out_queue.put(item)
+                break
+            out_queue.put(work(item))
+    except Exception as e:
+        out_queue.put(e)
+    finally:
+        out_queue.put(None)
+
+def _configure_debug_logging(debug):
+    """按 debug 开关设置逐行调试日志的级别（首次调用时挂一个只输出消息本身的控制台 handler）"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
 def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
     """
     增强版图片型PDF处理器
     
+    渲染、结构分析、OCR 分三个线程流水执行：
+    第 N 页做 OCR 时，第 N+1 页已在渲染/分析中
+    
     Args:
         pdf_path: PDF文件路径
         output_dir: 输出目录
@@ -113,6 +230,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
     """
     
     print(f"🖼️ 开始处理图片型PDF: {os.path.basename(pdf_path)}")
+    _configure_debug_logging(debug)
     
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
@@ -146,7 +264,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
         ocr_model_dir=None
     )
     
-    # 打开PDF
+    # 打开PDF（仅由渲染线程访问）
     pdf_document = fitz.open(pdf_path)
     total_pages = pdf_document.page_count
     
@@ -156,44 +274,56 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
     
     print(f"📖 PDF总页数: {total_pages}")
     
-    for page_num in range(total_pages):
-        print(f"\n--- 📄 处理第 {page_num + 1}/{total_pages} 页 ---")
-        
-        page = pdf_document[page_num]
-        
-        # 转换为高分辨率图片
-        mat = fitz.Matrix(3.0, 3.0)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
+    q_render = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    q_struct = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    
+    # 阶段A：逐页渲染
+    def render_all():
+        try:
+            for page_num in range(total_pages):
+                q_render.put((page_num, render_page(pdf_document, page_num)))
+        except Exception as e:
+            q_render.put(e)  # 渲染失败不能当作文档结束，交给消费方抛出
+        finally:
+            q_render.put(None)
+    
+    # 阶段B：结构分析（预处理仅在需要OCR回退时才做）
+    def structure_one(item):
+        page_num, original_img = item
+        return page_num, original_img, analyze_structure(structure_engine, original_img)
+    
+    render_thread = threading.Thread(target=render_all, daemon=True)
+    struct_thread = threading.Thread(target=_run_stage, args=(structure_one, q_render, q_struct), daemon=True)
+    render_thread.start()
+    struct_thread.start()
+    
+    # 每页图像均为新分配的数组，裁剪视图交给写盘线程后不会被覆盖，无需拷贝
+    image_writer = ThreadPoolExecutor(max_workers=IMAGE_WRITER_WORKERS)
+    
+    # 阶段C（当前线程）：解析版面结果、保存图表、必要时OCR，按页序消费
+    while True:
+        stage_result = q_struct.get()
+        if stage_result is None:
+            break
+        if isinstance(stage_result, Exception):
+            raise stage_result
+        page_num, original_img, structure_result = stage_result
         
-        # 转换为numpy数组
-        nparr = np.frombuffer(img_data, np.uint8)
-        original_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        print(f"\n--- 📄 处理第 {page_num + 1}/{total_pages} 页 ---")
         
         if debug:
             debug_img_path = os.path.join(debug_dir, f"page_{page_num+1}_original.png")
-            cv2.imwrite(debug_img_path, original_img)
+            image_writer.submit(cv2.imwrite, debug_img_path, original_img)
             print(f"🔍 原始图片已保存: {debug_img_path}")
         
-        # 图片预处理
-        processed_img = preprocess_image(original_img)
-        
-        if debug:
-            debug_processed_path = os.path.join(debug_dir, f"page_{page_num+1}_processed.png")
-            cv2.imwrite(debug_processed_path, processed_img)
-            print(f"🔍 预处理图片已保存: {debug_processed_path}")
-        
         page_text_lines = []
         structure_success = False
         
-        # 方法1: 尝试使用PPStructure进行结构化分析
-        print("🔬 尝试PPStructure结构化分析...")
+        # 方法1: 使用PPStructure结构化分析结果
         try:
-            structure_result = structure_engine(original_img)
-            
             if structure_result:
                 # 按y坐标排序，保证阅读顺序
-                structure_result.sort(key=lambda x: x['bbox'][1])
+                structure_result = order_by_y(structure_result, [x['bbox'][1] for x in structure_result])
                 
                 for item in structure_result:
                     bbox = item['bbox']
@@ -228,7 +358,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
                             cropped_img = original_img[y0:y1, x0:x1]
                             img_name = f"page{page_num+1}_img{img_counter}.png"
                             img_path = os.path.join(img_dir, img_name)
-                            cv2.imwrite(img_path, cropped_img)
+                            image_writer.submit(cv2.imwrite, img_path, cropped_img)
                             
                             # 在文本中插入图片标记
                             page_text_lines.append(f"[IMG_{img_counter}]")
@@ -247,7 +377,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
                             cropped_table = original_img[y0:y1, x0:x1]
                             table_name = f"page{page_num+1}_table{table_counter}.png"
                             table_path = os.path.join(img_dir, table_name)
-                            cv2.imwrite(table_path, cropped_table)
+                            image_writer.submit(cv2.imwrite, table_path, cropped_table)
                             
                             # 在文本中插入表格标记
                             page_text_lines.append(f"[TABLE_{table_counter}]")
@@ -259,28 +389,15 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
         # 方法2: 如果PPStructure没有成功提取文本，使用纯OCR
         if not structure_success:
             print("🔤 使用纯OCR模式...")
-            try:
-                # 使用预处理后的图片进行OCR
-                ocr_result = ocr_engine.ocr(processed_img, cls=True)
-                
-                if ocr_result and ocr_result[0]:
-                    # 按照y坐标排序OCR结果
-                    ocr_lines = sorted(ocr_result[0], key=lambda x: x[0][0][1])
-                    
-                    for line in ocr_lines:
-                        text = line[1][0]
-                        confidence = line[1][1]
-                        
-                        # 置信度过滤
-                        if confidence > 0.6:
-                            page_text_lines.append(text)
-                            if debug:
-                                print(f"  OCR: {text} (置信度: {confidence:.2f})")
-                else:
-                    print("  ⚠️ OCR返回空结果")
+            # 图片预处理（只有OCR回退需要，结构分析成功的页面跳过）
+            processed_img = preprocess_image(original_img)
+            
+            if debug:
+                debug_processed_path = os.path.join(debug_dir, f"page_{page_num+1}_processed.png")
+                image_writer.submit(cv2.imwrite, debug_processed_path, processed_img)
+                print(f"🔍 预处理图片已保存: {debug_processed_path}")
             
-            except Exception as e:
-                print(f"❌ OCR处理失败: {str(e)}")
+            page_text_lines.extend(ocr_fallback(ocr_engine, processed_img))
         
         # 显示页面提取的文本预览
         if page_text_lines:
@@ -291,6 +408,9 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
         else:
             print("  ⚠️ 本页未提取到文本")
     
+    image_writer.shutdown(wait=True)
+    render_thread.join()
+    struct_thread.join()
     pdf_document.close()
     
     # 统一处理所有文本，应用段落识别逻辑
@@ -304,12 +424,15 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
             print(f"  ... 还有 {len(all_text_lines)-10} 行")
     
     # 处理文本并识别段落
-    text_output = process_text_with_paragraphs(all_text_lines, debug=debug)
-    
-    # 写入文本文件
+    # 写入文本文件：段落闭合即写出，不在内存中保留完整段落列表
     text_file = os.path.join(output_dir, "text.txt")
+    paragraph_count = 0
     with open(text_file, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(text_output))  # 段落间用双换行分隔
+        for paragraph in iter_paragraphs(all_text_lines):
+            if paragraph_count:
+                f.write("\n\n")  # 段落间用双换行分隔
+            f.write(paragraph)
+            paragraph_count += 1
     
     # 同时保存原始提取的文本（调试用）
     if debug:
@@ -322,7 +445,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
     print(f"\n🎉 图片型PDF处理完成！")
     print(f"   📄 总页数: {total_pages}")
     print(f"   📝 原始文本行数: {len(all_text_lines)}")
-    print(f"   📝 处理后段落数: {len(text_output)}")
+    print(f"   📝 处理后段落数: {paragraph_count}")
     print(f"   📷 图片数: {img_counter}")
     print(f"   📊 表格数: {table_counter}")
     print(f"   📁 输出目录: {output_dir}")
@@ -333,7 +456,7 @@ def extract_image_pdf_enhanced(pdf_path, output_dir, debug=True):
     return {
         'pages': total_pages,
         'raw_lines': len(all_text_lines),
-        'paragraphs': len(text_output),
+        'paragraphs': paragraph_count,
         'images': img_counter,
         'tables': table_counter
     }
@@ -1,60 +1,63 @@
 import fitz
 import os
-from collections import defaultdict
+import numpy as np
 
-def analyze_header_footer_height(pdf_path, sample_pages=10):
+# 扫描件样本页常触发 MuPDF 的告警输出，关闭以免大量 stderr 写入拖慢循环
+fitz.TOOLS.mupdf_display_errors(False)
+
+def most_common_span(spans):
+    """
+    返回出现次数最多的 (y0_percent, y1_percent)，次数相同时取最先出现的一组
+
+    Args:
+        spans: 形状为 (N, 2) 的数组，N 可为 0
+    """
+    if len(spans) == 0:
+        return None
+    unique_spans, first_index, counts = np.unique(spans, axis=0, return_index=True, return_counts=True)
+    # 先比次数，再比首次出现位置（与按出现顺序插入字典后稳定排序的结果一致）
+    best = np.lexsort((first_index, -counts))[0]
+    return unique_spans[best]
+
+
+def analyze_header_footer_height(pdf_path, sample_pages=20):
     """分析PDF文件，确定页眉和页脚区域的高度"""
     doc = fitz.open(pdf_path)
 
     # 样本页数
     total_pages = min(sample_pages, doc.page_count)
 
-    # 用于存储每页不同Y坐标处的文本出现频率
-    header_text_positions = defaultdict(int)
-    footer_text_positions = defaultdict(int)
+    # 每页文本块顶部/底部Y坐标占页高的比例，逐页收集为数组后统一统计
+    page_spans = []
 
     for page_num in range(total_pages):
         page = doc.load_page(page_num)
-        page_height = page.rect.height
+        inv_height = 1.0 / page.rect.height
 
-        # 获取页面上的所有文本块
-        text_blocks = page.get_text("blocks")
+        # 获取页面上的所有文本块（x0, y0, x1, y1, text, ...），只取 y0、y1
+        textpage = page.get_textpage()
+        text_blocks = textpage.extractBLOCKS()
+        textpage = None
+        if text_blocks:
+            page_spans.append(np.array([(b[1], b[3]) for b in text_blocks], dtype=np.float64) * inv_height)
 
-        for b in text_blocks:
-            bbox = b[:4]  # 块的边界框：x0, y0, x1, y1
-            text = b[4]  # 块中的文本
-
-            # 计算文本块顶部和底部的Y坐标百分比
-            y0_percent = bbox[1] / page_height
-            y1_percent = bbox[3] / page_height
+    doc.close()
 
-            # 页眉区域（页面顶部）
-            if y0_percent < 0.2:  # 只考虑页面顶部20%的区域
-                header_text_positions[(y0_percent, y1_percent)] += 1
+    spans = np.concatenate(page_spans) if page_spans else np.empty((0, 2))
 
-            # 页脚区域（页面底部）
-            if y1_percent > 0.8:  # 只考虑页面底部20%的区域
-                footer_text_positions[(y0_percent, y1_percent)] += 1
-
-    doc.close()
+    # 页眉区域只考虑页面顶部20%，页脚区域只考虑页面底部20%；取最常出现的位置
+    header_span = most_common_span(spans[spans[:, 0] < 0.2])
+    footer_span = most_common_span(spans[spans[:, 1] > 0.8])
 
     # 确定页眉高度
     header_height = 0.0
-    if header_text_positions:
-        # 按出现频率排序
-        sorted_header_positions = sorted(header_text_positions.items(),
-                                         key=lambda x: x[1], reverse=True)
-        # 取最常出现的位置作为页眉区域
-        header_y0, header_y1 = sorted_header_positions[0][0]
-        header_height = header_y1 - header_y0
+    if header_span is not None:
+        header_height = float(header_span[1] - header_span[0])
 
     # 确定页脚高度
     footer_height = 0.0
-    if footer_text_positions:
-        sorted_footer_positions = sorted(footer_text_positions.items(),
-                                         key=lambda x: x[1], reverse=True)
-        footer_y0, footer_y1 = sorted_footer_positions[0][0]
-        footer_height = footer_y1 - footer_y0
+    if footer_span is not None:
+        footer_height = float(footer_span[1] - footer_span[0])
 
     return header_height, footer_height
 
@@ -76,7 +79,9 @@ def crop_pdf(pdf_path, output_path, header_height_percent, footer_height_percent
             page.rect.y1 - footer_height
         )
         page.set_cropbox(new_rect)
-        new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+
+    # 各页裁剪框设置完毕后整份文档一次插入，不再逐页调用 insert_pdf
+    new_doc.insert_pdf(doc)
 
     new_doc.save(output_path)
     doc.close()
@@ -6,6 +6,26 @@ import pdfplumber
 from PIL import Image
 from paddleocr import PPStructure, PaddleOCR
 import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+
+# 并行处理页面的最大进程数（每个进程各加载一份模型）
+MAX_PAGE_WORKERS = 4
+
+# 每个进程池任务处理的连续页数
+PAGE_CHUNK_SIZE = 2
+
+# 图片型页面渲染：最高 3 倍缩放，长边不超过 MAX_RENDER_SIDE 像素（OCR 检测输入会被缩到约 960）
+IMAGE_PAGE_ZOOM = 3.0
+MAX_RENDER_SIDE = 1920
+
+_worker_engines = {}  # 工作进程内的模型实例，由 _init_page_worker 创建
+
+# 逐行/逐段调用的正则，模块加载时编译一次
+CJK_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fa5]')
+WHITESPACE_PATTERN = re.compile(r'\s')
+SOFT_BREAK_DASH_PATTERN = re.compile(r'-\s+')
+CJK_SPACE_PATTERN = re.compile(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])')
+PARA_NUMBER_PATTERN = re.compile(r'\[(\d{4})\]')  # 段落编号，如 [0001]
 
 def detect_pdf_type(pdf_path, sample_pages=3):
     """
@@ -42,8 +62,8 @@ def detect_pdf_type(pdf_path, sample_pages=3):
             # 3. 有效文本行数
             if text and len(text.strip()) > 50:
                 # 计算中文字符比例
-                chinese_chars = len(re.findall(r'[\u4e00-\u9fa5]', text))
-                total_chars = len(re.sub(r'\s', '', text))
+                chinese_chars = len(CJK_CHAR_PATTERN.findall(text))
+                total_chars = len(WHITESPACE_PATTERN.sub('', text))
                 
                 if total_chars > 0:
                     chinese_ratio = chinese_chars / total_chars
@@ -72,158 +92,222 @@ def detect_pdf_type(pdf_path, sample_pages=3):
 
 def fix_chinese_soft_breaks(s):
     """修复中文换行导致的拆词问题"""
-    s = re.sub(r'-\s+', '', s)
-    s = re.sub(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])', '', s)
+    # 不含连字符的段落（绝大多数）跳过正则替换，str 的子串查找比逐字符匹配正则快得多
+    if '-' in s:
+        s = SOFT_BREAK_DASH_PATTERN.sub('', s)
+    s = CJK_SPACE_PATTERN.sub('', s)
     return s
 
-def extract_images_tables_with_ppstructure(pdf_path, page_num, current_id, img_counter, table_counter, img_dir, para_buffer):
-    """使用PPStructure提取单页的图片和表格"""
+def _bbox_y(item):
+    """版面结果的排序键：bbox 上边 y 坐标（具名函数，避免每次排序新建 lambda）"""
+    return item['bbox'][1]
+
+def extract_images_tables_with_ppstructure(structure_engine, pdf_document, page_num):
+    """
+    使用PPStructure提取单页的图片和表格（引擎与已打开的文档由调用方传入，跨页复用）
     
-    structure_engine = PPStructure(
-        recovery=False,
-        lang='ch',
-        show_log=False
-    )
+    Returns:
+        list: 按y坐标排序的 [('figure' | 'table', 裁剪图), ...]，由调用方按顺序编号保存
+    """
+    items = []
     
-    pdf_document = fitz.open(pdf_path)
     page = pdf_document[page_num]
     
     mat = fitz.Matrix(2.0, 2.0)
-    pix = page.get_pixmap(matrix=mat)
-    img_data = pix.tobytes("png")
+    pix = page.get_pixmap(matrix=mat, alpha=False)
     
-    nparr = np.frombuffer(img_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    # 直接读取像素缓冲区转为numpy数组，省去PNG编码/解码
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    img = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
     
     try:
         result = structure_engine(img)
-        result.sort(key=lambda x: x['bbox'][1])
+        result.sort(key=_bbox_y)
         
         for item in result:
-            bbox = item['bbox']
-            item_type = item['type']
-            
-            if item_type == 'figure':
-                img_counter += 1
-                x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                cropped_img = img[y0:y1, x0:x1]
-                img_name = f"{current_id}_{img_counter}.png" if current_id else f"page{page_num+1}_img{img_counter}.png"
-                img_path = os.path.join(img_dir, img_name)
-                cv2.imwrite(img_path, cropped_img)
-                para_buffer += f"\n[IMG_{img_counter}]"
-                print(f"📷 提取图片: {img_name}")
-            
-            elif item_type == 'table':
-                table_counter += 1
-                x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                cropped_table = img[y0:y1, x0:x1]
-                table_name = f"{current_id}_table{table_counter}.png" if current_id else f"page{page_num+1}_table{table_counter}.png"
-                table_path = os.path.join(img_dir, table_name)
-                cv2.imwrite(table_path, cropped_table)
-                para_buffer += f"\n[TABLE_{table_counter}]"
-                print(f"📊 提取表格: {table_name}")
+            if item['type'] in ('figure', 'table'):
+                x0, y0, x1, y1 = [int(coord) for coord in item['bbox']]
+                items.append((item['type'], img[y0:y1, x0:x1]))
     
     except Exception as e:
         print(f"⚠️ PPStructure处理第{page_num+1}页时出错: {str(e)}")
     
-    finally:
-        pdf_document.close()
+    return items
+
+def save_page_items(items, page_num, current_id, img_counter, table_counter, img_dir):
+    """
+    按顺序编号保存单页的图片/表格裁剪图
+    
+    Returns:
+        (img_counter, table_counter, markers): markers 为依次追加到段落中的 [IMG_n] / [TABLE_n] 标记
+    """
+    markers = []
+    for item_type, cropped in items:
+        if item_type == 'figure':
+            img_counter += 1
+            img_name = f"{current_id}_{img_counter}.png" if current_id else f"page{page_num+1}_img{img_counter}.png"
+            cv2.imwrite(os.path.join(img_dir, img_name), cropped)
+            markers.append(f"\n[IMG_{img_counter}]")
+            print(f"📷 提取图片: {img_name}")
+        else:
+            table_counter += 1
+            table_name = f"{current_id}_table{table_counter}.png" if current_id else f"page{page_num+1}_table{table_counter}.png"
+            cv2.imwrite(os.path.join(img_dir, table_name), cropped)
+            markers.append(f"\n[TABLE_{table_counter}]")
+            print(f"📊 提取表格: {table_name}")
+    return img_counter, table_counter, markers
+
+def _init_page_worker(engine_names):
+    """进程池初始化：每个工作进程创建自己的模型实例（Paddle 预测器不能跨进程共享）"""
+    _worker_engines.clear()
+    if 'layout' in engine_names:
+        _worker_engines['layout'] = PPStructure(recovery=False, lang='ch', show_log=False)
+    if 'structure' in engine_names:
+        _worker_engines['structure'] = PPStructure(recovery=True, lang='ch', show_log=False)
+    if 'ocr' in engine_names:
+        _worker_engines['ocr'] = PaddleOCR(use_angle_cls=True, lang='ch', show_log=False)
+
+def _create_page_pool(page_count, engine_names):
+    """创建页面处理进程池，进程数不超过 CPU 数、MAX_PAGE_WORKERS 与页数"""
+    workers = min(os.cpu_count() or 1, MAX_PAGE_WORKERS, max(page_count, 1))
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(engine_names,))
+
+def _page_chunks(page_count):
+    """将页码切成每 PAGE_CHUNK_SIZE 页一段，一个任务处理一段（文档每段只打开一次）"""
+    return [list(range(start, min(start + PAGE_CHUNK_SIZE, page_count))) for start in range(0, page_count, PAGE_CHUNK_SIZE)]
+
+def _analyze_text_pages(pdf_path, page_nums):
+    """
+    工作进程：提取文本型页面的文本行与图表裁剪图（不涉及段落状态，可各页独立执行）
     
-    return img_counter, table_counter, para_buffer
+    Returns:
+        list: 每页一个 (文本行列表, 图表列表)，未提取到文本的页面为 None
+    """
+    results = []
+    with pdfplumber.open(pdf_path) as pdf, fitz.open(pdf_path) as pdf_document:
+        for page_num in page_nums:
+            page = pdf.pages[page_num]
+            width, height = page.width, page.height
+            crop = page.within_bbox((0, height * 0.07, width, height * 0.9))
+            text = crop.extract_text()
+            
+            if not text:
+                results.append(None)
+                continue
+            
+            # PPStructure增强图片表格提取
+            try:
+                items = extract_images_tables_with_ppstructure(_worker_engines['layout'], pdf_document, page_num)
+            except Exception as e:
+                print(f"⚠️ 页面{page_num+1}的PPStructure处理失败: {str(e)}")
+                items = []
+            results.append((text.split('\n'), items))
+    return results
+
+class ParagraphState:
+    """按段落编号（如 [0001]）拼接段落的状态：当前编号、当前段落片段、已完成的段落"""
+
+    def __init__(self, keep_empty=False):
+        self.current_id = None
+        self.parts = []  # 当前段落的片段，到段落边界时再一次性拼接
+        self.out = []
+        self.keep_empty = keep_empty  # 遇到新编号时是否保留空段落
+
+    def finish(self):
+        """保存最后一个段落，返回全部段落"""
+        para_buffer = "".join(self.parts)
+        if self.current_id and para_buffer.strip():
+            self.out.append(fix_chinese_soft_breaks(para_buffer.strip()))
+        return self.out
+
+def _feed_lines(lines, state):
+    """逐行推进段落状态：以编号开头的行开始新段落，其余行追加到当前段落"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        
+        match = PARA_NUMBER_PATTERN.match(line)
+        if match:
+            if state.current_id is not None:
+                para_buffer = "".join(state.parts).strip()
+                if para_buffer or state.keep_empty:
+                    state.out.append(fix_chinese_soft_breaks(para_buffer))
+            state.current_id = match.group(1)
+            state.parts = [line[len(match.group(0)):].strip()]
+        else:
+            state.parts.append(' ' + line)
+    return state
 
 def extract_text_pdf(pdf_path, output_dir):
-    """处理文本型PDF - 使用你的原始逻辑 + PPStructure增强"""
+    """处理文本型PDF - 使用你的原始逻辑 + PPStructure增强（各页在进程池中并行提取，段落按页序串行拼接）"""
     print("📄 使用文本型PDF处理模式...")
     
     os.makedirs(output_dir, exist_ok=True)
     img_dir = os.path.join(output_dir, "images")
     os.makedirs(img_dir, exist_ok=True)
     
-    text_output = []
     img_counter = 0
     table_counter = 0
-    para_buffer = ""
-    current_id = None
+    state = ParagraphState(keep_empty=True)
     
     with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            width, height = page.width, page.height
-            crop = page.within_bbox((0, height * 0.07, width, height * 0.9))
-            text = crop.extract_text()
-            
-            if not text:
+        page_count = len(pdf.pages)
+    
+    chunks = _page_chunks(page_count)
+    with _create_page_pool(len(chunks), ('layout',)) as executor:
+        page_results = (result for chunk_results in executor.map(_analyze_text_pages, [pdf_path] * len(chunks), chunks) for result in chunk_results)
+        for page_num, page_result in enumerate(page_results):
+            if page_result is None:
                 continue
+            lines, items = page_result
             
             # 原有的文本处理逻辑
-            lines = text.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                match = re.match(r'\[(\d{4})\]', line)
-                if match:
-                    if current_id is not None:
-                        cleaned_para = fix_chinese_soft_breaks(para_buffer.strip())
-                        text_output.append(cleaned_para)
-                    current_id = match.group(1)
-                    para_buffer = line[len(match.group(0)):].strip()
-                else:
-                    para_buffer += ' ' + line.strip()
+            _feed_lines(lines, state)
             
-            # PPStructure增强图片表格提取
-            try:
-                img_counter, table_counter, para_buffer = extract_images_tables_with_ppstructure(
-                    pdf_path, page_num, current_id, img_counter, table_counter, img_dir, para_buffer
-                )
-            except Exception as e:
-                print(f"⚠️ 页面{page_num+1}的PPStructure处理失败: {str(e)}")
+            # 图表按顺序编号保存，标记追加到当前段落
+            img_counter, table_counter, markers = save_page_items(items, page_num, state.current_id, img_counter, table_counter, img_dir)
+            state.parts.extend(markers)
     
-    if current_id and para_buffer.strip():
-        cleaned_para = fix_chinese_soft_breaks(para_buffer.strip())
-        text_output.append(cleaned_para)
+    text_output = state.finish()
     
     with open(os.path.join(output_dir, "text.txt"), "w", encoding="utf-8") as f:
         f.write("\n".join(text_output))
     
     return len(text_output), img_counter, table_counter
 
-def extract_image_pdf(pdf_path, output_dir):
-    """处理图片型PDF - 纯OCR + 结构化提取"""
-    print("🖼️ 使用图片型PDF处理模式...")
-    
-    os.makedirs(output_dir, exist_ok=True)
-    img_dir = os.path.join(output_dir, "images")
-    os.makedirs(img_dir, exist_ok=True)
-    
-    # 初始化OCR和结构分析
-    ocr_engine = PaddleOCR(use_angle_cls=True, lang='ch', show_log=False)
-    structure_engine = PPStructure(recovery=True, lang='ch', show_log=False)
+def _analyze_image_pages(pdf_path, page_nums):
+    """
+    工作进程：对图片型页面做版面分析（失败时降级为纯OCR）
     
-    text_output = []
-    img_counter = 0
-    table_counter = 0
-    current_id = None
-    para_buffer = ""
+    Returns:
+        list: 每页一个按顺序排列的条目列表 [('lines', 文本行列表) | ('figure', 裁剪图) | ('table', 裁剪图), ...]
+    """
+    ocr_engine = _worker_engines['ocr']
+    structure_engine = _worker_engines['structure']
+    results = []
     
     pdf_document = fitz.open(pdf_path)
     
-    for page_num in range(pdf_document.page_count):
+    for page_num in page_nums:
         print(f"📖 处理第 {page_num + 1} 页...")
         page = pdf_document[page_num]
+        page_items = []
         
         # 转换为高分辨率图片
-        mat = fitz.Matrix(3.0, 3.0)  # 图片型PDF需要更高分辨率
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
+        # 图片型PDF需要更高分辨率，但大幅面页面按长边封顶
+        zoom = min(IMAGE_PAGE_ZOOM, MAX_RENDER_SIDE / max(page.rect.width, page.rect.height, 1))
+        mat = fitz.Matrix(zoom, zoom)
+        pix = page.get_pixmap(matrix=mat, alpha=False)
         
-        nparr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # 直接读取像素缓冲区转为numpy数组，省去PNG编码/解码
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        img = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
         
         try:
             # 使用PPStructure进行版面分析
             result = structure_engine(img)
-            result.sort(key=lambda x: x['bbox'][1])  # 按y坐标排序
+            result.sort(key=_bbox_y)  # 按y坐标排序
             
             for item in result:
                 bbox = item['bbox']
@@ -239,56 +323,15 @@ def extract_image_pdf(pdf_path, output_dir):
                                 page_text_lines.append(text_item['text'])
                         
                         full_text = '\n'.join(page_text_lines)
-                        
-                        # 应用原有的段落识别逻辑
-                        lines = full_text.split('\n')
-                        for line in lines:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            
-                            match = re.match(r'\[(\d{4})\]', line)
-                            if match:
-                                if current_id is not None and para_buffer.strip():
-                                    cleaned_para = fix_chinese_soft_breaks(para_buffer.strip())
-                                    text_output.append(cleaned_para)
-                                
-                                current_id = match.group(1)
-                                para_buffer = line[len(match.group(0)):].strip()
-                            else:
-                                para_buffer += ' ' + line.strip()
-                
-                elif item_type == 'figure':
-                    # 处理图片
-                    img_counter += 1
-                    x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                    cropped_img = img[y0:y1, x0:x1]
-                    
-                    img_name = f"{current_id}_{img_counter}.png" if current_id else f"page{page_num+1}_img{img_counter}.png"
-                    img_path = os.path.join(img_dir, img_name)
-                    cv2.imwrite(img_path, cropped_img)
-                    
-                    if current_id:
-                        para_buffer += f"\n[IMG_{img_counter}]"
-                    print(f"📷 提取图片: {img_name}")
+                        page_items.append(('lines', full_text.split('\n')))
                 
-                elif item_type == 'table':
-                    # 处理表格
-                    table_counter += 1
+                elif item_type in ('figure', 'table'):
                     x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                    cropped_table = img[y0:y1, x0:x1]
-                    
-                    table_name = f"{current_id}_table{table_counter}.png" if current_id else f"page{page_num+1}_table{table_counter}.png"
-                    table_path = os.path.join(img_dir, table_name)
-                    cv2.imwrite(table_path, cropped_table)
-                    
-                    if current_id:
-                        para_buffer += f"\n[TABLE_{table_counter}]"
-                    print(f"📊 提取表格: {table_name}")
+                    page_items.append((item_type, img[y0:y1, x0:x1]))
         
         except Exception as e:
             print(f"⚠️ 第{page_num+1}页处理失败: {str(e)}")
-            # 降级处理：使用纯OCR
+            # 降级处理：使用纯OCR（版面分析中途失败时，已得到的条目照常保留）
             try:
                 ocr_result = ocr_engine.ocr(img, cls=True)
                 if ocr_result and ocr_result[0]:
@@ -298,36 +341,55 @@ def extract_image_pdf(pdf_path, output_dir):
                         page_text.append(text)
                     
                     full_text = '\n'.join(page_text)
-                    lines = full_text.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        
-                        match = re.match(r'\[(\d{4})\]', line)
-                        if match:
-                            if current_id is not None and para_buffer.strip():
-                                cleaned_para = fix_chinese_soft_breaks(para_buffer.strip())
-                                text_output.append(cleaned_para)
-                            
-                            current_id = match.group(1)
-                            para_buffer = line[len(match.group(0)):].strip()
-                        else:
-                            para_buffer += ' ' + line.strip()
-                            
+                    page_items.append(('lines', full_text.split('\n')))
+                    
             except Exception as e2:
                 print(f"❌ 纯OCR也失败了: {str(e2)}")
+        
+        results.append(page_items)
+    
+    pdf_document.close()
+    return results
+
+def extract_image_pdf(pdf_path, output_dir):
+    """处理图片型PDF - 纯OCR + 结构化提取（各页在进程池中并行分析，段落按页序串行拼接）"""
+    print("🖼️ 使用图片型PDF处理模式...")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    img_dir = os.path.join(output_dir, "images")
+    os.makedirs(img_dir, exist_ok=True)
+    
+    img_counter = 0
+    table_counter = 0
+    state = ParagraphState()
+    
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = pdf_document.page_count
+    
+    # 初始化OCR和结构分析：每个工作进程各创建一份
+    chunks = _page_chunks(page_count)
+    with _create_page_pool(len(chunks), ('ocr', 'structure')) as executor:
+        page_results = (result for chunk_results in executor.map(_analyze_image_pages, [pdf_path] * len(chunks), chunks) for result in chunk_results)
+        for page_num, page_items in enumerate(page_results):
+            for item_type, content in page_items:
+                if item_type == 'lines':
+                    # 应用原有的段落识别逻辑
+                    _feed_lines(content, state)
+                else:
+                    # 处理图片/表格
+                    img_counter, table_counter, markers = save_page_items(
+                        [(item_type, content)], page_num, state.current_id, img_counter, table_counter, img_dir
+                    )
+                    if state.current_id:
+                        state.parts.extend(markers)
     
     # 保存最后一个段落
-    if current_id and para_buffer.strip():
-        cleaned_para = fix_chinese_soft_breaks(para_buffer.strip())
-        text_output.append(cleaned_para)
+    text_output = state.finish()
     
     # 写入文本文件
     with open(os.path.join(output_dir, "text.txt"), "w", encoding="utf-8") as f:
         f.write("\n".join(text_output))
     
-    pdf_document.close()
     return len(text_output), img_counter, table_counter
 
 def smart_extract_pdf(pdf_path, output_dir):
@@ -1,23 +1,43 @@
 import fitz  # PyMuPDF
-from paddleocr import PaddleOCR
-from PIL import Image
 import numpy as np
 import os
-
-ocr = PaddleOCR(use_angle_cls=True, lang="ch")
-
-def is_text_based(page):
-    return bool(page.get_text("text").strip())
-
-def crop_ocr_area(pil_img, header_ratio=0.07, footer_ratio=0.10):
-    width, height = pil_img.size
-    top = int(height * header_ratio)
-    bottom = int(height * (1 - footer_ratio))
-    return pil_img.crop((0, top, width, bottom))
-
-def extract_lines_with_indent(page, header_ratio=0.07, footer_ratio=0.10, indent_threshold=10):
-    blocks = page.get_text("dict")["blocks"]
-    page_rect = page.rect
+import multiprocessing
+from page_cache import open_page_cache, page_cache_key
+from ocr_engine import get_ocr, reset_ocr, ocr_settings
+
+# 图片型页面并行OCR的最大进程数（每个进程各加载一份模型）
+MAX_OCR_WORKERS = 8
+
+# 句末标点：段落以这些字符结尾时不再与下一行/下一页拼接
+SENTENCE_END_CHARS = frozenset("。！？；")
+
+# 段首缩进字符：段落以这些字符开头时视为显式新段落（半角空格、全角空格）
+INDENT_CHARS = frozenset(" \u3000")
+
+# 结果文件写缓冲大小：逐段写出，由缓冲区合并为大块写盘
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+def is_text_based(page_dict):
+    """根据 page.get_text("dict") 的结果判断页面是否含文本层，避免再次解析页面"""
+    return any(
+        span["text"].strip()
+        for block in page_dict["blocks"]
+        for line in block.get("lines", [])
+        for span in line["spans"]
+    )
+
+def ocr_clip_rect(page_rect, header_ratio=0.07, footer_ratio=0.10):
+    """OCR区域（去掉页眉页脚），作为 get_pixmap 的 clip 参数，只渲染需要识别的部分"""
+    return fitz.Rect(
+        page_rect.x0,
+        page_rect.y0 + page_rect.height * header_ratio,
+        page_rect.x1,
+        page_rect.y1 - page_rect.height * footer_ratio,
+    )
+
+def extract_lines_with_indent(page_dict, page_rect, header_ratio=0.07, footer_ratio=0.10, indent_threshold=10):
+    blocks = page_dict["blocks"]
     top = page_rect.y0 + page_rect.height * header_ratio
     bottom = page_rect.y1 - page_rect.height * footer_ratio
 
@@ -48,26 +68,26 @@ def extract_lines_with_indent(page, header_ratio=0.07, footer_ratio=0.10, indent
 
 def smart_join_lines_with_indent(lines):
     paragraphs = []
-    paragraph = ""
+    segs = []  # 当前段落的行片段，到段落边界时再一次性拼接
 
     for idx, (line, is_indented) in enumerate(lines):
         if not line:
             continue
 
         if is_indented:
-            if paragraph:
-                paragraphs.append(paragraph.strip())
-            paragraph = line
+            if segs:
+                paragraphs.append("".join(segs).strip())
+            segs = [line]
         else:
-            if paragraph and not paragraph.endswith(("。", "！", "？", "；")):
-                paragraph += line
+            if segs and segs[-1][-1:] not in SENTENCE_END_CHARS:
+                segs.append(line)
             else:
-                if paragraph:
-                    paragraphs.append(paragraph.strip())
-                paragraph = line
+                if segs:
+                    paragraphs.append("".join(segs).strip())
+                segs = [line]
 
-    if paragraph:
-        paragraphs.append(paragraph.strip())
+    if segs:
+        paragraphs.append("".join(segs).strip())
 
     return paragraphs
 
@@ -75,72 +95,134 @@ def ocr_paragraph_rebuild(ocr_result, line_gap_threshold=15):
     if not ocr_result or not ocr_result[0]:
         return []
 
-    lines = [(line[1][0], line[0][1][1]) for line in ocr_result[0]]
-    lines.sort(key=lambda x: x[1])
+    # 按 y 坐标稳定排序：一次 numpy argsort，代替逐元素调用 Python key 函数
+    raw_lines = ocr_result[0]
+    ys = np.fromiter((line[0][1][1] for line in raw_lines), dtype=np.float32, count=len(raw_lines))
+    order = np.argsort(ys, kind='stable')
+    ys = ys[order]
+    texts = [raw_lines[i][1][0] for i in order]
 
-    paragraphs = []
-    paragraph = ""
-    last_y = None
+    # 数值部分向量化：相邻行 y 间距超过阈值处即为段落分界
+    breaks = np.flatnonzero(np.abs(np.diff(ys)) >= line_gap_threshold) + 1
+    bounds = [0, *breaks.tolist(), len(texts)]
 
-    for text, y in lines:
-        if last_y is None or abs(y - last_y) < line_gap_threshold:
-            paragraph += text.strip() + " "
+    # 字符串部分按分组一次性拼接：首段各行以空格相连；
+    # 其余段落的首行与第二行直接相连（不加空格），之后各行以空格相连
+    paragraphs = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        parts = [text.strip() for text in texts[start:end]]
+        if start == 0:
+            paragraph = " ".join(parts)
         else:
-            paragraphs.append(paragraph.strip())
-            paragraph = text.strip()
-        last_y = y
-
-    if paragraph:
+            paragraph = parts[0] + " ".join(parts[1:])
+            # 末段只有一行空文本时不输出
+            if end == len(texts) and len(parts) == 1 and not paragraph:
+                break
         paragraphs.append(paragraph.strip())
 
     return paragraphs
 
 def merge_cross_page_paragraphs(all_paragraphs):
-    """跨页段落合并逻辑"""
+    """跨页段落合并逻辑（单遍扫描，待合并的片段先入列表，到段落边界时再一次性拼接）"""
     merged = []
-    buffer = ""
+    current_parts = []  # 当前正在拼接的段落片段
 
-    for i in range(len(all_paragraphs)):
-        para = all_paragraphs[i].strip()
+    for para in all_paragraphs:
+        para = para.strip()
         if not para: # 跳过空字符串，这很重要，特别是您移除了 raw_paragraphs.append("") 后
             continue
 
         # 如果上一段不以句号等结尾，当前段不缩进，拼接
-        # 并且确保 merged 列表不为空
-        if merged:
-            last = merged[-1]
+        # 并且确保已有待拼接的段落
+        if current_parts:
             # 这里的逻辑是为了确保连续的文本能够合并，如果上一段不以句号等结尾
             # 并且当前段落不是显式缩进（起始不带空格），则合并
-            if not last.endswith(("。", "！", "？", "；")) and not para.startswith((" ", "\u3000", "　")):
-                merged[-1] = last + para  # 拼接
+            if current_parts[-1][-1:] not in SENTENCE_END_CHARS and para[:1] not in INDENT_CHARS:
+                current_parts.append(para)  # 拼接
                 continue
+            merged.append("".join(current_parts))
+
+        current_parts = [para]
 
-        merged.append(para)
+    if current_parts:
+        merged.append("".join(current_parts))
 
     return merged
 
+def _init_ocr_worker(process_count):
+    """进程池初始化：每个工作进程创建自己的 OCR 实例（Paddle 预测器不能跨进程共享），CPU 推理线程按进程数均分"""
+    reset_ocr(process_count)
+    get_ocr()
+
+def _ocr_page_paragraphs(img):
+    """对单页图像做OCR并重建段落（可在进程池中执行）"""
+    ocr_result = get_ocr().ocr(img, cls=True)
+    return ocr_paragraph_rebuild(ocr_result)
+
+def _create_ocr_pool(job_count):
+    """
+    创建OCR进程池，进程数不超过 CPU 数、MAX_OCR_WORKERS 与待处理页数
+
+    以 spawn 启动：调用方（如 main.py 中先运行的分割步骤）可能已在本进程加载 Paddle，fork 后子进程会卡死
+    """
+    workers = min(os.cpu_count() or 1, MAX_OCR_WORKERS, job_count)
+    return multiprocessing.get_context("spawn").Pool(processes=workers, initializer=_init_ocr_worker,
+                                                     initargs=(workers,))
+
 def extract_text_from_pdf(pdf_path, output_path):
     doc = fitz.open(pdf_path)
-    raw_paragraphs = []
+    page_paragraphs = []  # 按页保存段落，图片型页面先占位，OCR 完成后回填
+    ocr_jobs = []  # 待OCR的 (页序号, 图像)，遍历完全部页面后按实际页数决定进程数
+    page_cache = open_page_cache()  # 图片型页面的OCR段落缓存，命中则跳过渲染与OCR
+    cache_settings = ocr_settings() if page_cache is not None else ()
+    cache_keys = {}  # 未命中缓存的页序号 -> 缓存键，OCR 完成后写回
 
     for page_num in range(len(doc)):
         page = doc.load_page(page_num)
         print(f"正在处理第{page_num + 1}页...")
 
-        if is_text_based(page):
+        # 只解析一次页面文本结构，文本判断与按行提取共用
+        page_dict = page.get_text("dict")
+        if is_text_based(page_dict):
             print("文字型PDF")
-            lines = extract_lines_with_indent(page)
-            paragraphs = smart_join_lines_with_indent(lines)
+            lines = extract_lines_with_indent(page_dict, page.rect)
+            page_paragraphs.append(smart_join_lines_with_indent(lines))
         else:
             print("图片型PDF")
-            pix = page.get_pixmap()
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            cropped_img = crop_ocr_area(img)
-            ocr_result = ocr.ocr(np.array(cropped_img), cls=True)
-            paragraphs = ocr_paragraph_rebuild(ocr_result)
-
-        raw_paragraphs.extend(paragraphs)
-        # raw_paragraphs.append("")  # 移除或注释掉此行，它会导致额外的空行
+            if page_cache is not None:
+                cache_key = page_cache_key("claims_ocr", doc, page, cache_settings)
+                cached = page_cache.get(cache_key)
+                if cached is not None:
+                    print("命中页面缓存，跳过OCR")
+                    page_paragraphs.append(cached)
+                    continue
+                cache_keys[page_num] = cache_key
+            # 只渲染页眉页脚之间的区域，灰度即可满足OCR（PaddleOCR 支持二维输入）
+            pix = page.get_pixmap(clip=ocr_clip_rect(page.rect), colorspace=fitz.csGRAY, alpha=False)
+            img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+            ocr_jobs.append((page_num, img))
+            page_paragraphs.append([])
+
+    doc.close()
+
+    # 只有一页需要OCR时直接在本进程识别，省去进程与模型加载开销；
+    # 多页时进程数按实际图片页数确定（每个进程各加载一份模型），map 保持页序
+    if len(ocr_jobs) == 1:
+        page_num, img = ocr_jobs[0]
+        page_paragraphs[page_num] = _ocr_page_paragraphs(img)
+    elif ocr_jobs:
+        with _create_ocr_pool(len(ocr_jobs)) as pool:
+            results = pool.map(_ocr_page_paragraphs, [img for _, img in ocr_jobs])
+        for (page_num, _), paragraphs in zip(ocr_jobs, results):
+            page_paragraphs[page_num] = paragraphs
+
+    if page_cache is not None:
+        for page_num, cache_key in cache_keys.items():
+            page_cache[cache_key] = page_paragraphs[page_num]
+        page_cache.close()
+
+    raw_paragraphs = [para for paragraphs in page_paragraphs for para in paragraphs]
+    # raw_paragraphs.append("")  # 移除或注释掉此行，它会导致额外的空行
 
     # 合并跨页自然段
     # 在调用 merge_cross_page_paragraphs 之前，最好清理一下 raw_paragraphs 中的空字符串，
@@ -152,8 +234,12 @@ def extract_text_from_pdf(pdf_path, output_path):
     final_paragraphs = merge_cross_page_paragraphs(raw_paragraphs)
 
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(final_paragraphs)) # 将 \n\n 修改为 \n
+    # 逐段写出，不再先拼接出整份文本
+    with open(output_path, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as f:
+        for idx, paragraph in enumerate(final_paragraphs):
+            if idx:
+                f.write("\n") # 将 \n\n 修改为 \n
+            f.write(paragraph)
 
     print(f"\n提取完成，保存到: {output_path}")
 
@@ -1,19 +1,110 @@
 import os
 import re
+import queue
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import cv2
 import numpy as np
 import pdfplumber
-from PIL import Image, ImageEnhance
-from paddleocr import PPStructure, PaddleOCR
+from paddleocr import PPStructure
 import fitz  # PyMuPDF
+from page_cache import open_page_cache, page_cache_key
+from ocr_engine import get_ocr, reset_ocr, ocr_lines_batch, ocr_settings
 
-def detect_pdf_type(pdf_path, sample_pages=3):
+# 图片型PDF流水线中 渲染 / 结构分析 / 解析 各阶段之间的队列容量（限制驻留内存的页图数量）
+PIPELINE_QUEUE_SIZE = 4
+
+# 图片型PDF的页面渲染缩放倍数（相对 72 DPI）
+IMAGE_PAGE_ZOOM = 2.0
+
+# 图片型PDF渲染图的长边上限（像素）：OCR 检测输入会被缩到约 960，大幅面页面不必按满倍数渲染
+MAX_RENDER_SIDE = 1920
+
+# 图片型PDF按页段并行处理的最大进程数（每个进程各加载一份 OCR + 版面模型）
+MAX_PAGE_WORKERS = 4
+
+# 多份PDF按文档并行处理的最大进程数（文档级并行时各进程内不再按页段开进程）
+MAX_DOCUMENT_WORKERS = 4
+
+# PPStructure 文本行置信度阈值：高于前者直接采用；
+# 整页没有高置信度文本时，高于后者的行也会被采用，以免再整页重做OCR
+STRUCTURE_TEXT_CONFIDENCE = 0.5
+STRUCTURE_LOW_TEXT_CONFIDENCE = 0.3
+
+# 纯OCR回退时最多攒够多少页一起识别（检测逐页，识别合并为一次调用，摊薄每次调用的固定开销）
+OCR_FALLBACK_BATCH_PAGES = 4
+
+# 纯OCR回退结果的置信度阈值
+OCR_FALLBACK_CONFIDENCE = 0.6
+
+# 结果文件写缓冲大小：逐段写出，由缓冲区合并为大块写盘
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+_page_worker_engines = None  # 页段工作进程内的 (ocr_engine, structure_engine)
+
+# 文本型PDF图表提取：版面分析只需定位图表，用 1 倍渲染；检测到图表时才以 2 倍渲染用于裁剪
+LAYOUT_ZOOM = 1.0
+CROP_ZOOM = 2.0
+
+# 图表裁剪图使用低压缩级别 + RLE 策略换取更快的 PNG 编码（仍为无损；专利附图多为大片空白的线稿，RLE 体积相近）
+PNG_WRITE_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
+
+# 图表裁剪图后台写盘线程数（cv2.imwrite 编码时释放 GIL，与后续页面的版面分析重叠）
+IMAGE_WRITE_WORKERS = 4
+
+# 正则 \s 匹配的全部码点（与 str.isspace 一致，均不超过 U+3000），用于按码点数组统计非空白字符
+WHITESPACE_CODEPOINTS = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+
+# PIL ImageFilter.SMOOTH 的卷积核，用于以 OpenCV 实现锐化
+SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13
+
+# 段落处理用到的正则，模块加载时编译一次
+SOFT_BREAK_DASH_PATTERN = re.compile(r'-\s+')
+CJK_SPACE_PATTERN = re.compile(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])')
+BRACKET_LINE_PATTERN = re.compile(r'^[\[\(\【（［]+.*\d+.*[\]）\】］]*')
+# 带括号的段落编号：以多行模式在整段缓冲区上一次扫描，尾部空白不跨越换行
+PARA_NUMBER_LINE_PATTERN = re.compile(
+    r'^('
+    r'[\[\(\【（\［]+\d+[\]）\】］]*'  # 有前括号
+    r'|'                             # 或 
+    r'\d+[\]）\】\］]+'               # 有后括号
+    r')'
+    r'[\.\。]?'          # 可选结束符
+    r'[^\S\n]*',        # 后续空格
+    re.MULTILINE
+)
+# 常见编号格式
+NUMBERED_LINE_PATTERN = re.compile(
+    r'^\d+[\.\．]'                    # 1. 2. 3.
+    r'|^[\[\(（\（]+\d+[\]\)）\）]+'    # [1] (1) （1）
+    r'|^\d+[\)）]'                    # 1) 2)
+)
+
+_preprocess_local = threading.local()  # 每个线程各自的预处理缓冲区
+
+_ppstructure = None  # 文本型PDF提取图表用的版面分析引擎，首次使用时才加载模型
+
+
+def _get_ppstructure():
+    """惰性创建并返回文本型PDF图表提取共用的 PPStructure 实例"""
+    global _ppstructure
+    if _ppstructure is None:
+        _ppstructure = PPStructure(
+            recovery=False,
+            lang='ch',
+            show_log=False
+        )
+    return _ppstructure
+
+def detect_pdf_type(pdf_path, sample_pages=3, text_cache=None):
     """
     检测PDF类型：文本型 vs 图片型
     
     Args:
         pdf_path: PDF文件路径
         sample_pages: 采样页数进行检测
+        text_cache: 可选 dict，传入时记录已提取的采样页文本 {页序号: 文本}，供随后的 extract_mixed_pdf 复用
     
     Returns:
         'text': 文本型PDF
@@ -22,50 +113,96 @@ def detect_pdf_type(pdf_path, sample_pages=3):
     """
     print("🔍 正在分析PDF类型...")
     
+    # 只需判断采样页有没有足够的文本层，用 PyMuPDF 直接取文本，不必走 pdfplumber 的逐字符版面分析
+    with fitz.open(pdf_path) as doc:
+        # 检查前几页来判断类型；逐页按需提取，结果已确定时后面的页不再提取
+        pages_to_check = min(sample_pages, len(doc))
+        def iter_page_texts():
+            for i in range(pages_to_check):
+                text = doc.load_page(i).get_text("text")
+                if text_cache is not None:
+                    text_cache[i] = text
+                yield text
+        return detect_pdf_type_from_texts(iter_page_texts(), total_pages=pages_to_check)
+
+def count_cjk_and_non_space(text):
+    """
+    统计文本中的中文字符数（U+4E00–U+9FA5）与非空白字符数
+    
+    将文本转为 UTF-32 码点数组后一次比较完成，代替两次正则扫描与 findall 的逐个匹配对象
+    """
+    codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    chinese_chars = int(np.count_nonzero((codepoints >= 0x4E00) & (codepoints <= 0x9FA5)))
+    total_chars = codepoints.size - int(np.count_nonzero(np.isin(codepoints, WHITESPACE_CODEPOINTS)))
+    return chinese_chars, total_chars
+
+def _classify_page(text):
+    """
+    根据单页提取的文本判断该页是文本页还是图片页
+    
+    判断标准：文本长度 + 中文字符比例 / 非空白字符数；文本提取失败或文本很少时判为图片页
+    
+    Returns:
+        'text' / 'image'
+    """
+    if text and len(text.strip()) > 50:
+        # 计算中文字符比例
+        chinese_chars, total_chars = count_cjk_and_non_space(text)
+        
+        if total_chars > 0:
+            chinese_ratio = chinese_chars / total_chars
+            # 如果中文字符占比>10%，认为是有效文本页
+            if chinese_ratio > 0.1 or total_chars > 200:
+                return 'text'
+    return 'image'
+
+def classify_text_ratio(text_ratio):
+    """文本页占比 -> PDF类型（占比越高越偏向文本型，分段单调）"""
+    if text_ratio >= 0.8:
+        return 'text'
+    if text_ratio <= 0.2:
+        return 'image'
+    return 'mixed'
+
+def detect_pdf_type_from_texts(page_texts, total_pages=None):
+    """
+    根据已提取的采样页文本判断PDF类型，供已打开文档的调用方复用，避免重新打开PDF
+    
+    Args:
+        page_texts: 采样页的文本（列表或按需提取的迭代器，提取失败的页可为 None 或空串）
+        total_pages: 采样页总数；给出时，剩余页无论如何都不会改变结果即提前结束，不再消耗迭代器
+    
+    Returns:
+        'text' / 'image' / 'mixed'，含义同 detect_pdf_type
+    """
     text_pages = 0
     image_pages = 0
     total_checked = 0
     
-    with pdfplumber.open(pdf_path) as pdf:
-        # 检查前几页来判断类型
-        pages_to_check = min(sample_pages, len(pdf.pages))
+    for text in page_texts:
+        total_checked += 1
         
-        for i in range(pages_to_check):
-            page = pdf.pages[i]
-            text = page.extract_text()
-            
-            total_checked += 1
-            
-            # 判断标准：
-            # 1. 文本长度
-            # 2. 中文字符比例
-            # 3. 有效文本行数
-            if text and len(text.strip()) > 50:
-                # 计算中文字符比例
-                chinese_chars = len(re.findall(r'[\u4e00-\u9fa5]', text))
-                total_chars = len(re.sub(r'\s', '', text))
-                
-                if total_chars > 0:
-                    chinese_ratio = chinese_chars / total_chars
-                    # 如果中文字符占比>10%，认为是有效文本页
-                    if chinese_ratio > 0.1 or total_chars > 200:
-                        text_pages += 1
-                        continue
-            
-            # 如果文本提取失败或文本很少，判断为图片页
+        if _classify_page(text) == 'text':
+            text_pages += 1
+        else:
             image_pages += 1
+        
+        # 剩余页全为文本页/全为图片页时的占比上下界归为同一类型，即可确定结果，不再提取后面的页
+        # （已检查页上的占比 text_pages / total_checked 必落在上下界之间，结果不变）
+        if total_pages:
+            remaining = total_pages - total_checked
+            if classify_text_ratio(text_pages / total_pages) == classify_text_ratio((text_pages + remaining) / total_pages):
+                break
     
     # 判断逻辑
     text_ratio = text_pages / total_checked
+    pdf_type = classify_text_ratio(text_ratio)
     
-    if text_ratio >= 0.8:
-        pdf_type = 'text'
+    if pdf_type == 'text':
         print(f"📄 检测结果: 文本型PDF (文本页: {text_pages}/{total_checked})")
-    elif text_ratio <= 0.2:
-        pdf_type = 'image'
+    elif pdf_type == 'image':
         print(f"🖼️  棜测结果: 图片型PDF (图片页: {image_pages}/{total_checked})")
     else:
-        pdf_type = 'mixed'
         print(f"📄🖼️  检测结果: 混合型PDF (文本页: {text_pages}, 图片页: {image_pages})")
     
     return pdf_type
@@ -81,16 +218,25 @@ def detect_content_area(page, margin_ratio=0.05):
     Returns:
         tuple: (x0, y0, x1, y1) 内容区域坐标
     """
-    width, height = page.width, page.height
+    return content_area_from_chars(page.chars, page.width, page.height, margin_ratio)
+
+def content_area_from_chars(chars, width, height, margin_ratio=0.05):
+    """
+    按字符分布检测内容区域（detect_content_area 的实现，pdfplumber 与 PyMuPDF 的字符都可使用）
     
+    Args:
+        chars: 字符字典列表，需含 text / x0 / x1 / top（页面坐标，y 轴向下）
+        width, height: 页面尺寸
+        margin_ratio: 基础边距比例（默认5%）
+    
+    Returns:
+        tuple: (x0, y0, x1, y1) 内容区域坐标
+    """
     # 默认边距
     default_margin_x = width * margin_ratio
     default_margin_y = height * margin_ratio
     
     try:
-        # 获取页面上所有文本对象
-        chars = page.chars
-        
         if not chars:
             return (
                 default_margin_x,
@@ -192,36 +338,91 @@ def detect_content_area(page, margin_ratio=0.05):
 
 def fix_chinese_soft_breaks(s):
     """修复中文换行导致的拆词问题"""
-    s = re.sub(r'-\s+', '', s)
-    s = re.sub(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])', '', s)
+    # 不含连字符的段落（绝大多数）跳过正则替换，str 的子串查找比逐字符匹配正则快得多
+    if '-' in s:
+        s = SOFT_BREAK_DASH_PATTERN.sub('', s)
+    s = CJK_SPACE_PATTERN.sub('', s)
     return s
 
+def _preprocess_buffers(shape):
+    """
+    取本线程的预处理中间缓冲区（去噪、增强各一块），按所需尺寸从可增长的一维存储中切出连续视图，
+    页面间尺寸相近时不再重复分配整页数组
+    """
+    size = shape[0] * shape[1]
+    storage = getattr(_preprocess_local, "storage", None)
+    if storage is None or storage.shape[1] < size:
+        storage = np.empty((2, size), dtype=np.uint8)
+        _preprocess_local.storage = storage
+    return [storage[i, :size].reshape(shape) for i in range(2)]
+
 def preprocess_image(img):
-    """图片预处理，提高OCR识别率"""
+    """
+    图片预处理，提高OCR识别率
+    
+    中间结果写入本线程复用的缓冲区，返回的图像为新分配的数组，可由调用方长期持有
+    """
     # 转换为灰度图
     if len(img.shape) == 3:
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     else:
         gray = img
     
+    denoised, enhanced = _preprocess_buffers(gray.shape[:2])
+    
     # 图片增强
     # 1. 高斯去噪
-    denoised = cv2.GaussianBlur(gray, (3, 3), 0)
-    
-    # 2. 对比度增强
-    pil_img = Image.fromarray(denoised)
-    enhancer = ImageEnhance.Contrast(pil_img)
-    enhanced = enhancer.enhance(1.5)  # 增强对比度
+    denoised = cv2.GaussianBlur(gray, (3, 3), 0, dst=denoised)
     
-    # 3. 锐化
-    sharpness_enhancer = ImageEnhance.Sharpness(enhanced)
-    sharpened = sharpness_enhancer.enhance(1.2)
+    # 2. 对比度增强（等价于 ImageEnhance.Contrast(1.5)：以灰度均值为中心拉伸）
+    mean = int(denoised.mean() + 0.5)
+    enhanced = cv2.addWeighted(denoised, 1.5, denoised, 0, -0.5 * mean, dst=enhanced)
     
-    # 转换回opencv格式
-    processed_img = np.array(sharpened)
+    # 3. 锐化（等价于 ImageEnhance.Sharpness(1.2)：与 PIL SMOOTH 平滑图做外插），平滑图复用去噪缓冲区
+    smoothed = cv2.filter2D(enhanced, -1, SMOOTH_KERNEL, dst=denoised)
+    processed_img = cv2.addWeighted(enhanced, 1.2, smoothed, -0.2, 0)
     
     return processed_img
 
+def crop_bbox(img, bbox, scale=1.0):
+    """
+    按 bbox（可按 scale 换算到 img 的分辨率）裁剪出连续内存的子图，坐标先截断到图像范围内
+    
+    Returns:
+        numpy.ndarray | None: 裁剪结果，bbox 与图像无交集时返回 None
+    """
+    h, w = img.shape[:2]
+    x0, y0, x1, y1 = [int(coord * scale) for coord in bbox]
+    x0, x1 = max(0, min(x0, w)), max(0, min(x1, w))
+    y0, y1 = max(0, min(y0, h)), max(0, min(y1, h))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return np.ascontiguousarray(img[y0:y1, x0:x1])
+
+def save_crop(writer_pool, path, crop):
+    """图表裁剪图统一写盘入口：提交到 writer_pool 后台以 PNG_WRITE_PARAMS 编码"""
+    writer_pool.submit(cv2.imwrite, path, crop, PNG_WRITE_PARAMS)
+
+def order_by_y(items, ys):
+    """按 y 坐标稳定排序：一次 numpy argsort，代替逐元素调用 Python key 函数"""
+    order = np.argsort(np.asarray(ys, dtype=np.float32), kind='stable')
+    return [items[i] for i in order]
+
+def write_paragraphs(text_file, paragraphs, separator="\n\n"):
+    """
+    逐段写出文本文件（段落间以 separator 分隔），不再先拼接出整份文本
+    
+    paragraphs 可为生成器，边产出边写盘；返回写出的段落数
+    """
+    count = 0
+    with open(text_file, "w", encoding="utf-8", buffering=OUTPUT_BUFFER_SIZE) as f:
+        for paragraph in paragraphs:
+            if count:
+                f.write(separator)
+            f.write(paragraph)
+            count += 1
+    return count
+
 def process_text_with_paragraphs(text_lines):
     """修改版：仅处理带括号的编号"""
     text_output = []
@@ -232,7 +433,7 @@ def process_text_with_paragraphs(text_lines):
     buffer = ""
     for line in (l.strip() for l in text_lines if l.strip()):
         # 仅检测带括号的编号作为新段落起始
-        if re.match(r'^[\[\(\【（［]+.*\d+.*[\]）\】］]*', line):  # 修改行合并条件
+        if BRACKET_LINE_PATTERN.match(line):  # 修改行合并条件
             if buffer:
                 merged_lines.append(buffer)
                 buffer = ""
@@ -242,24 +443,18 @@ def process_text_with_paragraphs(text_lines):
         merged_lines.append(buffer)
 
     # 第二阶段：精确匹配带括号的编号
-    para_pattern = re.compile(
-        r'^('
-        r'[\[\(\【（\［]+\d+[\]）\】］]*'  # 有前括号
-        r'|'                             # 或 
-        r'\d+[\]）\】\］]+'               # 有后括号
-        r')'
-        r'[\.\。]?'          # 可选结束符
-        r'\s*'               # 后续空格
-    )
+    # 所有行拼成一个缓冲区只做一次 finditer，按行首偏移取回每行编号的结束位置
+    buf = "\n".join(merged_lines)
+    number_ends = {m.start(): m.end() for m in PARA_NUMBER_LINE_PATTERN.finditer(buf)}
 
+    line_start = 0  # 当前行在缓冲区中的行首偏移
     for line in merged_lines:
-        
+        match_end = number_ends.get(line_start)
 
         # 仅匹配带括号的编号
-        match = para_pattern.match(line)
-        if match:
+        if match_end is not None:
             # 计算编号部分长度（保持原逻辑）
-            match_len = match.end()
+            match_len = match_end - line_start
             remaining = line[match_len:].strip()
 
             # 保存上一个段落（保持原逻辑）
@@ -278,6 +473,8 @@ def process_text_with_paragraphs(text_lines):
                 cleaned = fix_chinese_soft_breaks(line)
                 text_output.append(cleaned)
 
+        line_start += len(line) + 1
+
     # 处理最后一段（保持原逻辑）
     if current_para:
         joined = fix_chinese_soft_breaks(" ".join(current_para))
@@ -285,61 +482,147 @@ def process_text_with_paragraphs(text_lines):
 
     return text_output
 
-def extract_images_tables_with_ppstructure(pdf_path, page_num, current_id, img_counter, table_counter, img_dir, para_buffer):
-    """使用PPStructure提取单页的图片和表格"""
+def page_may_have_figures(page):
+    """
+    PPStructure 之前的轻量预筛：页面既未引用图片、也没有矢量绘图路径、PyMuPDF 也找不到表格时，不可能有图表可提取
     
-    structure_engine = PPStructure(
-        recovery=False,
-        lang='ch',
-        show_log=False
-    )
+    get_images 只查页面资源字典；公式、流程图等矢量图只以绘图路径出现，有任何路径都交给版面分析；
+    find_tables 需 PyMuPDF >= 1.23，旧版本无法预筛时按可能有图表处理
+    """
+    if page.get_images():
+        return True
+    # get_cdrawings 不构造 Python 对象，比 get_drawings 快；旧版本没有时退回 get_drawings
+    get_drawings = getattr(page, "get_cdrawings", page.get_drawings)
+    if get_drawings():
+        return True
+    if not hasattr(page, "find_tables"):
+        return True
+    return bool(page.find_tables().tables)
+
+def extract_images_tables_with_ppstructure(structure_engine, pdf_document, page_num, current_id, img_counter, table_counter, img_dir, para_buffer, writer_pool):
+    """
+    使用PPStructure提取单页的图片和表格（引擎与已打开的文档由调用方传入，跨页复用）
     
-    pdf_document = fitz.open(pdf_path)
-    page = pdf_document[page_num]
+    裁剪图交给 writer_pool 在后台写盘，调用方在全部页面处理完后关闭线程池等待写完
+    """
     
-    mat = fitz.Matrix(2.0, 2.0)
-    pix = page.get_pixmap(matrix=mat)
-    img_data = pix.tobytes("png")
+    page = pdf_document[page_num]
+    if not page_may_have_figures(page):
+        return img_counter, table_counter, para_buffer
     
-    nparr = np.frombuffer(img_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    def render_bgr(zoom):
+        # 直接读取像素缓冲区转为numpy数组，省去PNG编码/解码
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
     
     try:
-        result = structure_engine(img)
-        result.sort(key=lambda x: x['bbox'][1])
+        # 低分辨率图上做版面分析，只有检测到图表时才渲染高分辨率图，bbox 按比例换算后裁剪
+        result = structure_engine(render_bgr(LAYOUT_ZOOM))
+        result = order_by_y(result, [x['bbox'][1] for x in result])
         
+        img = None
+        scale = CROP_ZOOM / LAYOUT_ZOOM
         for item in result:
             bbox = item['bbox']
             item_type = item['type']
+            if item_type in ('figure', 'table') and img is None:
+                img = render_bgr(CROP_ZOOM)
             
             if item_type == 'figure':
+                cropped_img = crop_bbox(img, bbox, scale)
+                if cropped_img is None:
+                    continue
                 img_counter += 1
-                x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                cropped_img = img[y0:y1, x0:x1]
                 img_name = f"{current_id}_{img_counter}.png" if current_id else f"page{page_num+1}_img{img_counter}.png"
                 img_path = os.path.join(img_dir, img_name)
-                cv2.imwrite(img_path, cropped_img)
+                save_crop(writer_pool, img_path, cropped_img)
                 para_buffer += f"\n[IMG_{img_counter}]"
                 print(f"📷 提取图片: {img_name}")
             
             elif item_type == 'table':
+                cropped_table = crop_bbox(img, bbox, scale)
+                if cropped_table is None:
+                    continue
                 table_counter += 1
-                x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                cropped_table = img[y0:y1, x0:x1]
                 table_name = f"{current_id}_table{table_counter}.png" if current_id else f"page{page_num+1}_table{table_counter}.png"
                 table_path = os.path.join(img_dir, table_name)
-                cv2.imwrite(table_path, cropped_table)
+                save_crop(writer_pool, table_path, cropped_table)
                 para_buffer += f"\n[TABLE_{table_counter}]"
                 print(f"📊 提取表格: {table_name}")
     
     except Exception as e:
         print(f"⚠️ PPStructure处理第{page_num+1}页时出错: {str(e)}")
     
-    finally:
-        pdf_document.close()
-    
     return img_counter, table_counter, para_buffer
 
+def fitz_page_chars(page):
+    """
+    用 PyMuPDF 取出页面上的字符，转为与 pdfplumber page.chars 相同键名的字典（text / x0 / x1 / top / bottom）
+    
+    不让 MuPDF 按间距补插空格，与 pdfplumber 只返回 PDF 中实际存在的字符一致
+    """
+    raw = page.get_text("rawdict", flags=fitz.TEXTFLAGS_RAWDICT | fitz.TEXT_INHIBIT_SPACES)
+    return [
+        {'text': char['c'], 'x0': char['bbox'][0], 'x1': char['bbox'][2],
+         'top': char['bbox'][1], 'bottom': char['bbox'][3]}
+        for block in raw['blocks'] if block.get('type', 0) == 0
+        for line in block['lines']
+        for span in line['spans']
+        for char in span['chars']
+    ]
+
+def chars_to_lines(chars, x_tolerance=3, y_tolerance=3):
+    """
+    按 pdfplumber extract_text 的默认规则把字符拼成文本行：
+    top 相差不超过 y_tolerance 的字符聚为一行，行内按 x0 排序，
+    遇空白字符或与前一字符间距超过 x_tolerance 时断词，词之间以空格相连
+    """
+    lines = []
+    current = []
+    last_top = None
+    for char in sorted(chars, key=lambda c: c['top']):
+        if last_top is not None and char['top'] > last_top + y_tolerance:
+            lines.append(current)
+            current = []
+        current.append(char)
+        last_top = char['top']
+    if current:
+        lines.append(current)
+    
+    text_lines = []
+    for line_chars in lines:
+        words = []
+        word = ""
+        prev_x1 = None
+        for char in sorted(line_chars, key=lambda c: c['x0']):
+            if char['text'].isspace():
+                if word:
+                    words.append(word)
+                word = ""
+                prev_x1 = None
+                continue
+            if word and char['x0'] > prev_x1 + x_tolerance:
+                words.append(word)
+                word = ""
+            word += char['text']
+            prev_x1 = char['x1']
+        if word:
+            words.append(word)
+        text_lines.append(" ".join(words))
+    return text_lines
+
+def extract_body_lines(page):
+    """
+    用 PyMuPDF 提取文本页正文：按字符分布动态检测内容区域（过滤页眉页脚和页码，同 detect_content_area），
+    只保留完全落在区域内的字符，再按 pdfplumber 的规则拼行；返回清理后的非空行
+    """
+    chars = fitz_page_chars(page)
+    x0, y0, x1, y1 = content_area_from_chars(chars, page.rect.width, page.rect.height)
+    inside = [char for char in chars
+              if char['x0'] >= x0 and char['x1'] <= x1 and char['top'] >= y0 and char['bottom'] <= y1]
+    return [line.strip() for line in chars_to_lines(inside) if line.strip()]
+
 def extract_text_pdf(pdf_path, output_dir):
     """
     文本型PDF处理器
@@ -354,26 +637,24 @@ def extract_text_pdf(pdf_path, output_dir):
     img_dir = os.path.join(output_dir, "images")
     os.makedirs(img_dir, exist_ok=True)
     
-    text_output = []
     img_counter = 0
     table_counter = 0
     all_text_lines = []  # 收集所有文本行
     
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            print(f"处理第 {page_num + 1}/{len(pdf.pages)} 页")
-            
-            # 动态检测内容区域
-            content_area = detect_content_area(page)
-            crop = page.within_bbox(content_area)
-            text = crop.extract_text()
+    # 版面分析引擎与 fitz 文档只创建一次，供所有页面复用
+    structure_engine = _get_ppstructure()
+    
+    # 正文用 PyMuPDF 取字符后动态检测内容区域并拼行，不再经 pdfplumber 逐字符解析版面
+    with fitz.open(pdf_path) as pdf_document, ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS) as writer_pool:
+        for page_num in range(pdf_document.page_count):
+            print(f"处理第 {page_num + 1}/{pdf_document.page_count} 页")
             
-            if not text:
+            # 按行分割并清理
+            lines = extract_body_lines(pdf_document[page_num])
+            if not lines:
                 print(f"  ⚠️ 第{page_num+1}页未提取到文本")
                 continue
             
-            # 按行分割并清理
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
             all_text_lines.extend(lines)
             
             print(f"  📝 提取了 {len(lines)} 行文本")
@@ -382,7 +663,7 @@ def extract_text_pdf(pdf_path, output_dir):
             try:
                 temp_para_buffer = ""
                 img_counter, table_counter, _ = extract_images_tables_with_ppstructure(
-                    pdf_path, page_num, None, img_counter, table_counter, img_dir, temp_para_buffer
+                    structure_engine, pdf_document, page_num, None, img_counter, table_counter, img_dir, temp_para_buffer, writer_pool
                 )
             except Exception as e:
                 print(f"⚠️ 页面{page_num+1}的PPStructure处理失败: {str(e)}")
@@ -390,30 +671,21 @@ def extract_text_pdf(pdf_path, output_dir):
     # 智能处理文本段落
     print(f"🔄 处理提取的文本，共 {len(all_text_lines)} 行")
     
-    # 使用改进的段落分割逻辑
-    text_output = smart_paragraph_split(all_text_lines)
-    
-    # 保存文本文件
+    # 使用改进的段落分割逻辑，边切分边写入文本文件
     text_file = os.path.join(output_dir, "descriptions.txt")
-    with open(text_file, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(text_output))
+    paragraph_count = write_paragraphs(text_file, iter_smart_paragraphs(all_text_lines))
     
-    print(f"✅ 文本提取完成，共 {len(text_output)} 个段落")
-    return len(text_output), img_counter, table_counter
-
-import re
+    print(f"✅ 文本提取完成，共 {paragraph_count} 个段落")
+    return paragraph_count, img_counter, table_counter
 
-def smart_paragraph_split(text_lines):
-    paragraphs = []
+def iter_smart_paragraphs(text_lines):
+    """
+    按行切分段落并逐段产出（生成器），调用方可边切分边写盘，不必在内存中保留整份段落列表
+    
+    过短的段落（可能是噪声）不产出
+    """
     current_paragraph = []
 
-    # 常见编号格式
-    number_patterns = [
-        r'^\d+[\.\．]',                    # 1. 2. 3.
-        r'^[\[\(（\（]+\d+[\]\)）\）]+',    # [1] (1) （1）
-        r'^\d+[\)）]',                    # 1) 2)
-    ]
-
     # 结构性标题关键词
     SECTION_TITLES = {
         "技术领域": ["技术领域"],
@@ -424,10 +696,7 @@ def smart_paragraph_split(text_lines):
     }
 
     def is_numbered_line(line):
-        for pattern in number_patterns:
-            if re.match(pattern, line):
-                return True
-        return False
+        return NUMBERED_LINE_PATTERN.match(line) is not None
 
     def is_title_like(line):
         return len(line) < 50 and (line.isupper() or line.endswith('：') or line.endswith(':'))
@@ -440,11 +709,6 @@ def smart_paragraph_split(text_lines):
                     return section
         return None
 
-    def fix_chinese_soft_breaks(s):
-        s = re.sub(r'-\s+', '', s)
-        s = re.sub(r'(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])', '', s)
-        return s
-
     for i, line in enumerate(text_lines):
         line = line.strip()
         if not line:
@@ -455,12 +719,12 @@ def smart_paragraph_split(text_lines):
             # 保存当前段落
             if current_paragraph:
                 paragraph_text = fix_chinese_soft_breaks(" ".join(current_paragraph))
-                if paragraph_text.strip():
-                    paragraphs.append(paragraph_text)
+                if len(paragraph_text.strip()) > 1:
+                    yield paragraph_text
                 current_paragraph = []
 
             # 小标题独立成段
-            paragraphs.append(section)
+            yield section
             continue
 
         is_new_paragraph = False
@@ -473,26 +737,329 @@ def smart_paragraph_split(text_lines):
 
         if is_new_paragraph and current_paragraph:
             paragraph_text = fix_chinese_soft_breaks(" ".join(current_paragraph))
-            if paragraph_text.strip():
-                paragraphs.append(paragraph_text)
+            if len(paragraph_text.strip()) > 1:
+                yield paragraph_text
             current_paragraph = []
 
         current_paragraph.append(line)
 
     if current_paragraph:
         paragraph_text = fix_chinese_soft_breaks(" ".join(current_paragraph))
-        if paragraph_text.strip():
-            paragraphs.append(paragraph_text)
+        if len(paragraph_text.strip()) > 1:
+            yield paragraph_text
+
+def smart_paragraph_split(text_lines):
+    """切分段落并返回完整列表（需要随机访问段落时使用）"""
+    return list(iter_smart_paragraphs(text_lines))
+
+def _create_image_pdf_engines():
+    """创建图片型PDF处理所需的 OCR 引擎与结构分析引擎"""
+    # 初始化OCR引擎
+    print("🔧 初始化OCR引擎...")
+    ocr_engine = get_ocr(use_gpu=False)
+    
+    # 初始化结构分析引擎
+    print("🔧 初始化结构分析引擎...")
+    structure_engine = PPStructure(
+        recovery=True,
+        lang='ch',
+        show_log=False
+    )
+    return ocr_engine, structure_engine
+
+def render_gray_page(pdf_document, page_num):
+    """将页面渲染为灰度图片（扫描页 2 倍缩放已足够OCR，单通道数据量仅为RGB的1/3；长边不超过 MAX_RENDER_SIDE）"""
+    page = pdf_document[page_num]
+    zoom = min(IMAGE_PAGE_ZOOM, MAX_RENDER_SIDE / max(page.rect.width, page.rect.height, 1))
+    mat = fitz.Matrix(zoom, zoom)
+    pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+    
+    # 直接读取像素缓冲区转为numpy数组，省去PNG编码/解码
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+def run_structure(structure_engine, page_num, original_img):
+    """PPStructure结构化分析，失败时返回 None"""
+    print(f"🔬 第 {page_num + 1} 页PPStructure结构化分析...")
+    try:
+        return structure_engine(original_img)
+    except Exception as e:
+        print(f"⚠️ PPStructure分析失败: {str(e)}")
+        return None
+
+def analyze_image_page(original_img, structure_result, plumber_page):
+    """
+    解析单页的版面结果；PPStructure未提取到文本时裁剪出内容区域，留待 apply_fallback_ocr 跨页批量OCR
+    
+    Returns:
+        tuple: (page_items, ocr_img)
+            page_items: 按阅读顺序排列的 (类型, 内容)，类型为 'text' / 'figure' / 'table'，
+                        图表内容为裁剪出的图像，编号与写盘由调用方按页序统一完成
+            ocr_img: 需要纯OCR回退的内容区域图像，不需要时为 None
+    """
+    page_items = []
+    structure_success = False
+    
+    # 方法1: 使用PPStructure结构化分析结果
+    try:
+        if structure_result:
+            # 按y坐标排序，保证阅读顺序
+            structure_result = order_by_y(structure_result, [x['bbox'][1] for x in structure_result])
+            
+            for item in structure_result:
+                bbox = item['bbox']
+                item_type = item['type']
+                
+                if item_type == 'text':
+                    # 处理文本区域
+                    text_content = item.get('res', [])
+                    if isinstance(text_content, list) and text_content:
+                        for text_item in text_content:
+                            if isinstance(text_item, dict) and 'text' in text_item:
+                                confidence = text_item.get('confidence', 0)
+                                if confidence > STRUCTURE_TEXT_CONFIDENCE:
+                                    page_items.append(('text', text_item['text']))
+                                    structure_success = True
+                                elif confidence > STRUCTURE_LOW_TEXT_CONFIDENCE:
+                                    # 先按原位置占位，仅当本页没有高置信度文本时才启用
+                                    page_items.append(('low_text', text_item['text']))
+                            elif isinstance(text_item, str):
+                                page_items.append(('text', text_item))
+                                structure_success = True
+                
+                elif item_type in ('figure', 'table'):
+                    # 处理图片/表格
+                    cropped = crop_bbox(original_img, bbox)
+                    if cropped is not None:
+                        page_items.append((item_type, cropped))
+    
+    except Exception as e:
+        print(f"⚠️ PPStructure分析失败: {str(e)}")
+    
+    # PPStructure 已对文本区域做过检测与识别：没有高置信度文本时，放宽阈值复用这些结果，不再整页重做OCR
+    has_low_text = any(item_type == 'low_text' for item_type, _ in page_items)
+    if not structure_success and has_low_text:
+        print(f"🔁 复用PPStructure低置信度文本（阈值 {STRUCTURE_LOW_TEXT_CONFIDENCE}）")
+        page_items = [('text', content) if item_type == 'low_text' else (item_type, content)
+                      for item_type, content in page_items]
+        structure_success = True
+    else:
+        page_items = [item for item in page_items if item[0] != 'low_text']
+    
+    # 方法2: 如果PPStructure没有提取到任何可用文本，使用纯OCR
+    ocr_img = None
+    if not structure_success:
+        print("🔤 使用纯OCR模式...")
+        try:
+            # 在OCR之前添加内容区域检测和裁剪
+            content_area = detect_content_area(plumber_page)
+            x0, y0, x1, y1 = [int(coord) for coord in content_area]
+
+            # 裁剪图片到内容区域
+            h, w = original_img.shape[:2]
+            ocr_img = original_img[
+                int(y0 * h / plumber_page.height):int(y1 * h / plumber_page.height),
+                int(x0 * w / plumber_page.width):int(x1 * w / plumber_page.width)
+            ]
+        
+        except Exception as e:
+            print(f"❌ OCR处理失败: {str(e)}")
+    
+    return page_items, ocr_img
+
+def apply_fallback_ocr(ocr_engine, analyzed_pages):
+    """
+    对需要纯OCR回退的页面批量OCR，识别出的文本行追加到各自的 page_items
+    
+    Args:
+        analyzed_pages: [(页序号, page_items, ocr_img), ...]，ocr_img 为 None 的页面不处理
+    
+    Returns:
+        list: [(页序号, page_items), ...]，顺序与输入一致
+    """
+    pending = [(page_items, ocr_img) for _, page_items, ocr_img in analyzed_pages if ocr_img is not None]
+    if pending:
+        try:
+            processed_imgs = [preprocess_image(ocr_img) for _, ocr_img in pending]
+            for (page_items, _), lines in zip(pending, ocr_lines_batch(ocr_engine, processed_imgs, return_boxes=True)):
+                # 按行框左上角 y 排序，置信度过滤
+                lines = order_by_y(lines, [box[0][1] for _, _, box in lines])
+                page_items.extend(('text', text) for text, confidence, _ in lines if confidence > OCR_FALLBACK_CONFIDENCE)
+        except Exception as e:
+            print(f"❌ OCR处理失败: {str(e)}")
+    return [(page_num, page_items) for page_num, page_items, _ in analyzed_pages]
 
-    # 过滤过短的段落（可能是噪声）
-    filtered_paragraphs = [p for p in paragraphs if len(p.strip()) > 1]
+def batch_fallback_ocr(ocr_engine, analyzed_pages):
+    """
+    按页序逐页产出 (页序号, page_items)：不需要OCR回退的页面直接产出，
+    需要回退的页面攒够 OCR_FALLBACK_BATCH_PAGES 页（或输入结束）后一起识别，其后的页面随之缓存以保持页序
+    
+    Args:
+        analyzed_pages: 可迭代的 (页序号, page_items, ocr_img)
+    """
+    buffered = []
+    ocr_pages = 0
+    for page_num, page_items, ocr_img in analyzed_pages:
+        buffered.append((page_num, page_items, ocr_img))
+        if ocr_img is not None:
+            ocr_pages += 1
+        if ocr_pages == 0 or ocr_pages >= OCR_FALLBACK_BATCH_PAGES:
+            yield from apply_fallback_ocr(ocr_engine, buffered)
+            buffered = []
+            ocr_pages = 0
+    if buffered:
+        yield from apply_fallback_ocr(ocr_engine, buffered)
+
+def save_page_items(page_num, page_items, img_dir, img_counter, table_counter, writer_pool):
+    """
+    按页序为图表编号并提交到 writer_pool 后台写盘，返回本页文本行（图表处插入标记）与更新后的计数
+    """
+    page_text_lines = []
+    for item_type, content in page_items:
+        if item_type == 'text':
+            page_text_lines.append(content)
+        elif item_type == 'figure':
+            img_counter += 1
+            img_name = f"page{page_num+1}_img{img_counter}.png"
+            save_crop(writer_pool, os.path.join(img_dir, img_name), content)
+            page_text_lines.append(f"[IMG_{img_counter}]")
+            print(f"  📷 提取图片: {img_name}")
+        else:
+            table_counter += 1
+            table_name = f"page{page_num+1}_table{table_counter}.png"
+            save_crop(writer_pool, os.path.join(img_dir, table_name), content)
+            page_text_lines.append(f"[TABLE_{table_counter}]")
+            print(f"  📊 提取表格: {table_name}")
+    return page_text_lines, img_counter, table_counter
 
-    return filtered_paragraphs
+def _init_page_worker(process_count):
+    """进程池初始化：每个工作进程创建自己的引擎（Paddle 预测器不能跨进程共享），CPU 推理线程按进程数均分"""
+    global _page_worker_engines
+    reset_ocr(process_count)
+    _page_worker_engines = _create_image_pdf_engines()
+
+def _process_page_range(pdf_path, page_nums):
+    """
+    在工作进程中顺序处理一段页面，自行打开文档
+    
+    Returns:
+        list: [(页序号, page_items), ...]
+    """
+    ocr_engine, structure_engine = _page_worker_engines
+    with fitz.open(pdf_path) as pdf_document, pdfplumber.open(pdf_path) as plumber_pdf:
+        def analyze_all():
+            for page_num in page_nums:
+                print(f"\n--- 📄 处理第 {page_num + 1} 页 (进程 {os.getpid()}) ---")
+                original_img = render_gray_page(pdf_document, page_num)
+                structure_result = run_structure(structure_engine, page_num, original_img)
+                yield (page_num, *analyze_image_page(original_img, structure_result, plumber_pdf.pages[page_num]))
+        
+        return list(batch_fallback_ocr(ocr_engine, analyze_all()))
+
+def _iter_pages_in_process(pdf_path, page_nums):
+    """
+    单进程处理：渲染、结构分析、解析/OCR 分三个线程流水执行，
+    第 N 页解析时，第 N+1 页已在渲染/分析中；按 page_nums 顺序逐页产出 (页序号, page_items)
+    """
+    ocr_engine, structure_engine = _create_image_pdf_engines()
+    
+    # 打开PDF（启动后仅由渲染线程访问）
+    pdf_document = fitz.open(pdf_path)
+    total_pages = pdf_document.page_count
+    
+    q_render = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    q_struct = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()  # 调用方提前结束（或出错）时通知各阶段退出
+    
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+    
+    # 各阶段出错时把异常对象放入队列传给下游，由调用方线程重新抛出，不会被当作正常结束而丢页
+    # 阶段A：逐页渲染
+    def render_all():
+        try:
+            for page_num in page_nums:
+                if stop.is_set():
+                    break
+                put(q_render, (page_num, render_gray_page(pdf_document, page_num)))
+        except Exception as e:
+            put(q_render, e)
+        finally:
+            put(q_render, None)
+    
+    # 阶段B：PPStructure结构化分析
+    def structure_all():
+        try:
+            while True:
+                item = get(q_render)
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    put(q_struct, item)
+                    break
+                page_num, original_img = item
+                put(q_struct, (page_num, original_img, run_structure(structure_engine, page_num, original_img)))
+        except Exception as e:
+            put(q_struct, e)
+        finally:
+            put(q_struct, None)
+    
+    threads = [threading.Thread(target=render_all, daemon=True), threading.Thread(target=structure_all, daemon=True)]
+    for thread in threads:
+        thread.start()
+    
+    # 纯OCR回退时用于检测内容区域（fitz 文档归渲染线程使用，这里单独打开）
+    plumber_pdf = pdfplumber.open(pdf_path)
+    
+    # 阶段C（当前线程）：解析版面结果，按页序消费
+    def analyze_all():
+        while True:
+            stage_result = get(q_struct)
+            if stage_result is None:
+                break
+            if isinstance(stage_result, Exception):
+                raise stage_result
+            page_num, original_img, structure_result = stage_result
+            
+            print(f"\n--- 📄 处理第 {page_num + 1}/{total_pages} 页 ---")
+            yield (page_num, *analyze_image_page(original_img, structure_result, plumber_pdf.pages[page_num]))
+    
+    try:
+        # 需要纯OCR回退的页面攒批识别
+        yield from batch_fallback_ocr(ocr_engine, analyze_all())
+    finally:
+        stop.set()
+        # 丢弃队列中未消费的页面，释放图像内存
+        for q in (q_render, q_struct):
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        for thread in threads:
+            thread.join()
+        plumber_pdf.close()
+        pdf_document.close()
 
 def extract_image_pdf(pdf_path, output_dir):
     """
     图片型PDF处理器
     
+    多页时按连续页段分发到进程池并行处理（每个进程各自加载模型），
+    否则在本进程内以渲染/结构分析/解析三线程流水执行
+    
     Args:
         pdf_path: PDF文件路径
         output_dir: 输出目录
@@ -504,170 +1071,160 @@ def extract_image_pdf(pdf_path, output_dir):
     img_dir = os.path.join(output_dir, "images")
     os.makedirs(img_dir, exist_ok=True)
     
-    # 初始化OCR引擎
-    print("🔧 初始化OCR引擎...")
-    ocr_engine = PaddleOCR(
-        use_angle_cls=True,
-        lang='ch',
-        use_gpu=False,
-        show_log=False
-    )
+    # 页面结果缓存：按页面原始内容计算键（无需渲染），命中的页面不再交给OCR
+    page_cache = open_page_cache()
+    cache_keys = {}  # 未命中缓存的页序号 -> 缓存键
+    cached_items = {}  # 命中缓存的页序号 -> page_items
     
-    # 初始化结构分析引擎
-    print("🔧 初始化结构分析引擎...")
-    structure_engine = PPStructure(
-        recovery=True,
-        lang='ch',
-        show_log=False
-    )
+    with fitz.open(pdf_path) as pdf_document:
+        total_pages = pdf_document.page_count
+        if page_cache is not None:
+            # 渲染、版面分析过滤与OCR回退的设置都会改变页面结果
+            cache_settings = (ocr_settings(use_gpu=False), IMAGE_PAGE_ZOOM, MAX_RENDER_SIDE, LAYOUT_ZOOM, CROP_ZOOM,
+                              STRUCTURE_TEXT_CONFIDENCE, STRUCTURE_LOW_TEXT_CONFIDENCE, OCR_FALLBACK_CONFIDENCE)
+            for page_num in range(total_pages):
+                cache_key = page_cache_key("descriptions_image", pdf_document, pdf_document[page_num], cache_settings)
+                cached = page_cache.get(cache_key)
+                if cached is not None:
+                    cached_items[page_num] = cached
+                else:
+                    cache_keys[page_num] = cache_key
     
-    # 打开PDF
-    pdf_document = fitz.open(pdf_path)
-    total_pages = pdf_document.page_count
+    pending_pages = [page_num for page_num in range(total_pages) if page_num not in cached_items]
     
     all_text_lines = []  # 收集所有文本行
     img_counter = 0
     table_counter = 0
     
     print(f"📖 PDF总页数: {total_pages}")
+    if cached_items:
+        print(f"♻️ 命中页面缓存 {len(cached_items)} 页，待处理 {len(pending_pages)} 页")
     
-    for page_num in range(total_pages):
-        print(f"\n--- 📄 处理第 {page_num + 1}/{total_pages} 页 ---")
-        
-        page = pdf_document[page_num]
-        
-        # 转换为高分辨率图片
-        mat = fitz.Matrix(3.0, 3.0)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        # 转换为numpy数组
-        nparr = np.frombuffer(img_data, np.uint8)
-        original_img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # 图片预处理
-        processed_img = preprocess_image(original_img)
-        
-        page_text_lines = []
-        structure_success = False
-        
-        # 方法1: 尝试使用PPStructure进行结构化分析
-        print("🔬 尝试PPStructure结构化分析...")
-        try:
-            structure_result = structure_engine(original_img)
+    workers = min(max(1, (os.cpu_count() or 1) // 2), MAX_PAGE_WORKERS, len(pending_pages))
+    
+    if workers > 1:
+        # 按连续页段切分，每个进程顺序处理一段；map 按提交顺序返回，保证页序
+        print(f"🚀 使用 {workers} 个进程并行处理页面")
+        page_ranges = [chunk.tolist() for chunk in np.array_split(np.array(pending_pages), workers)]
+        # spawn 启动：本进程可能已加载 Paddle/OpenMP，fork 出的子进程会继承其线程池状态而卡死
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(workers,),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            range_results = executor.map(_process_page_range, [pdf_path] * workers, page_ranges)
+            page_results = [page_result for results in range_results for page_result in results]
+    elif pending_pages:
+        page_results = _iter_pages_in_process(pdf_path, pending_pages)
+    else:
+        page_results = []
+    
+    # 与缓存结果按页序合并
+    def iter_all_pages():
+        computed = iter(page_results)
+        for page_num in range(total_pages):
+            if page_num in cached_items:
+                yield page_num, cached_items[page_num]
+            else:
+                yield next(computed)
+    
+    # 按页序为图表编号并后台写盘，汇总文本；退出 with 时等待所有图片写完
+    with ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS) as writer_pool:
+        for page_num, page_items in iter_all_pages():
+            if page_num in cache_keys:
+                page_cache[cache_keys[page_num]] = page_items
             
-            if structure_result:
-                # 按y坐标排序，保证阅读顺序
-                structure_result.sort(key=lambda x: x['bbox'][1])
-                
-                for item in structure_result:
-                    bbox = item['bbox']
-                    item_type = item['type']
-                    
-                    if item_type == 'text':
-                        # 处理文本区域
-                        text_content = item.get('res', [])
-                        if isinstance(text_content, list) and text_content:
-                            for text_item in text_content:
-                                if isinstance(text_item, dict) and 'text' in text_item:
-                                    confidence = text_item.get('confidence', 0)
-                                    if confidence > 0.5:
-                                        page_text_lines.append(text_item['text'])
-                                        structure_success = True
-                                elif isinstance(text_item, str):
-                                    page_text_lines.append(text_item)
-                                    structure_success = True
-                    
-                    elif item_type == 'figure':
-                        # 处理图片
-                        img_counter += 1
-                        x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                        
-                        h, w = original_img.shape[:2]
-                        x0, x1 = max(0, min(x0, w)), max(0, min(x1, w))
-                        y0, y1 = max(0, min(y0, h)), max(0, min(y1, h))
-                        
-                        if x1 > x0 and y1 > y0:
-                            cropped_img = original_img[y0:y1, x0:x1]
-                            img_name = f"page{page_num+1}_img{img_counter}.png"
-                            img_path = os.path.join(img_dir, img_name)
-                            cv2.imwrite(img_path, cropped_img)
-                            page_text_lines.append(f"[IMG_{img_counter}]")
-                            print(f"  📷 提取图片: {img_name}")
-                    
-                    elif item_type == 'table':
-                        # 处理表格
-                        table_counter += 1
-                        x0, y0, x1, y1 = [int(coord) for coord in bbox]
-                        
-                        h, w = original_img.shape[:2]
-                        x0, x1 = max(0, min(x0, w)), max(0, min(x1, w))
-                        y0, y1 = max(0, min(y0, h)), max(0, min(y1, h))
-                        
-                        if x1 > x0 and y1 > y0:
-                            cropped_table = original_img[y0:y1, x0:x1]
-                            table_name = f"page{page_num+1}_table{table_counter}.png"
-                            table_path = os.path.join(img_dir, table_name)
-                            cv2.imwrite(table_path, cropped_table)
-                            page_text_lines.append(f"[TABLE_{table_counter}]")
-                            print(f"  📊 提取表格: {table_name}")
-        
-        except Exception as e:
-            print(f"⚠️ PPStructure分析失败: {str(e)}")
-        
-        # 方法2: 如果PPStructure没有成功提取文本，使用纯OCR
-        if not structure_success:
-            print("🔤 使用纯OCR模式...")
-            try:
-                # 在OCR之前添加内容区域检测和裁剪
-                page = pdf_document[page_num]
-                content_area = detect_content_area(page)
-                x0, y0, x1, y1 = [int(coord) for coord in content_area]
-
-                # 裁剪图片到内容区域
-                h, w = original_img.shape[:2]
-                content_img = original_img[
-                    int(y0 * h / page.height):int(y1 * h / page.height),
-                    int(x0 * w / page.width):int(x1 * w / page.width)
-                ]
-
-                # 对裁剪后的图片进行OCR处理
-                processed_img = preprocess_image(content_img)
-                ocr_result = ocr_engine.ocr(processed_img, cls=True)
-                
-                if ocr_result and ocr_result[0]:
-                    # 按照y坐标排序OCR结果
-                    ocr_lines = sorted(ocr_result[0], key=lambda x: x[0][0][1])
-                    
-                    for line in ocr_lines:
-                        text = line[1][0]
-                        confidence = line[1][1]
-                        
-                        # 置信度过滤
-                        if confidence > 0.6:
-                            page_text_lines.append(text)
+            page_text_lines, img_counter, table_counter = save_page_items(
+                page_num, page_items, img_dir, img_counter, table_counter, writer_pool
+            )
             
-            except Exception as e:
-                print(f"❌ OCR处理失败: {str(e)}")
-        
-        # 将页面文本添加到总文本中
-        if page_text_lines:
-            all_text_lines.extend(page_text_lines)
-        else:
-            print("  ⚠️ 本页未提取到文本")
+            # 将页面文本添加到总文本中
+            if page_text_lines:
+                all_text_lines.extend(page_text_lines)
+            else:
+                print(f"  ⚠️ 第{page_num+1}页未提取到文本")
     
-    pdf_document.close()
+    if page_cache is not None:
+        page_cache.close()
     
     # 智能处理文本段落
     print(f"\n🔄 处理提取的文本，共 {len(all_text_lines)} 行")
-    text_output = smart_paragraph_split(all_text_lines)
+    # 边切分边写入文本文件
+    text_file = os.path.join(output_dir, "descriptions.txt")
+    paragraph_count = write_paragraphs(text_file, iter_smart_paragraphs(all_text_lines))
     
-    # 保存文本文件
+    return paragraph_count, img_counter, table_counter
+
+def extract_mixed_pdf(pdf_path, output_dir, text_cache=None):
+    """
+    混合型PDF处理器：逐页判断类型，文本页走文本提取 + PPStructure图表提取，
+    图片页走渲染 + 结构分析/OCR，避免整份按文本模式处理时扫描页丢失文本
+    
+    图片页所需的 OCR / 结构分析引擎与 pdfplumber 文档在遇到第一张图片页时才创建
+    
+    Args:
+        pdf_path: PDF文件路径
+        output_dir: 输出目录
+        text_cache: 可选，detect_pdf_type 已提取的采样页文本 {页序号: 文本}，这些页判断类型时不再重新提取
+    """
+    print(f"📄🖼️ 使用混合型PDF逐页处理模式: {os.path.basename(pdf_path)}")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    img_dir = os.path.join(output_dir, "images")
+    os.makedirs(img_dir, exist_ok=True)
+    
+    all_text_lines = []  # 按页序收集所有文本行
+    img_counter = 0
+    table_counter = 0
+    text_engine = _get_ppstructure()
+    image_engines = None  # (ocr_engine, structure_engine)
+    plumber_pdf = None  # 纯OCR回退时用于检测内容区域
+    
+    try:
+        with fitz.open(pdf_path) as pdf_document, ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS) as writer_pool:
+            total_pages = pdf_document.page_count
+            for page_num in range(total_pages):
+                page = pdf_document[page_num]
+                text = text_cache.get(page_num) if text_cache else None
+                if text is None:
+                    text = page.get_text("text")
+                page_type = _classify_page(text)
+                print(f"\n--- 📄 处理第 {page_num + 1}/{total_pages} 页 ({'文本页' if page_type == 'text' else '图片页'}) ---")
+                
+                if page_type == 'text':
+                    lines = extract_body_lines(page)
+                    try:
+                        img_counter, table_counter, _ = extract_images_tables_with_ppstructure(
+                            text_engine, pdf_document, page_num, None, img_counter, table_counter, img_dir, "", writer_pool
+                        )
+                    except Exception as e:
+                        print(f"⚠️ 页面{page_num+1}的PPStructure处理失败: {str(e)}")
+                else:
+                    if image_engines is None:
+                        image_engines = _create_image_pdf_engines()
+                        plumber_pdf = pdfplumber.open(pdf_path)
+                    ocr_engine, structure_engine = image_engines
+                    original_img = render_gray_page(pdf_document, page_num)
+                    structure_result = run_structure(structure_engine, page_num, original_img)
+                    page_items, ocr_img = analyze_image_page(original_img, structure_result, plumber_pdf.pages[page_num])
+                    # 混合型文档按页序逐页写出，回退OCR不跨页攒批
+                    page_items = apply_fallback_ocr(ocr_engine, [(page_num, page_items, ocr_img)])[0][1]
+                    lines, img_counter, table_counter = save_page_items(
+                        page_num, page_items, img_dir, img_counter, table_counter, writer_pool
+                    )
+                
+                if lines:
+                    all_text_lines.extend(lines)
+                else:
+                    print(f"  ⚠️ 第{page_num+1}页未提取到文本")
+    finally:
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+    
+    # 智能处理文本段落
+    print(f"\n🔄 处理提取的文本，共 {len(all_text_lines)} 行")
+    # 边切分边写入文本文件
     text_file = os.path.join(output_dir, "descriptions.txt")
-    with open(text_file, "w", encoding="utf-8") as f:
-        f.write("\n\n".join(text_output))
+    paragraph_count = write_paragraphs(text_file, iter_smart_paragraphs(all_text_lines))
     
-    return len(text_output), img_counter, table_counter
+    return paragraph_count, img_counter, table_counter
 
 def convert_text_to_json(text_file, json_file):
     """
@@ -752,8 +1309,9 @@ def smart_extract_pdf(pdf_path, output_dir):
     
     print(f"🚀 开始智能处理PDF: {os.path.basename(pdf_path)}")
     
-    # 第一步：检测PDF类型
-    pdf_type = detect_pdf_type(pdf_path)
+    # 第一步：检测PDF类型（记录采样页文本，混合型逐页判断时复用）
+    text_cache = {}
+    pdf_type = detect_pdf_type(pdf_path, text_cache=text_cache)
     
     # 第二步：选择对应的处理方法
     if pdf_type == 'text':
@@ -761,9 +1319,8 @@ def smart_extract_pdf(pdf_path, output_dir):
     elif pdf_type == 'image':
         paragraphs, images, tables = extract_image_pdf(pdf_path, output_dir)
     else:  # mixed
-        print("📄🖼️ 混合型PDF，使用修复版文本模式处理（主要逻辑）+ OCR补充")
-        # 混合型使用修复版文本模式，后续可以优化为逐页判断
-        paragraphs, images, tables = extract_text_pdf(pdf_path, output_dir)
+        print("📄🖼️ 混合型PDF，逐页判断类型分别处理")
+        paragraphs, images, tables = extract_mixed_pdf(pdf_path, output_dir, text_cache)
         
     print(f"\n✅ 处理完成！")
     print(f"   📊 PDF类型: {pdf_type}")
@@ -777,6 +1334,56 @@ def smart_extract_pdf(pdf_path, output_dir):
         'tables': tables
     }
 
+def _init_document_worker(process_count):
+    """文档级进程池初始化：记录进程数并关闭页段级多进程，避免进程数相乘；CPU 推理线程按进程数均分"""
+    global _ppstructure, MAX_PAGE_WORKERS
+    reset_ocr(process_count)
+    _ppstructure = None
+    MAX_PAGE_WORKERS = 1
+
+def _smart_extract_one(pdf_path, output_dir):
+    """在文档级工作进程中处理单份PDF，失败时返回 None（引擎在进程内首次使用时加载，后续文档复用）"""
+    try:
+        return smart_extract_pdf(pdf_path, output_dir)
+    except Exception as e:
+        print(f"❌ 处理 {os.path.basename(pdf_path)} 失败: {str(e)}")
+        return None
+
+def batch_smart_extract(pdf_paths, output_root, workers=None):
+    """
+    批量智能提取：按文档分发到进程池，每份PDF输出到 output_root/<文件名>
+    
+    PyMuPDF 的大部分操作持有 GIL，多文档时按文档开进程比单文档内开线程更能利用多核
+    
+    Args:
+        pdf_paths: PDF文件路径列表
+        output_root: 输出根目录
+        workers: 进程数，默认不超过 CPU 数、MAX_DOCUMENT_WORKERS 与文档数
+    
+    Returns:
+        dict: {pdf_path: smart_extract_pdf 的结果，失败为 None}
+    """
+    if not pdf_paths:
+        return {}
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAX_DOCUMENT_WORKERS, len(pdf_paths))
+    
+    output_dirs = [os.path.join(output_root, os.path.splitext(os.path.basename(pdf_path))[0]) for pdf_path in pdf_paths]
+    
+    print(f"🚀 使用 {workers} 个进程并行处理 {len(pdf_paths)} 份PDF")
+    # 与页段进程池一样以 spawn 启动
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_document_worker, initargs=(workers,),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(_smart_extract_one, pdf_path, output_dir): pdf_path
+            for pdf_path, output_dir in zip(pdf_paths, output_dirs)
+        }
+        # 按完成顺序收集，先完成的文档不必等待前面的长文档
+        results = {}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
 # 用法示例
 if __name__ == "__main__":
     pdf_path = r"/workspace/no1/test_do/CN212149980U.pdf"
@@ -792,4 +1399,4 @@ if __name__ == "__main__":
         
     except ImportError as e:
         print(f"❌ 依赖库缺失: {str(e)}")
-        print("💡 请安装: pip install paddlepaddle paddleocr PyMuPDF opencv-python pdfplumber pillow")
\ No newline at end of file
+        print("💡 请安装: pip install paddlepaddle paddleocr PyMuPDF opencv-python pdfplumber")
\ No newline at end of file
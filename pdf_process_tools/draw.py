@@ -1,103 +1,207 @@
 import os
 import re
+import multiprocessing
 import cv2
-import pdfplumber
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import fitz  # PyMuPDF
 import numpy as np
-from PIL import Image
-from paddleocr import PaddleOCR
+from ocr_engine import get_ocr, reset_ocr
 
-ocr = PaddleOCR(use_angle_cls=False, lang='ch')  # 中文 OCR
+# 附图多为线条图，JPEG 会在笔画边缘产生振铃伪影，因此保持无损 PNG；
+# 低压缩级别 + RLE 策略（与 descriptions_ocr 相同）换取更快的编码
+PNG_WRITE_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
 
-def extract_figures_by_label(pdf_path, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    last_page_number = None  # 用于记录最后一个有效页码
+# 页码候选可能的最高总分（格式 6 + 位置 3+2 + 合理性 2）：达到即不可能被后续候选超过
+# （排序稳定，同分取先出现者），不再继续扫描剩余页脚文本
+PAGE_NUMBER_MAX_SCORE = 13
+
+# 后台写图线程数（cv2.imwrite 编码时会释放 GIL）
+IMAGE_WRITER_WORKERS = 4
+
+# OCR 只需定位“图N”标签与页码，用较低分辨率渲染；裁剪输出仍用高分辨率
+OCR_DPI = 150
+CROP_DPI = 300
+
+# 并行渲染+OCR的最大进程数（每个进程各加载一份 OCR 模型）
+MAX_PAGE_WORKERS = 4
+
+# 图标签与页码识别用到的正则，模块加载时编译一次
+FIGURE_LABEL_PATTERN = re.compile(r'^图\s?\d+')
+PLAIN_PAGE_NUMBER_PATTERN = re.compile(r'^\d{1,3}$')
+DASHED_PAGE_NUMBER_PATTERN = re.compile(r'^-\d{1,3}$')
+CN_PAGE_NUMBER_PATTERN = re.compile(r'^第?\s*(\d{1,3})\s*页?$')
+DIGITS_PATTERN = re.compile(r'\d+')
+
+def _init_page_worker(process_count):
+    """进程池初始化：记录进程数，本进程首次使用时才创建 OCR 实例（CPU 推理线程按进程数均分）"""
+    reset_ocr(process_count)
+
+def analyze_page(page):
+    """
+    单页OCR与图标签裁剪（不依赖其他页面，可在工作进程中执行）
     
-    with pdfplumber.open(pdf_path) as pdf:
-        total_pages = len(pdf.pages)
-        
-        for i, page in enumerate(pdf.pages):
-            pil_img = page.to_image(resolution=300).original.convert("RGB")
-            img_cv = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-            height, width = img_cv.shape[:2]
-
-            # OCR 识别 - 分两部分进行
-            # 1. 全页面OCR，用于识别图标签
-            full_results = ocr.ocr(np.array(pil_img), cls=False)
-            if not full_results or not full_results[0]:
-                print(f"⚠️ Page {i+1}: 未检测到任何文字")
-                continue
+    Returns:
+        None: 页面未检测到任何文字
+        dict: height/width、页脚OCR结果（已换算为整页坐标）、按从下往上顺序的 (标签, BGR裁剪图) 列表
+    """
+    # 直接用 PyMuPDF 渲染为 RGB 数组，避免 pdfplumber 的图像转换开销
+    # OCR 用 OCR_DPI 的低分辨率图（检测耗时与像素数成正比），同一份数组供两次 OCR 复用
+    pix = page.get_pixmap(dpi=OCR_DPI, alpha=False)
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    height, width = rgb.shape[:2]
+    page_label = f"Page {page.number + 1}"
 
-            # 2. 页面底部30%区域OCR，专门用于页码识别
-            footer_start = int(height * 0.7)  # 从70%位置开始到底部
-            footer_img = np.array(pil_img)[footer_start:, :]  # 裁剪底部30%区域
-            
-            print(f"📄 Page {i+1}: 页面尺寸 {width}x{height}, 页码识别区域: {footer_start}-{height}")
-            
-            footer_results = ocr.ocr(footer_img, cls=False)
-            
-            # 调整页脚OCR结果的坐标，因为我们裁剪了图像
-            adjusted_footer_results = []
-            if footer_results and footer_results[0]:
-                for line in footer_results[0]:
-                    # 调整坐标，加上footer_start偏移量
-                    adjusted_points = [[x, y + footer_start] for x, y in line[0]]
-                    adjusted_line = [adjusted_points, line[1]]
-                    adjusted_footer_results.append(adjusted_line)
-
-            # 页码提取 - 只使用底部30%区域的OCR结果
-            page_number = extract_page_number_from_footer(adjusted_footer_results, height, width, i+1, total_pages, last_page_number)
-            
-            if page_number is None:
-                print(f"⚠️ Page {i+1}: 未检测到页码，且无法推断")
+    # OCR 识别 - 分两部分进行
+    # 1. 全页面OCR，用于识别图标签
+    full_results = get_ocr().ocr(rgb, cls=False)
+    if not full_results or not full_results[0]:
+        print(f"⚠️ {page_label}: 未检测到任何文字")
+        return None
+
+    # 2. 页面底部30%区域OCR，专门用于页码识别
+    footer_start = int(height * 0.7)  # 从70%位置开始到底部
+    # 裁剪底部30%区域，直接传三通道切片（灰度图会被 PaddleOCR 立即转回三通道，转换反而多做两次）
+    footer_img = rgb[footer_start:, :]
+    
+    print(f"📄 {page_label}: 页面尺寸 {width}x{height}, 页码识别区域: {footer_start}-{height}")
+    
+    footer_results = get_ocr().ocr(footer_img, cls=False)
+    
+    # 调整页脚OCR结果的坐标，因为我们裁剪了图像
+    adjusted_footer_results = []
+    if footer_results and footer_results[0]:
+        for line in footer_results[0]:
+            # 调整坐标，加上footer_start偏移量
+            adjusted_points = [[x, y + footer_start] for x, y in line[0]]
+            adjusted_line = [adjusted_points, line[1]]
+            adjusted_footer_results.append(adjusted_line)
+
+    # 识别图号标签 - 使用全页面OCR结果（上/下边界与标签文本分列保存，便于直接转为数组）
+    label_tops = []
+    label_bottoms = []
+    labels = []
+    for line in full_results[0]:
+        text = line[1][0] if isinstance(line[1], (list, tuple)) else str(line[1])
+        if FIGURE_LABEL_PATTERN.match(text.strip()):
+            try:
+                points = line[0]
+                y_coords = [p[1] for p in points]
+                y_top = min(y_coords)
+                y_bottom = max(y_coords)
+                label_tops.append(y_top)
+                label_bottoms.append(y_bottom)
+                labels.append(text.strip().replace(" ", ""))
+            except Exception as e:
+                print(f"⚠️ 坐标解析错误: {e}")
                 continue
-            else:
-                # 更新最后一个有效页码
-                last_page_number = int(page_number)
-
-            print(f"📄 Page {i+1}: 页码为 {page_number}")
-
-            # 识别图号标签 - 使用全页面OCR结果
-            label_boxes = []
-            for line in full_results[0]:
-                text = line[1][0] if isinstance(line[1], (list, tuple)) else str(line[1])
-                if re.match(r'^图\s?\d+', text.strip()):
-                    try:
-                        points = line[0]
-                        y_coords = [p[1] for p in points]
-                        y_top = min(y_coords)
-                        y_bottom = max(y_coords)
-                        label_boxes.append((y_top, y_bottom, text.strip().replace(" ", "")))
-                    except Exception as e:
-                        print(f"⚠️ 坐标解析错误: {e}")
-                        continue
-
-            if not label_boxes:
-                print(f"⚠️ Page {i+1}: 未检测到图标签")
+
+    crops = []
+    if labels:
+        # 有图标签时才以 CROP_DPI 渲染高分辨率图用于裁剪，OCR 坐标按分辨率比例换算
+        crop_height = int(round(page.rect.height * CROP_DPI / 72))
+        scale = CROP_DPI / OCR_DPI
+
+        # 按照 y_top 从下往上排序（从页面底部往上），并一次性计算所有裁剪边界
+        # 裁剪区域均为整页宽的水平条带，按 y 排序已是相邻区域连续访问的顺序
+        tops = (np.array(label_tops, dtype=np.float32) * scale).astype(np.int32)
+        bottoms = (np.array(label_bottoms, dtype=np.float32) * scale).astype(np.int32)
+        order = np.argsort(-tops, kind='stable')
+        y_bottoms = np.clip(tops[order], 0, crop_height)  # 当前 label 的顶部
+        y_tops = np.empty_like(y_bottoms)
+        y_tops[:-1] = bottoms[order[1:]]  # 上一个 label 的底部
+        y_tops[-1] = int(crop_height * 0.2)  # 跳过页眉
+        y_tops = np.clip(y_tops, 0, crop_height)
+
+        # 只渲染覆盖全部裁剪条带的区域（跳过页眉等），不生成整页高分辨率图
+        band_top = int(y_tops.min())
+        band_bottom = max(int(y_bottoms.max()), band_top + 1)
+        rect = page.rect
+        clip = fitz.Rect(rect.x0, rect.y0 + band_top * 72 / CROP_DPI, rect.x1, rect.y0 + band_bottom * 72 / CROP_DPI)
+        pix_hi = page.get_pixmap(dpi=CROP_DPI, clip=clip, alpha=False)
+        rgb_hi = np.frombuffer(pix_hi.samples, dtype=np.uint8).reshape(pix_hi.height, pix_hi.width, pix_hi.n)
+
+        for idx, box_idx in enumerate(order):
+            label = labels[box_idx]
+            y_top = int(y_tops[idx])
+            y_bottom = int(y_bottoms[idx])
+
+            if y_bottom <= y_top:
+                print(f"⚠️ {label}: 无效的裁剪区域 (y_top={y_top}, y_bottom={y_bottom})")
                 continue
 
-            # 按照 y_top 从下往上排序（从页面底部往上）
-            label_boxes = sorted(label_boxes, key=lambda x: x[0], reverse=True)
+            # 仅对裁剪条带做通道转换，生成独立数组
+            crops.append((label, cv2.cvtColor(rgb_hi[y_top - band_top:y_bottom - band_top, :], cv2.COLOR_RGB2BGR)))
 
-            for idx in range(len(label_boxes)):
-                y_top_curr = int(label_boxes[idx][0])
-                label = label_boxes[idx][2]
+    return {
+        'height': height,
+        'width': width,
+        'footer_results': adjusted_footer_results,
+        'crops': crops,
+    }
 
-                if idx + 1 < len(label_boxes):
-                    y_bottom_prev = int(label_boxes[idx + 1][1])  # 上一个 label 的底部
+def _analyze_page_in_worker(pdf_path, page_index):
+    """工作进程入口：自行打开文档并分析一页（只传路径与页号，避免序列化页面对象）"""
+    with fitz.open(pdf_path) as doc:
+        return analyze_page(doc[page_index])
+
+def extract_figures_by_label(pdf_path, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    last_page_number = None  # 用于记录最后一个有效页码
+    
+    with fitz.open(pdf_path) as doc:
+        total_pages = len(doc)
+    
+    # 各页渲染+OCR互不依赖，多页时分发到进程池（每个进程各自加载模型）；
+    # 页码推断依赖上一页结果，仍在本进程按页序完成
+    workers = min(os.cpu_count() or 1, MAX_PAGE_WORKERS, total_pages)
+    
+    # 裁剪图交给后台线程编码写盘，不必等待磁盘；退出 with 时等待全部写完
+    with ThreadPoolExecutor(max_workers=IMAGE_WRITER_WORKERS) as writer:
+        if workers > 1:
+            # 以 spawn 启动：子进程不继承本进程已加载的 Paddle/OpenMP 状态
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(workers,),
+                                           mp_context=multiprocessing.get_context("spawn"))
+            # map 按页序返回，已完成的页面可以先处理，其余页面仍在并行OCR
+            page_results = executor.map(_analyze_page_in_worker, [pdf_path] * total_pages, range(total_pages))
+        else:
+            executor = None
+            doc = fitz.open(pdf_path)
+            page_results = (analyze_page(page) for page in doc)
+        
+        try:
+            for i, page_result in enumerate(page_results):
+                if page_result is None:
+                    continue
+                
+                height = page_result['height']
+                width = page_result['width']
+                
+                # 页码提取 - 只使用底部30%区域的OCR结果
+                page_number = extract_page_number_from_footer(page_result['footer_results'], height, width, i+1, total_pages, last_page_number)
+                
+                if page_number is None:
+                    print(f"⚠️ Page {i+1}: 未检测到页码，且无法推断")
+                    continue
                 else:
-                    y_bottom_prev = int(height * 0.2)  # 跳过页眉 
+                    # 更新最后一个有效页码
+                    last_page_number = int(page_number)
 
-                y_top = max(0, y_bottom_prev)
-                y_bottom = min(height, y_top_curr)
+                print(f"📄 Page {i+1}: 页码为 {page_number}")
 
-                if y_bottom <= y_top:
-                    print(f"⚠️ {label}: 无效的裁剪区域 (y_top={y_top}, y_bottom={y_bottom})")
+                if not page_result['crops']:
+                    print(f"⚠️ Page {i+1}: 未检测到图标签")
                     continue
 
-                cropped = img_cv[y_top:y_bottom, :]
-                out_path = os.path.abspath(os.path.join(output_dir, f"{label}_page{page_number}.png"))
-                cv2.imwrite(out_path, cropped)
-                print(f"✅ 提取 {label} (页码: {page_number}) 保存至 {out_path}")
+                for label, cropped in page_result['crops']:
+                    out_path = os.path.abspath(os.path.join(output_dir, f"{label}_page{page_number}.png"))
+                    # cropped 为独立数组，交给写盘线程后不会被后续页面覆盖
+                    writer.submit(cv2.imwrite, out_path, cropped, PNG_WRITE_PARAMS)
+                    print(f"✅ 提取 {label} (页码: {page_number}) 保存至 {out_path}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            else:
+                doc.close()
 
 
 def extract_page_number_from_footer(footer_ocr_results, height, width, current_page_index, total_pages, last_page_number):
@@ -133,25 +237,25 @@ def extract_page_number_from_footer(footer_ocr_results, height, width, current_p
         confidence = 0
         
         # 模式1: 纯数字 (最常见)
-        if re.match(r'^\d{1,3}$', text):
+        if PLAIN_PAGE_NUMBER_PATTERN.match(text):
             page_num = int(text)
             confidence = 5  # 页脚区域的纯数字，给更高置信度
         
         # 模式2: 负号+数字 (有时OCR会把页码识别成负号)
-        elif re.match(r'^-\d{1,3}$', text):
+        elif DASHED_PAGE_NUMBER_PATTERN.match(text):
             page_num = int(text[1:])
             confidence = 4
         
         # 模式3: 第X页格式
-        elif re.match(r'^第?\s*(\d{1,3})\s*页?$', text):
-            match = re.search(r'(\d+)', text)
+        elif CN_PAGE_NUMBER_PATTERN.match(text):
+            match = DIGITS_PATTERN.search(text)
             if match:
-                page_num = int(match.group(1))
+                page_num = int(match.group(0))
                 confidence = 6  # 明确的页码格式，最高置信度
         
         # 模式4: 带横线格式 (如 "- 5 -", "5.", "Page 5")
         elif len(text) <= 10:
-            numbers = re.findall(r'\d+', text)
+            numbers = DIGITS_PATTERN.findall(text)
             if len(numbers) == 1:
                 num = int(numbers[0])
                 if 1 <= num <= 999:  # 合理页码范围
@@ -188,6 +292,10 @@ def extract_page_number_from_footer(footer_ocr_results, height, width, current_p
             total_score = confidence + position_score + reasonableness_score
             page_candidates.append((page_num, total_score, text))
             print(f"     ✓ 页码候选: '{text}' -> {page_num} (置信度:{confidence}, 位置:{position_score}, 合理性:{reasonableness_score}, 总分:{total_score})")
+
+            if total_score >= PAGE_NUMBER_MAX_SCORE:
+                print(f"   🎯 满分页码，提前返回: {page_num} (总分: {total_score})")
+                return str(page_num)
     
     # 2. 选择最佳候选
     if page_candidates:
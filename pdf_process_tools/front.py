@@ -1,40 +1,35 @@
 import os
 import cv2
-import pdfplumber
+import fitz  # PyMuPDF
 import numpy as np
 
 def extract_first_page_figure(pdf_path, output_dir):
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
 
-    with pdfplumber.open(pdf_path) as pdf:
+    with fitz.open(pdf_path) as doc:
         # 读取第一页
-        page = pdf.pages[0]
-        pil_img = page.to_image(resolution=300).original.convert("RGB")
-        
-        # 将PIL图像转换为OpenCV的BGR格式
-        img_cv = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-        height, width = img_cv.shape[:2]
+        page = doc[0]
+        rect = page.rect
 
         # 假设附图位于页面的右下角，定义一个区域（如右下角的一个矩形区域）
         # 我们取页面的右下角区域 (假设该附图占页面右下角的1/4区域)
         # 你可以根据实际情况调整这个区域的尺寸
-        x_start = int(width * 0.5)  # 右下角区域的起始 x 坐标
-        y_start = int(height * 0.5)  # 右下角区域的起始 y 坐标
-        x_end = width  # 右下角区域的结束 x 坐标
-        y_end = height  # 右下角区域的结束 y 坐标
+        x_start = rect.x0 + rect.width * 0.5  # 右下角区域的起始 x 坐标
+        y_start = rect.y0 + rect.height * 0.5  # 右下角区域的起始 y 坐标
+        x_end = rect.x1  # 右下角区域的结束 x 坐标
+        y_end = rect.y1  # 右下角区域的结束 y 坐标
 
-        # 裁剪右下角区域
-        cropped = img_cv[y_start:y_end, x_start:x_end]
+        # 用 PyMuPDF 只渲染右下角区域（300 DPI），直接从像素缓冲区构造数组，省去 pdfplumber/PIL 的整页转换
+        pix = page.get_pixmap(dpi=300, clip=fitz.Rect(x_start, y_start, x_end, y_end), alpha=False)
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
 
-        # 如果需要进一步处理（例如，通过阈值处理提取附图），可以加入以下代码：
-        # 转为灰度图像进行进一步处理（例如二值化或边缘检测）
-        gray = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
-        _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)  # 阈值处理，调整阈值可能需要
+        # 转换为OpenCV的BGR格式
+        cropped = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
 
-        # 保存裁剪的附图
+        # 保存裁剪的附图（无损 PNG，与附图页的裁剪图一致）
         out_path = os.path.abspath(os.path.join(output_dir, "page1.png"))
-        cv2.imwrite(out_path, cropped)
+        cv2.imwrite(out_path, cropped, [cv2.IMWRITE_PNG_COMPRESSION, 1, cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE])
         print(f"✅ 提取的附图保存至: {out_path}")
 
 if __name__ == "__main__":
@@ -1,11 +1,11 @@
 import os 
 import shutil
 import glob
-from pdf_split import PatentPDFSplitter
+from pdf_split import PatentPDFSplitter, contiguous_ranges
 from claims_ocr import extract_text_from_pdf
 from front import extract_first_page_figure
 from draw import extract_figures_by_label
-from descriptions_ocr import detect_pdf_type, extract_text_pdf, extract_image_pdf
+from descriptions_ocr import detect_pdf_type, extract_text_pdf, extract_image_pdf, extract_mixed_pdf
 import fitz  # PyMuPDF
 
 def flatten_descriptions_output(output_dir):
@@ -63,8 +63,8 @@ def main(pdf_path, output_dir):
         if pages:
             output_pdf_path = os.path.join(output_dir, f"{section_type}.pdf")
             new_doc = fitz.open()
-            for page_num in sorted(pages):
-                new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+            for start, end in contiguous_ranges(pages):
+                new_doc.insert_pdf(doc, from_page=start, to_page=end)
             new_doc.save(output_pdf_path)
             new_doc.close()
             split_pdfs[section_type] = output_pdf_path
@@ -80,13 +80,16 @@ def main(pdf_path, output_dir):
         elif page_type == 'drawings':
             extract_figures_by_label(pdf_path, output_dir)
         elif page_type == 'descriptions':
-            pdf_type = detect_pdf_type(pdf_path)
+            text_cache = {}  # 采样页文本，混合型逐页判断时复用
+            pdf_type = detect_pdf_type(pdf_path, text_cache=text_cache)
             desc_output_dir = os.path.join(output_dir, "descriptions")
             os.makedirs(desc_output_dir, exist_ok=True)
             if pdf_type == 'text':
                 extract_text_pdf(pdf_path, desc_output_dir)
             elif pdf_type == 'image':
                 extract_image_pdf(pdf_path, desc_output_dir)
+            else:  # mixed
+                extract_mixed_pdf(pdf_path, desc_output_dir, text_cache)
 
     # 移动并整理 descriptions 内容
     flatten_descriptions_output(output_dir)
@@ -0,0 +1,157 @@
+import os
+import functools
+import numpy as np
+import paddle
+from paddleocr import PaddleOCR
+from paddleocr.tools.infer.utility import get_rotate_crop_image
+
+# CPU 推理时的识别批大小（默认 6 会按批预分配远多于单行所需的内存，CPU 上也换不来吞吐）
+CPU_REC_BATCH_NUM = 1
+
+# CPU 推理启用 oneDNN(MKLDNN) 加速算子
+CPU_ENABLE_MKLDNN = True
+
+# GPU 推理使用 TensorRT + FP16（需安装带 TensorRT 的 Paddle，默认关闭，按部署环境开启）
+GPU_USE_TENSORRT = False
+
+# 识别置信度低于该值的文本行丢弃（PaddleOCR 的 drop_score 默认值，批量识别时自行过滤）
+DROP_SCORE = 0.5
+
+# 行框排序时左上角 y 相差不足该像素数的视为同一行（与 PaddleOCR 的 sorted_boxes 一致）
+LINE_Y_TOLERANCE = 10
+
+# CPU 推理线程数取一半核数，给渲染/解析等流水线线程留出余量；进程池中再按进程数均分，避免超额订阅
+_ocr_process_count = 1  # 本进程所在进程池的进程数，由 reset_ocr(process_count) 设置
+
+
+def cpu_thread_count():
+    """本进程 PaddleOCR 的 CPU 推理线程数（默认 10 会让多进程时线程数远超核数）"""
+    return max(1, (os.cpu_count() or 2) // 2 // _ocr_process_count)
+
+
+def default_use_gpu():
+    """与 PaddleOCR 未指定 use_gpu 时一致：Paddle 带 CUDA 编译且当前设备为 GPU 时使用 GPU"""
+    return paddle.device.is_compiled_with_cuda() and paddle.device.get_device() != 'cpu'
+
+
+def get_ocr(use_gpu=None):
+    """
+    返回本进程共享的中文 PaddleOCR 实例（检测 + 方向分类 + 识别），首次调用时才加载模型
+
+    分割、权利要求、附图、说明书各步骤共用同一份模型；不需要方向分类的调用方在 ocr() 时传 cls=False 即可
+
+    Args:
+        use_gpu: 是否使用GPU；None 表示沿用 PaddleOCR 的默认设备（有 GPU 即用 GPU）
+    """
+    # 先规范化参数再查缓存：get_ocr()、get_ocr(False)、get_ocr(use_gpu=False) 等写法在无 GPU 时共用同一实例
+    if use_gpu is None:
+        use_gpu = default_use_gpu()
+    return _build_ocr(bool(use_gpu))
+
+
+@functools.lru_cache(maxsize=2)
+def _build_ocr(use_gpu):
+    """按设备创建 PaddleOCR 实例，GPU/CPU 各缓存一份（只由 get_ocr 以规范化后的 bool 调用）"""
+    if use_gpu:
+        if GPU_USE_TENSORRT:
+            return PaddleOCR(use_angle_cls=True, lang='ch', use_gpu=True, show_log=False,
+                             use_tensorrt=True, precision='fp16')
+        return PaddleOCR(use_angle_cls=True, lang='ch', use_gpu=True, show_log=False)
+    # CPU 上识别批次并不并行执行，rec_batch_num=1 时 Paddle 只按单行分配推理内存
+    return PaddleOCR(use_angle_cls=True, lang='ch', use_gpu=False, show_log=False,
+                     rec_batch_num=CPU_REC_BATCH_NUM, cpu_threads=cpu_thread_count(),
+                     enable_mkldnn=CPU_ENABLE_MKLDNN)
+
+
+def ocr_settings(use_gpu=None):
+    """影响识别结果的OCR设置（设备、推理后端、排序与过滤），供结果缓存区分不同配置"""
+    if use_gpu is None:
+        use_gpu = default_use_gpu()
+    if use_gpu:
+        return ('gpu', GPU_USE_TENSORRT, DROP_SCORE, LINE_Y_TOLERANCE)
+    return ('cpu', CPU_ENABLE_MKLDNN, DROP_SCORE, LINE_Y_TOLERANCE)
+
+
+def reset_ocr(process_count=1):
+    """
+    丢弃已缓存的实例，并记录本进程所在进程池的进程数（工作进程初始化时调用，之后创建的实例按此分配 CPU 线程）
+
+    Args:
+        process_count: 同时运行OCR的进程数
+    """
+    global _ocr_process_count
+    _ocr_process_count = max(1, process_count)
+    _build_ocr.cache_clear()
+
+
+def sort_line_boxes(boxes):
+    """
+    文本行框排序，与 PaddleOCR 的 sorted_boxes 一致：按左上角 (y, x) 排序后，
+    左上角 y 相差不足 LINE_Y_TOLERANCE 像素的相邻行框视为同一行，按 x 自左而右调整
+
+    Args:
+        boxes: 四点行框列表 [[[x, y], ...4点], ...]，首点为左上角
+    """
+    boxes = sorted(boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < LINE_Y_TOLERANCE and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def detect_line_boxes(ocr, img):
+    """只做文本检测，返回按阅读顺序排好的四点行框（仅检测时 PaddleOCR 返回的行框未排序）"""
+    det_result = ocr.ocr(img, det=True, rec=False)
+    boxes = det_result[0] if det_result and det_result[0] else []
+    return sort_line_boxes(boxes)
+
+
+def ocr_lines_batch(ocr, images, return_boxes=False):
+    """
+    多张图片OCR：逐张只做检测，按四点行框做透视校正裁剪（与 PaddleOCR 内部相同的 get_rotate_crop_image），
+    再以 det=False 调用完成方向分类与识别
+
+    与 ocr.ocr(img, cls=True) 的结果保持一致：行框按 sort_line_boxes 排序，置信度低于 DROP_SCORE 的行丢弃
+
+    识别批大小大于 1 时（GPU），所有图片的文本行合并为一次调用，跨图凑满识别批次；
+    CPU 实例的批大小为 CPU_REC_BATCH_NUM=1，合并没有收益，逐张图片识别
+
+    注：PaddleOCR.ocr 仅在 det=False 时接受图片列表，检测无法跨图批量
+
+    Args:
+        ocr: PaddleOCR 实例
+        images: 图片列表
+        return_boxes: 为 True 时每行结果附带其行框
+
+    Returns:
+        list: 每张图片的 [(文本, 置信度), ...]，return_boxes 时为 [(文本, 置信度, 行框), ...]
+    """
+    image_boxes = []
+    image_crops = []
+    for img in images:
+        boxes = detect_line_boxes(ocr, img)
+        image_boxes.append(boxes)
+        image_crops.append([get_rotate_crop_image(img, np.array(box, dtype=np.float32)) for box in boxes])
+
+    # 以嵌套列表传入：一组文本行作为同一张“图”的行列表，按 rec_batch_num 分批识别
+    if ocr.text_recognizer.rec_batch_num > 1:
+        crops = [crop for crops in image_crops for crop in crops]
+        rec_results = ocr.ocr([crops], det=False, cls=True)[0] if crops else []
+    else:
+        rec_results = [line for crops in image_crops if crops
+                       for line in ocr.ocr([crops], det=False, cls=True)[0]]
+
+    results = []
+    start = 0
+    for boxes in image_boxes:
+        lines = []
+        for box, (text, confidence) in zip(boxes, rec_results[start:start + len(boxes)]):
+            if confidence < DROP_SCORE:
+                continue
+            lines.append((text, confidence, box) if return_boxes else (text, confidence))
+        results.append(lines)
+        start += len(boxes)
+    return results
@@ -0,0 +1,79 @@
+import os
+import hashlib
+import pickle
+import tempfile
+
+# 页面OCR结果的持久化缓存目录，重复处理同一PDF时命中的页面跳过渲染与OCR；默认关闭（None），
+# 需要时显式设置，例如 os.path.join(os.path.expanduser("~"), ".cache", "pdf_process_tools", "page_cache")
+PAGE_CACHE_DIR = None
+
+# 缓存格式/识别逻辑变化时递增，使旧结果自动失效
+PAGE_CACHE_VERSION = 3
+
+
+class PageCache:
+    """
+    页面缓存：每个键一个文件，写入先落临时文件再 os.replace 原子替换
+
+    多个文档级工作进程可同时读写同一目录，不会像单个 shelve 库那样互相损坏
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pkl")
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            print(f"⚠️ 页面缓存读取失败: {str(e)}")
+            return default
+
+    def __setitem__(self, key, value):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            print(f"⚠️ 页面缓存写入失败: {str(e)}")
+
+    def close(self):
+        pass
+
+
+def open_page_cache():
+    """打开页面缓存，缓存关闭或目录不可用时返回 None（调用方按无缓存处理）"""
+    if PAGE_CACHE_DIR is None:
+        return None
+    try:
+        os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+        return PageCache(PAGE_CACHE_DIR)
+    except Exception as e:
+        print(f"⚠️ 页面缓存不可用: {str(e)}")
+        return None
+
+
+def page_cache_key(namespace, doc, page, settings=()):
+    """
+    根据页面原始内容计算缓存键：内容流 + 页面引用的图片流 + 页面尺寸/旋转
+
+    无需渲染即可计算；扫描页的内容流往往只是一句图片绘制指令，因此必须带上图片数据
+
+    Args:
+        namespace: 区分不同处理流程
+        doc: fitz 文档
+        page: fitz 页面
+        settings: 影响该流程输出的参数（渲染、识别与过滤设置），参数不同的结果不能混用
+    """
+    digest = hashlib.sha1(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    digest.update(f"{tuple(page.rect)}:{page.rotation}".encode("utf-8"))
+    digest.update(repr(tuple(settings)).encode("utf-8"))
+    return f"{namespace}:v{PAGE_CACHE_VERSION}:{digest.hexdigest()}"
@@ -2,11 +2,146 @@ import fitz  # PyMuPDF
 import os
 import cv2
 import numpy as np
-from paddleocr import PaddleOCR
+from ocr_engine import get_ocr, reset_ocr, ocr_lines_batch
 import argparse
-from typing import List, Tuple, Dict
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
 import re
 
+# 汉字（CJK 统一表意文字基本区），模块加载时编译一次
+CJK_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+# 合并页眉文本时删除的字符（str.translate 一次完成）：v2 去空格，v3 另去逗号
+SPACE_DELETE_TABLE = str.maketrans('', '', ' \u3000')
+SPACE_COMMA_DELETE_TABLE = str.maketrans('', '', ' \u3000,\uff0c')
+
+# “附图”的特征字符：v3 分类中区分说明书附图与说明书
+ATTACHMENT_CHARS = frozenset('附图')
+
+# 页面类型的整数编码：连续性检查在 int8 数组上做整数比较（对外的页面类型与各部分键名仍是字符串）
+PAGE_TYPE_CODES = {'front': 0, 'claims': 1, 'descriptions': 2, 'drawings': 3, 'unknown': 4}
+
+# 页眉 渲染 / OCR / 分类 各阶段之间的队列容量
+PIPELINE_QUEUE_SIZE = 4
+
+# 页眉OCR结果缓存：按缩小到 HEADER_HASH_SIZE 的灰度图计算指纹，缩小后像素完全相同的页眉命中即跳过OCR
+HEADER_HASH_SIZE = (64, 16)  # (宽, 高)
+HEADER_OCR_CACHE_SIZE = 256
+
+# OCR阶段一次最多合并识别的页眉数（已渲染好的页眉一并取出，识别合并为一次调用）
+HEADER_OCR_BATCH_SIZE = 8
+
+# 字符级匹配结果缓存的条目数
+CHAR_MATCH_CACHE_SIZE = 1024
+
+# CPU 部署时页眉分类的最大进程数（每个进程各加载一份模型并各自打开PDF）
+MAX_SPLIT_WORKERS = 4
+
+# 页数达到该值才启用进程池：页数少时进程启动与模型加载的开销超过并行收益
+MIN_PAGES_PER_SPLIT_WORKER = 16
+
+
+def contiguous_ranges(pages: List[int]) -> List[Tuple[int, int]]:
+    """
+    将页码列表合并为连续区间，如 [0, 1, 2, 5, 6] -> [(0, 2), (5, 6)]
+    
+    insert_pdf 每次调用都有固定开销，按区间插入比逐页插入少调用许多次
+    """
+    ranges = []
+    for page_num in sorted(pages):
+        if ranges and page_num == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], page_num)
+        else:
+            ranges.append((page_num, page_num))
+    return ranges
+
+
+@functools.lru_cache(maxsize=None)
+def keyword_pattern(keywords: Tuple[str, ...]) -> "re.Pattern":
+    """
+    将一组关键词编译为按列表顺序排列的交替正则，一次扫描即可找到最靠前的关键词
+    
+    正则从左到右逐位置尝试、同一位置按列表顺序尝试各分支，
+    因此首个匹配就是“位置最靠前、同位置时列表中靠前”的关键词
+    """
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+
+def pixmap_to_bgr(pix, out=None) -> np.ndarray:
+    """
+    由 pixmap 像素缓冲区直接构造 OpenCV 的 BGR 图像，不经 PNG 编解码
+    
+    cvtColor 生成独立的数组，pixmap 随调用方返回即可释放；
+    out 为形状相同的可复用缓冲区时直接写入其中，不再分配新数组
+    """
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if out is not None and out.shape != rgb.shape:
+        out = None
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+
+
+@functools.lru_cache(maxsize=CHAR_MATCH_CACHE_SIZE)
+def char_level_score(text: str, keywords: Tuple[str, ...]) -> Tuple[bool, float, str]:
+    """
+    字符级别的模糊匹配（PatentPDFSplitter.char_level_match 的实现），结果只取决于参数，按 (文本, 关键词) 缓存
+    
+    页眉文本截取前若干汉字后，同一部分各页几乎相同，重复的页面直接命中缓存，不再逐关键词扫描
+    """
+    best_score: float = 0
+    best_keyword = ""
+    
+    for keyword in keywords:
+        # 计算字符匹配度
+        if len(keyword) == 1:
+            # 单字符匹配
+            if keyword in text:
+                score = 1.0
+            else:
+                score = 0
+        else:
+            # 多字符匹配，计算包含的字符比例
+            matched_chars = sum(1 for char in keyword if char in text)
+            score = matched_chars / len(keyword)
+            
+            # 如果是完全匹配，给予额外加分
+            first_pos = text.find(keyword)
+            if first_pos != -1:
+                score += 0.5
+                
+            # 如果字符是连续出现的，给予额外加分：逐个检查完全匹配出现之前（无完全匹配时为全部）的窗口，
+            # 只有首字相同的窗口才可能部分连续匹配，用 str.find 直接跳到这些位置
+            keyword_len = len(keyword)
+            window_end = first_pos if first_pos != -1 else len(text) - keyword_len + 1
+            i = text.find(keyword[0], 0, max(window_end, 0))
+            while i != -1:
+                # 检查部分连续匹配
+                partial_match = 0
+                for char, expected in zip(text[i:i + keyword_len], keyword):
+                    if char != expected:
+                        break
+                    partial_match += 1
+                if partial_match > keyword_len * 0.6:  # 60%以上连续匹配
+                    score += partial_match / keyword_len * 0.3
+                i = text.find(keyword[0], i + 1, window_end)
+            if first_pos != -1:
+                score += 1.0
+        
+        if score > best_score:
+            best_score = score
+            best_keyword = keyword
+    
+    # 设置匹配阈值
+    threshold = 0.3 if len(best_keyword) > 1 else 1.0
+    is_match = best_score >= threshold
+    
+    return (is_match, best_score, best_keyword)
+
 
 class PatentPDFSplitter:
     def __init__(self, use_gpu=False, match_algorithm='v3', max_chinese_chars=10, use_continuity_rules=True):
@@ -19,8 +154,8 @@ class PatentPDFSplitter:
             max_chinese_chars: 只考虑OCR结果的前k个汉字 (0表示不限制)
             use_continuity_rules: 是否使用章节连续机制
         """
-        # 初始化PaddleOCR
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='ch', use_gpu=use_gpu)
+        # PaddleOCR 设备（实例与其他处理步骤共用，首次识别时才加载，见 ocr 属性）
+        self.use_gpu = use_gpu
         
         # 匹配算法版本
         self.match_algorithm = match_algorithm
@@ -42,9 +177,32 @@ class PatentPDFSplitter:
         # 定义匹配优先级（避免混淆，优先匹配更具体的）
         self.match_priority = ['drawings', 'claims', 'descriptions', 'front']
         
+        # 按匹配优先级排好的 (页面类型, 关键词列表)，分类时逐页遍历，免去每页的字典查找
+        self._priority_keywords = [(page_type, tuple(self.header_keywords[page_type])) for page_type in self.match_priority]
+        
+        # v2 提前结束的前提：权利要求书/首页的关键词都不以附图关键词的首字开头，
+        # 此时附图关键词出现在文本开头，其他类型只有说明书可能同在开头（会被“说明书附图”规则判为附图）
+        drawings_first_chars = {keyword[:1] for keyword in self.header_keywords['drawings']}
+        self._drawings_lead_exclusive = not any(
+            keyword[:1] in drawings_first_chars
+            for page_type in ('claims', 'front')
+            for keyword in self.header_keywords[page_type]
+        )
+        
         # 页眉检测区域比例（页面顶部的比例）
         self.header_region_ratio = 0.15
         
+        # 页眉渲染缩放倍数：页眉是单行大字，1.5 倍已足够检测与识别，像素数只有 2 倍时的一半多
+        self.render_scale = 1.5
+        
+        # 页眉指纹 -> 识别文本（LRU，最多 HEADER_OCR_CACHE_SIZE 条）
+        self._ocr_cache = OrderedDict()
+        
+    @property
+    def ocr(self):
+        """本进程共享的 PaddleOCR 实例：首次识别时才加载，交给进程池分类时父进程不必加载模型"""
+        return get_ocr(use_gpu=self.use_gpu)
+    
     def extract_chinese_chars(self, text: str, max_chars: int = 0) -> str:
         """
         提取文本中的汉字，可选择只保留前k个汉字
@@ -57,55 +215,190 @@ class PatentPDFSplitter:
             提取的汉字字符串
         """
         # 使用正则表达式匹配汉字
-        chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
+        chinese_chars = CJK_CHAR_PATTERN.findall(text)
         
         if max_chars > 0:
             chinese_chars = chinese_chars[:max_chars]
         
         return ''.join(chinese_chars)
     
-    def pdf_page_to_image(self, page) -> np.ndarray:
+    def render_header_region(self, page, out=None) -> np.ndarray:
         """
-        将PDF页面转换为图像
+        只渲染页面顶部的页眉区域（render_scale 倍缩放，高度占页面的 header_region_ratio）
+        
+        以 clip 只光栅化页眉带，不生成整页图像；直接由 pixmap 像素构造数组，不经 PNG 编解码
         
         Args:
             page: PyMuPDF页面对象
+            out: 可选的复用缓冲区，形状与页眉图像一致时结果写入其中
             
         Returns:
-            numpy数组格式的图像
+            页眉区域图像（BGR，C 连续的 uint8 数组）
         """
-        # 设置较高的分辨率以提高OCR准确性
-        mat = fitz.Matrix(2.0, 2.0)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        
-        # 转换为numpy数组
-        nparr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        return img
+        rect = page.rect
+        clip = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + rect.height * self.header_region_ratio)
+        pix = page.get_pixmap(matrix=fitz.Matrix(self.render_scale, self.render_scale), clip=clip, alpha=False)
+        return pixmap_to_bgr(pix, out)
     
-    def extract_header_region(self, img: np.ndarray) -> np.ndarray:
+    def iter_page_types(self, doc, page_nums=None):
         """
-        提取页面顶部的页眉区域
+        页眉渲染 / OCR / 分类三阶段流水执行：渲染与OCR各占一个后台线程，分类在调用方线程，
+        阶段之间以容量 PIPELINE_QUEUE_SIZE 的队列衔接，驻留的页眉图像数量有上限
+        
+        PyMuPDF 与 Paddle 预测器都不支持多线程并发使用：doc 只由渲染线程访问，OCR 实例只由OCR线程使用
         
         Args:
-            img: 输入图像
+            doc: PyMuPDF文档对象
+            page_nums: 只处理这些页（按给定顺序），None 表示全部页面
             
-        Returns:
-            页眉区域图像
+        Yields:
+            (页序号, 识别文本, 页面类型)，按页序产出
         """
-        height, width = img.shape[:2]
-        header_height = int(height * self.header_region_ratio)
+        if page_nums is None:
+            page_nums = range(len(doc))
+        if not page_nums:
+            return
+        
+        q_render = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        q_ocr = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop = threading.Event()  # 调用方提前结束时通知各阶段退出
+        # 识别完的页眉缓冲区回收复用：同一文档各页页眉尺寸一致，流水线稳定后不再逐页分配内存
+        free_buffers = queue.SimpleQueue()
+        
+        def put(q, item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return None
+        
+        # 阶段出错时把异常对象放入队列传给下游，由调用方线程重新抛出，不会按截断的页面列表继续分类
+        # 阶段1：逐页渲染页眉区域
+        def render_all():
+            try:
+                for page_num in page_nums:
+                    if stop.is_set():
+                        break
+                    try:
+                        buffer = free_buffers.get_nowait()
+                    except queue.Empty:
+                        buffer = None
+                    put(q_render, (page_num, self.render_header_region(doc[page_num], buffer)))
+            except Exception as e:
+                put(q_render, e)
+            finally:
+                put(q_render, None)
+        
+        # 阶段2：识别页眉文本；队列中已渲染好的页眉（最多 HEADER_OCR_BATCH_SIZE 张）合并识别，图像用完回收复用
+        def ocr_all():
+            try:
+                error = None  # 渲染阶段传来的异常：先识别已取出的页眉，再转发给调用方
+                while error is None:
+                    item = get(q_render)
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        error = item
+                        break
+                    batch = [item]
+                    done = False
+                    while len(batch) < HEADER_OCR_BATCH_SIZE:
+                        try:
+                            item = q_render.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            done = True
+                            break
+                        if isinstance(item, Exception):
+                            error = item
+                            break
+                        batch.append(item)
+                    
+                    page_nums = [page_num for page_num, _ in batch]
+                    header_imgs = [header_img for _, header_img in batch]
+                    page_texts = self.recognize_texts(header_imgs)
+                    for header_img in header_imgs:
+                        free_buffers.put(header_img)
+                    del batch, header_imgs
+                    for page_num, texts in zip(page_nums, page_texts):
+                        put(q_ocr, (page_num, texts))
+                    if done:
+                        break
+                if error is not None:
+                    put(q_ocr, error)
+            except Exception as e:
+                put(q_ocr, e)
+            finally:
+                put(q_ocr, None)
         
-        # 提取顶部区域作为页眉
-        header_img = img[0:header_height, :]
+        threads = [threading.Thread(target=render_all, daemon=True), threading.Thread(target=ocr_all, daemon=True)]
+        for thread in threads:
+            thread.start()
         
-        return header_img
+        try:
+            # 阶段3（调用方线程）：分类页面类型 - 根据选择的算法版本
+            while True:
+                item = get(q_ocr)
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                page_num, texts = item
+                if self.match_algorithm == 'v3':
+                    page_type = self.classify_page_type_v3(texts)
+                else:
+                    page_type = self.classify_page_type_v2(texts)
+                yield page_num, texts, page_type
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+    
+    def split_worker_count(self, total_pages: int) -> int:
+        """
+        页眉分类的进程数：仅 CPU 部署启用，不超过一半核数（每个进程的 Paddle 推理本身多线程）、
+        MAX_SPLIT_WORKERS 以及 页数 / MIN_PAGES_PER_SPLIT_WORKER；返回 1 表示在本进程流水执行
+        """
+        if self.use_gpu:
+            return 1
+        return max(1, min((os.cpu_count() or 1) // 2, MAX_SPLIT_WORKERS,
+                          total_pages // MIN_PAGES_PER_SPLIT_WORKER))
+    
+    def iter_page_types_in_processes(self, pdf_path: str, total_pages: int, workers: int):
+        """
+        将页面分成 workers 段连续页，交给进程池并行渲染、识别、分类
+        
+        每个进程在初始化时打开PDF并创建自己的OCR实例，任务只传递页序号；
+        各段结果按页序拼接后产出，与 iter_page_types 的产出一致
+        """
+        settings = {
+            'match_algorithm': self.match_algorithm,
+            'max_chinese_chars': self.max_chinese_chars,
+            'use_continuity_rules': self.use_continuity_rules,
+            'header_region_ratio': self.header_region_ratio,
+            'render_scale': self.render_scale,
+        }
+        chunks = [chunk.tolist() for chunk in np.array_split(np.arange(total_pages), workers)]
+        # spawn：各工作进程从干净的解释器启动，自行加载模型
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_split_worker,
+                                 initargs=(pdf_path, settings, workers),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            for chunk_results in executor.map(_classify_split_pages, chunks):
+                yield from chunk_results
     
     def recognize_text(self, img: np.ndarray) -> List[str]:
         """
-        使用PaddleOCR识别图像中的文本
+        使用PaddleOCR识别单张图像中的文本（与流水线共用 recognize_texts 的缓存与批量识别）
         
         Args:
             img: 输入图像
@@ -113,20 +406,55 @@ class PatentPDFSplitter:
         Returns:
             识别出的文本列表
         """
-        try:
-            result = self.ocr.ocr(img, cls=True)
-            
-            texts = []
-            if result and result[0]:
-                for line in result[0]:
-                    if line and len(line) >= 2:
-                        text = line[1][0] if isinstance(line[1], (list, tuple)) else str(line[1])
-                        texts.append(text)
+        return self.recognize_texts([img])[0]
+    
+    def recognize_texts(self, imgs: List[np.ndarray]) -> List[List[str]]:
+        """
+        批量识别多张图像中的文本：逐张检测，所有文本行合并为一次识别调用
+        
+        Args:
+            imgs: 输入图像列表
             
-            return texts
-        except Exception as e:
-            print(f"OCR识别错误: {e}")
-            return []
+        Returns:
+            每张图像识别出的文本列表
+        """
+        results = [None] * len(imgs)
+        pending = {}  # 未命中缓存的指纹 -> 图像序号列表（同批内相同页眉只识别一次）
+        for idx, img in enumerate(imgs):
+            key = self.header_fingerprint(img)
+            if key in self._ocr_cache:
+                self._ocr_cache.move_to_end(key)
+                results[idx] = list(self._ocr_cache[key])
+            else:
+                pending.setdefault(key, []).append(idx)
+        
+        if pending:
+            keys = list(pending)
+            try:
+                page_lines = ocr_lines_batch(self.ocr, [imgs[pending[key][0]] for key in keys])
+            except Exception as e:
+                print(f"OCR识别错误: {e}")
+                page_lines = None
+            for i, key in enumerate(keys):
+                texts = [text for text, _ in page_lines[i]] if page_lines is not None else []
+                for idx in pending[key]:
+                    results[idx] = list(texts)
+                if page_lines is not None:
+                    self._ocr_cache[key] = texts
+                    if len(self._ocr_cache) > HEADER_OCR_CACHE_SIZE:
+                        self._ocr_cache.popitem(last=False)
+        return results
+    
+    def header_fingerprint(self, img: np.ndarray) -> bytes:
+        """
+        页眉图像的指纹：缩小为 HEADER_HASH_SIZE 的灰度图后取 MD5
+        
+        缩小后的像素须完全相同才命中，只有逐像素一致的页眉（如同一部分内不带页码的页眉）才能复用识别结果，
+        页码等细小差异通常仍会产生不同的指纹
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        small = cv2.resize(gray, HEADER_HASH_SIZE, interpolation=cv2.INTER_AREA)
+        return hashlib.md5(small.tobytes()).digest()
     
     def find_best_match(self, text: str, keywords: List[str]) -> Tuple[bool, int, str]:
         """
@@ -139,31 +467,23 @@ class PatentPDFSplitter:
         Returns:
             (是否匹配, 匹配位置, 匹配的关键词)
         """
-        best_match = None
-        best_pos = len(text)
-        best_keyword = ""
-        
-        for keyword in keywords:
-            pos = text.find(keyword)
-            if pos != -1 and pos < best_pos:
-                best_match = True
-                best_pos = pos
-                best_keyword = keyword
-        
-        return (best_match is not None, best_pos, best_keyword)
+        match = keyword_pattern(tuple(keywords)).search(text) if keywords else None
+        if match is None:
+            return (False, len(text), "")
+        return (True, match.start(), match.group(0))
     
-    def classify_page_type_v2(self, texts: List[str]) -> str:
+    def classify_page_type_v2(self, texts: Iterable[str]) -> str:
         """
         改进版页面类型分类，使用位置匹配算法
         
         Args:
-            texts: 识别出的文本列表
+            texts: 识别出的文本（列表或任意可迭代对象）
             
         Returns:
             页面类型 ('front', 'claims', 'descriptions', 'drawings', 'unknown')
         """
         # 将所有文本合并，提取汉字（如果设置了限制）
-        combined_text = ''.join(texts).replace(' ', '').replace('　', '')
+        combined_text = ''.join(texts).translate(SPACE_DELETE_TABLE)
         
         if self.max_chinese_chars > 0:
             combined_text = self.extract_chinese_chars(combined_text, self.max_chinese_chars)
@@ -174,8 +494,7 @@ class PatentPDFSplitter:
         # 按优先级匹配，避免混淆
         match_results = {}
         
-        for page_type in self.match_priority:
-            keywords = self.header_keywords[page_type]
+        for page_type, keywords in self._priority_keywords:
             is_match, pos, matched_keyword = self.find_best_match(combined_text, keywords)
             
             if is_match:
@@ -185,6 +504,11 @@ class PatentPDFSplitter:
                     'score': len(matched_keyword)  # 长度作为匹配强度
                 }
                 print(f"    {page_type}: 匹配到 '{matched_keyword}' 位置 {pos}")
+                
+                # 附图关键词位于开头时结果必为 drawings，其余类型不必再匹配
+                if page_type == 'drawings' and pos == 0 and self._drawings_lead_exclusive:
+                    print(f"    附图关键词位于开头，分类为 drawings")
+                    return 'drawings'
         
         if not match_results:
             print(f"    未匹配到任何关键词")
@@ -220,64 +544,21 @@ class PatentPDFSplitter:
         Returns:
             (是否匹配, 匹配得分, 最佳匹配关键词)
         """
-        best_score = 0
-        best_keyword = ""
-        
-        for keyword in keywords:
-            # 计算字符匹配度
-            if len(keyword) == 1:
-                # 单字符匹配
-                if keyword in text:
-                    score = 1.0
-                else:
-                    score = 0
-            else:
-                # 多字符匹配，计算包含的字符比例
-                matched_chars = sum(1 for char in keyword if char in text)
-                score = matched_chars / len(keyword)
-                
-                # 如果是完全匹配，给予额外加分
-                if keyword in text:
-                    score += 0.5
-                    
-                # 如果字符是连续出现的，给予额外加分
-                for i in range(len(text) - len(keyword) + 1):
-                    substring = text[i:i+len(keyword)]
-                    if substring == keyword:
-                        score += 1.0
-                        break
-                    # 检查部分连续匹配
-                    partial_match = 0
-                    for j, char in enumerate(keyword):
-                        if j < len(substring) and substring[j] == char:
-                            partial_match += 1
-                        else:
-                            break
-                    if partial_match > len(keyword) * 0.6:  # 60%以上连续匹配
-                        score += partial_match / len(keyword) * 0.3
-            
-            if score > best_score:
-                best_score = score
-                best_keyword = keyword
-        
-        # 设置匹配阈值
-        threshold = 0.3 if len(best_keyword) > 1 else 1.0
-        is_match = best_score >= threshold
-        
-        return (is_match, best_score, best_keyword)
+        # 关键词元组作为缓存键；_priority_keywords 中已是元组，tuple() 不再复制
+        return char_level_score(text, tuple(keywords))
     
-    def classify_page_type_v3(self, texts: List[str]) -> str:
+    def classify_page_type_v3(self, texts: Iterable[str]) -> str:
         """
         使用字符级匹配的页面分类方法
         
         Args:
-            texts: 识别出的文本列表
+            texts: 识别出的文本（列表或任意可迭代对象）
             
         Returns:
             页面类型
         """
         # 将所有文本合并，去除空格和标点符号
-        combined_text = ''.join(texts).replace(' ', '').replace('　', '').replace(',', '').replace('，', '')
+        combined_text = ''.join(texts).translate(SPACE_COMMA_DELETE_TABLE)
         
         # 如果设置了汉字限制，只保留前k个汉字
         if self.max_chinese_chars > 0:
@@ -289,8 +570,7 @@ class PatentPDFSplitter:
         # 对每个类型进行字符级匹配
         type_scores = {}
         
-        for page_type in self.match_priority:
-            keywords = self.header_keywords[page_type]
+        for page_type, keywords in self._priority_keywords:
             is_match, score, matched_keyword = self.char_level_match(combined_text, keywords)
             
             if is_match:
@@ -310,7 +590,7 @@ class PatentPDFSplitter:
             desc_score = type_scores['descriptions']['score']
             
             # 检查是否包含"附图"的特征字符
-            has_attachment_chars = any(char in combined_text for char in ['附', '图'])
+            has_attachment_chars = not ATTACHMENT_CHARS.isdisjoint(combined_text)
             
             if has_attachment_chars and drawings_score >= desc_score * 0.7:
                 print(f"    检测到附图特征，优先选择 drawings")
@@ -330,20 +610,25 @@ class PatentPDFSplitter:
         print("\n检查章节连续性错误...")
 
     # 只保留：孤立页面检测
-        for i in range(1, total_pages - 1):
+        if total_pages < 3:
+            return errors
+
+        # 页面类型编码为小整数数组，“与前后页都不同、前后页相同”的孤立页由三次向量比较一次求出
+        codes = np.fromiter((PAGE_TYPE_CODES[page_type] for page_type in page_types), dtype=np.int8, count=total_pages)
+        current, prev, following = codes[1:-1], codes[:-2], codes[2:]
+        isolated = (current != prev) & (current != following) & (prev == following)
+
+        for i in (np.flatnonzero(isolated) + 1).tolist():
             current_type = page_types[i]
             prev_type = page_types[i - 1]
-            next_type = page_types[i + 1]
-
-            if current_type != prev_type and current_type != next_type and prev_type == next_type:
-                errors.append({
-                    'type': 'isolated_page',
-                    'page': i + 1,
-                    'current_type': current_type,
-                    'surrounding_type': prev_type,
-                    'confidence': 0.8,
-                    'description': f'页面{i + 1}被{prev_type}包围，但分类为{current_type}'
-                })
+            errors.append({
+                'type': 'isolated_page',
+                'page': i + 1,
+                'current_type': current_type,
+                'surrounding_type': prev_type,
+                'confidence': 0.8,
+                'description': f'页面{i + 1}被{prev_type}包围，但分类为{current_type}'
+            })
 
         return errors
 
@@ -386,24 +671,23 @@ class PatentPDFSplitter:
                 print(f"    纠正页面 {error['page']}: {current_type} -> {surrounding_type} (孤立页面纠正)")
 
         
-        # 处理剩余的unknown页面
+        # 处理剩余的unknown页面：前面最近的已知类型（含已填充的页面），前面没有或为 front 时取后面最近的已知类型
+        # 先自后向前一遍记下每页之后最近的已知类型，再自前向后一遍填充，整体 O(N)
+        next_known = [None] * len(result)
+        following = None
+        for i in range(len(result) - 1, -1, -1):
+            next_known[i] = following
+            if result[i] != 'unknown':
+                following = result[i]
+        
         for i in range(len(result)):
             if result[i] == 'unknown':
-                # 查找最近的已知类型
-                nearest_type = 'front'  # 默认值
-                
-                # 优先查找前面的类型
-                for j in range(i-1, -1, -1):
-                    if result[j] != 'unknown':
-                        nearest_type = result[j]
-                        break
+                # 前一页若原为 unknown 也已在本轮填充，因此它就是前面最近的已知类型
+                nearest_type = result[i - 1] if i > 0 else 'front'  # 默认值
                 
                 # 如果前面没有，查找后面的类型
-                if nearest_type == 'front':
-                    for j in range(i+1, len(result)):
-                        if result[j] != 'unknown':
-                            nearest_type = result[j]
-                            break
+                if nearest_type == 'front' and next_known[i] is not None:
+                    nearest_type = next_known[i]
                 
                 result[i] = nearest_type
                 corrections_made.append({
@@ -447,23 +731,16 @@ class PatentPDFSplitter:
         if self.use_continuity_rules:
             print(f"章节连续性: 已启用")
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            
-            # 转换页面为图像
-            img = self.pdf_page_to_image(page)
-            
-            # 提取页眉区域
-            header_img = self.extract_header_region(img)
-            
-            # 识别页眉文本
-            texts = self.recognize_text(header_img)
-            
-            # 分类页面类型 - 根据选择的算法版本
-            if self.match_algorithm == 'v3':
-                page_type = self.classify_page_type_v3(texts)
-            else:
-                page_type = self.classify_page_type_v2(texts)
+        total_pages = len(doc)
+        workers = self.split_worker_count(total_pages)
+        if workers > 1:
+            # 进程池中各进程自行打开PDF并渲染，本进程的 doc 只用于取页数
+            print(f"🚀 页眉分类使用 {workers} 个进程并行")
+            page_results = self.iter_page_types_in_processes(pdf_path, total_pages, workers)
+        else:
+            page_results = self.iter_page_types(doc)
+        
+        for page_num, texts, page_type in page_results:
             page_types.append(page_type)
             
             print(f"页面 {page_num + 1}: 识别文本 {texts} -> 类型: {page_type}")
@@ -532,9 +809,9 @@ class PatentPDFSplitter:
                 # 按页面顺序排序
                 pages.sort()
                 
-                # 复制页面到新文档
-                for page_num in pages:
-                    new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+                # 按连续区间复制页面到新文档
+                for start, end in contiguous_ranges(pages):
+                    new_doc.insert_pdf(doc, from_page=start, to_page=end)
                 
                 # 保存分割后的PDF
                 output_path = os.path.join(output_dir, section_names[section_type])
@@ -549,6 +826,28 @@ class PatentPDFSplitter:
         print("PDF分割完成！")
 
 
+# 页眉分类工作进程内的分割器与已打开的PDF（由 _init_split_worker 创建）
+_split_worker = None
+
+
+def _init_split_worker(pdf_path: str, settings: dict, process_count: int):
+    """进程池初始化：创建本进程的OCR实例与分割器，并打开PDF（Paddle 预测器与 fitz 文档都不能跨进程共享）"""
+    global _split_worker
+    reset_ocr(process_count)
+    splitter = PatentPDFSplitter(use_gpu=False, match_algorithm=settings['match_algorithm'],
+                                 max_chinese_chars=settings['max_chinese_chars'],
+                                 use_continuity_rules=settings['use_continuity_rules'])
+    splitter.header_region_ratio = settings['header_region_ratio']
+    splitter.render_scale = settings['render_scale']
+    _split_worker = (splitter, fitz.open(pdf_path))
+
+
+def _classify_split_pages(page_nums: List[int]) -> List[Tuple[int, List[str], str]]:
+    """在工作进程中对一段页面做页眉识别与分类，返回 [(页序号, 识别文本, 页面类型), ...]"""
+    splitter, doc = _split_worker
+    return list(splitter.iter_page_types(doc, page_nums))
+
+
 def main():
     parser = argparse.ArgumentParser(description='专利PDF文件分割工具')
     parser.add_argument('input_pdf', help='输入的专利PDF文件路径')
@@ -558,6 +857,8 @@ def main():
                        help='选择匹配算法: v2=位置匹配, v3=字符级匹配 (默认: v3)')
     parser.add_argument('--header-ratio', type=float, default=0.15, 
                        help='页眉区域占页面的比例 (默认: 0.15)')
+    parser.add_argument('--render-scale', type=float, default=1.5,
+                       help='页眉区域渲染缩放倍数 (默认: 1.5)')
     parser.add_argument('--max-chinese-chars', type=int, default=10,
                        help='只考虑OCR结果的前k个汉字，0表示不限制 (默认: 10)')
     parser.add_argument('--no-continuity', action='store_true',
@@ -582,6 +883,10 @@ def main():
     if args.header_ratio:
         splitter.header_region_ratio = args.header_ratio
     
+    # 设置页眉渲染缩放倍数
+    if args.render_scale:
+        splitter.render_scale = args.render_scale
+    
     # 执行分割
     try:
         splitter.split_pdf(args.input_pdf, args.output)
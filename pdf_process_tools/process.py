@@ -6,11 +6,11 @@ import fitz  # PyMuPDF
 # 添加路径以便导入模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from pdf_split import PatentPDFSplitter
+from pdf_split import PatentPDFSplitter, contiguous_ranges
 from claims_ocr import extract_text_from_pdf as extract_claims_text
 from front import extract_first_page_figure
 from draw import extract_figures_by_label
-from descriptions_ocr import detect_pdf_type, extract_text_pdf, extract_image_pdf
+from descriptions_ocr import detect_pdf_type, detect_pdf_type_from_texts, extract_text_pdf, extract_image_pdf, extract_mixed_pdf
 import json
 
 def flatten_descriptions_output(output_dir):
@@ -86,13 +86,28 @@ def run_pdf_processing(pdf_path, output_dir):
     print("\n✂️ Step 2: 分割PDF...")
     doc = fitz.open(pdf_path)
     split_pdfs = {}
+    section_meta = {}  # 趁原文档仍打开时记录各部分的附加信息，避免后续重新打开PDF
     
     for section_type, pages in sections.items():
         if pages:
             output_pdf_path = os.path.join(output_dir, f"{section_type}.pdf")
+            if section_type == 'descriptions':
+                # 与 detect_pdf_type 相同：采样前3页文本判断文本型/图片型
+                # 采样页文本按分割后文档的页序记录，混合型逐页判断时复用
+                sample_pages = sorted(pages)[:3]
+                text_cache = {}
+                def iter_sample_texts():
+                    for i, p in enumerate(sample_pages):
+                        text_cache[i] = doc[p].get_text()
+                        yield text_cache[i]
+                section_meta[section_type] = {
+                    'pdf_type': detect_pdf_type_from_texts(iter_sample_texts(), total_pages=len(sample_pages)),
+                    'text_cache': text_cache,
+                }
             new_doc = fitz.open()
-            for page_num in sorted(pages):
-                new_doc.insert_pdf(doc, from_page=page_num, to_page=page_num)
+            # 连续页面合并为区间一次插入，减少 insert_pdf 调用次数
+            for start, end in contiguous_ranges(pages):
+                new_doc.insert_pdf(doc, from_page=start, to_page=end)
             new_doc.save(output_pdf_path)
             new_doc.close()
             split_pdfs[section_type] = output_pdf_path
@@ -125,7 +140,9 @@ def run_pdf_processing(pdf_path, output_dir):
                 
             elif page_type == 'descriptions':
                 print("    - 提取说明书...")
-                pdf_type = detect_pdf_type(pdf_path)
+                meta = section_meta.get(page_type, {})
+                text_cache = meta.get('text_cache', {})
+                pdf_type = meta.get('pdf_type') or detect_pdf_type(pdf_path, text_cache=text_cache)
                 print(f"      检测到PDF类型: {pdf_type}")
                 
                 desc_output_dir = os.path.join(output_dir, "descriptions")
@@ -136,8 +153,8 @@ def run_pdf_processing(pdf_path, output_dir):
                 elif pdf_type == 'image':
                     extract_image_pdf(pdf_path, desc_output_dir)
                 else:  # mixed
-                    print("      混合型PDF，使用文本模式处理")
-                    extract_text_pdf(pdf_path, desc_output_dir)
+                    print("      混合型PDF，逐页判断类型处理")
+                    extract_mixed_pdf(pdf_path, desc_output_dir, text_cache)
                     
         except Exception as e:
             print(f"    ❌ 处理 {page_type} 时出错: {e}")
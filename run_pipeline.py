@@ -1,28 +1,32 @@
 import os
 import json
 import re
-import glob
-from vector_utils import load_texts_from_output, retrieve
+import functools
+from vector_utils import get_or_build_index, retrieve, retrieve_batch
 from llm_utils import call_llm_with_context
 
 DATA_PATH = "data.json"
 OUTPUT_DIR = "output"
 
+# 页码提取正则：合并为单个交替式，一次扫描即可（“页”用前瞻匹配，不消耗字符，避免漏掉紧随其后的“页码”）
+PAGE_PATTERN = re.compile(r'第(\d+)(?=页)|页码(\d+)|(\d+)(?=页)')
+
 def extract_page_numbers(question):
     """从问题中提取页码信息"""
-    page_patterns = [
-        r'第(\d+)页',
-        r'第(\d+)页的',
-        r'页码(\d+)',
-        r'(\d+)页'
-    ]
-    
-    pages = []
-    for pattern in page_patterns:
-        matches = re.findall(pattern, question)
-        pages.extend([int(match) for match in matches])
+    pages = {int(num) for groups in PAGE_PATTERN.findall(question) for num in groups if num}
     
-    return list(set(pages))  # 去重
+    return list(pages)  # 去重
+
+@functools.lru_cache(maxsize=128)
+def load_document_texts(doc_output_dir):
+    """按文档缓存已加载的文本，同一文档的多个问题只读取一次（返回不可变元组）；同时备好该文档的向量索引"""
+    texts, _ = get_or_build_index(doc_output_dir)
+    return texts
+
+@functools.lru_cache(maxsize=128)
+def list_png_files(doc_output_dir):
+    """按文档缓存输出目录中的 png 文件名，只扫描一次目录"""
+    return tuple(entry.name for entry in os.scandir(doc_output_dir) if entry.name.endswith('.png'))
 
 def find_figure_files(doc_output_dir, pages):
     """根据页码查找对应的图表文件"""
@@ -31,16 +35,22 @@ def find_figure_files(doc_output_dir, pages):
     if not pages:
         return figure_files
     
+    png_files = list_png_files(doc_output_dir)
     for page_num in pages:
-        # 查找包含指定页码的图表文件
-        pattern = os.path.join(doc_output_dir, f"*page{page_num}*.png")
-        files = glob.glob(pattern)
-        figure_files.extend(files)
+        # 查找包含指定页码的图表文件（等价于 *page{page_num}*.png）
+        marker = f"page{page_num}"
+        figure_files.extend(os.path.join(doc_output_dir, name) for name in png_files if marker in name)
     
     return figure_files
 
-def process_single_item(item):
-    """处理单个数据项"""
+def process_single_item(item, retrieved_texts=None):
+    """
+    处理单个数据项
+    
+    Args:
+        item: 数据项
+        retrieved_texts: 已批量检索好的相关文本（可选，为 None 时单独检索）
+    """
     pdf_filename = item['document']
     
     # 获取对应文档的输出目录（已预处理完成）
@@ -53,14 +63,15 @@ def process_single_item(item):
     print(f"\n📄 正在处理: {pdf_filename}")
 
     # Step 1: 加载已构建的向量数据库和文本
-    texts = load_texts_from_output(doc_output_dir)
+    texts = load_document_texts(doc_output_dir)
     if not texts:
         print(f"[警告] 无法加载文本数据: {pdf_filename}")
         return None
 
     # Step 2: 基于问题检索相关文本
     question = item["question"]
-    retrieved_texts = retrieve(texts, question, top_k=5)
+    if retrieved_texts is None:
+        retrieved_texts = retrieve(texts, question, top_k=5)
 
     # Step 3: 检查问题中是否包含页码信息，如有则检索对应图片
     pages = extract_page_numbers(question)
@@ -111,17 +122,33 @@ def run_pipeline():
     with open(DATA_PATH, 'r', encoding='utf-8') as f:
         dataset = json.load(f)
 
-    results = []
-    for item in dataset:
-        result = process_single_item(item)
-        if result:
-            results.append({
-                'id': item.get('id'),
-                'question': item['question'],
-                'options': item['options'],
-                'model_answer': result, 
-                'document': item['document']
-            })
+    # 按文档分组（记录每个问题在数据集中的位置），同一文档的所有问题一次性批量检索
+    doc_groups = {}
+    for idx, item in enumerate(dataset):
+        doc_groups.setdefault(item['document'], []).append(idx)
+    
+    results = [None] * len(dataset)  # 按数据集原顺序回填
+    for pdf_filename, indices in doc_groups.items():
+        items = [dataset[idx] for idx in indices]
+        
+        doc_output_dir = os.path.join(OUTPUT_DIR, pdf_filename.replace('.pdf', ''))
+        texts = load_document_texts(doc_output_dir) if os.path.exists(doc_output_dir) else ()
+        if texts:
+            batch_retrieved = retrieve_batch(texts, [it["question"] for it in items], top_k=5)
+        else:
+            batch_retrieved = [None] * len(items)
+        
+        for idx, item, retrieved_texts in zip(indices, items, batch_retrieved):
+            result = process_single_item(item, retrieved_texts)
+            if result:
+                results[idx] = {
+                    'id': item.get('id'),
+                    'question': item['question'],
+                    'options': item['options'],
+                    'model_answer': result, 
+                    'document': item['document']
+                }
+    results = [result for result in results if result is not None]
     
     # 保存结果
     with open('pipeline_results.json', 'w', encoding='utf-8') as f:
@@ -1,24 +1,28 @@
 import os
 import json
 import re
-import glob
-from vector_utils import load_texts_from_output, retrieve
+import functools
+from vector_utils import get_or_build_index, retrieve
+
+# 页码提取正则：合并为单个交替式，一次扫描即可（“页”用前瞻匹配，不消耗字符，避免漏掉紧随其后的“页码”）
+PAGE_PATTERN = re.compile(r'第(\d+)(?=页)|页码(\d+)|(\d+)(?=页)')
 
 def extract_page_numbers(question):
     """从问题中提取页码信息"""
-    page_patterns = [
-        r'第(\d+)页',
-        r'第(\d+)页的',
-        r'页码(\d+)',
-        r'(\d+)页'
-    ]
-    
-    pages = []
-    for pattern in page_patterns:
-        matches = re.findall(pattern, question)
-        pages.extend([int(match) for match in matches])
+    pages = {int(num) for groups in PAGE_PATTERN.findall(question) for num in groups if num}
     
-    return list(set(pages))  # 去重
+    return list(pages)  # 去重
+
+@functools.lru_cache(maxsize=128)
+def load_document_texts(doc_output_dir):
+    """按文档缓存已加载的文本，同一文档的多个问题只读取一次（返回不可变元组）；同时备好该文档的向量索引"""
+    texts, _ = get_or_build_index(doc_output_dir)
+    return texts
+
+@functools.lru_cache(maxsize=128)
+def list_png_files(doc_output_dir):
+    """按文档缓存输出目录中的 png 文件名，只扫描一次目录"""
+    return tuple(entry.name for entry in os.scandir(doc_output_dir) if entry.name.endswith('.png'))
 
 def find_figure_files(doc_output_dir, pages):
     """根据页码查找对应的图表文件"""
@@ -27,11 +31,11 @@ def find_figure_files(doc_output_dir, pages):
     if not pages:
         return figure_files
     
+    png_files = list_png_files(doc_output_dir)
     for page_num in pages:
-        # 查找包含指定页码的图表文件
-        pattern = os.path.join(doc_output_dir, f"*page{page_num}*.png")
-        files = glob.glob(pattern)
-        figure_files.extend(files)
+        # 查找包含指定页码的图表文件（等价于 *page{page_num}*.png）
+        marker = f"page{page_num}"
+        figure_files.extend(os.path.join(doc_output_dir, name) for name in png_files if marker in name)
     
     return figure_files
 
@@ -58,7 +62,7 @@ def test_single_document(doc_name, question, top_k=3):
     
     # 加载文本
     print("📚 正在加载文本...")
-    texts = load_texts_from_output(doc_output_dir)
+    texts = load_document_texts(doc_output_dir)
     
     if not texts:
         print("❌ 错误: 未找到文本内容")
@@ -1,12 +1,142 @@
 import faiss
 import os
+import functools
+import pickle
+import numpy as np
+import torch
+from collections import OrderedDict
 from sentence_transformers import SentenceTransformer
 
+# CPU 编码线程数（可用环境变量 ST_NUM_THREADS 覆盖）；容器内 PyTorch 默认线程数常常偏小。
+# 只在首次加载模型时设置（见 set_encode_threads），导入本模块不改动进程的环境变量与线程配置
+ENCODE_THREADS = int(os.environ.get('ST_NUM_THREADS', os.cpu_count() or 1))
+
 # 推荐的中文编码模型（按优先级排序）
 MODEL_PATH = r"/workspace/no1/model/text2vec-base-chinese"  
 
-# 初始化模型
-model = SentenceTransformer(MODEL_PATH)
+# 编码批大小（SentenceTransformer.encode 内部已按文本长度排序分批再还原顺序，批内填充很少）
+ENCODE_BATCH_SIZE = 64
+
+# 无 GPU 时用 ONNX Runtime 推理（需 sentence-transformers>=3.2 与 optimum[onnxruntime]；
+# 模型目录下没有 onnx/model.onnx 时首次加载会自动导出），不满足条件时回退到 PyTorch
+USE_ONNX_ON_CPU = True
+
+# GPU 上用 torch.compile 编译 transformer（PyTorch>=2.0；默认模式，不用 CUDA Graph，dynamic=True 使不同句长不触发重新编译），
+# 加载模型时预热编译，编译失败则回退到未编译的模型
+USE_TORCH_COMPILE = True
+
+# GPU 编码时把分词结果放在锁页内存中并异步拷到显存（non_blocking），拷贝走 DMA、不阻塞主机线程
+PIN_TOKEN_MEMORY = True
+
+
+def use_fused_attention(st_model):
+    """
+    PyTorch 推理时把 transformer 换成 BetterTransformer（融合的 scaled_dot_product_attention，跳过填充位置）
+
+    需要 optimum；新版 transformers 已默认使用 SDPA 并移除了该转换，此时保持原样
+    """
+    transformer = st_model[0]
+    try:
+        transformer.auto_model = transformer.auto_model.to_bettertransformer()
+    except (AttributeError, ImportError, ValueError, NotImplementedError) as e:
+        print(f"⚠️ 未启用 BetterTransformer: {e}")
+
+
+def compile_encoder(st_model):
+    """用 torch.compile 编译 transformer，并编码一句预热（编译发生在首次前向）；任一步失败时恢复未编译的模型"""
+    transformer = st_model[0]
+    eager_model = transformer.auto_model
+    try:
+        transformer.auto_model = torch.compile(eager_model, mode="default", dynamic=True)
+        st_model.encode(["预热"], show_progress_bar=False)
+        return True
+    except Exception as e:  # 编译器报错类型随 PyTorch 版本与后端而变
+        transformer.auto_model = eager_model
+        print(f"⚠️ torch.compile 编译失败，使用未编译的模型: {e}")
+        return False
+
+
+def pin_tokenized_batches(st_model):
+    """
+    包装首个模块的 tokenize：返回的张量移入锁页内存后以 non_blocking 异步拷到模型所在 GPU
+
+    encode 随后的 batch_to_device 见张量已在目标设备上，不再做同步拷贝
+    """
+    transformer = st_model[0]
+    tokenize = transformer.tokenize
+    device = st_model.device
+
+    def tokenize_pinned(*args, **kwargs):
+        features = tokenize(*args, **kwargs)
+        return {key: value.pin_memory().to(device, non_blocking=True) if isinstance(value, torch.Tensor) else value
+                for key, value in features.items()}
+
+    transformer.tokenize = tokenize_pinned
+
+
+def set_encode_threads():
+    """按 ENCODE_THREADS 设置 PyTorch 的算子内/算子间线程数"""
+    torch.set_num_threads(ENCODE_THREADS)
+    try:
+        torch.set_num_interop_threads(max(1, ENCODE_THREADS // 4))
+    except RuntimeError:
+        pass  # 其他模块已先启动过 PyTorch 的并行任务，算子间线程数不能再改
+
+
+@functools.lru_cache(maxsize=1)
+def get_model():
+    """
+    返回编码模型，首次调用时才加载（只导入本模块、不做检索的脚本不必加载模型）
+
+    CPU 上优先 ONNX 后端；GPU 上用 PyTorch 并转为半精度，显存带宽减半并可使用 Tensor Core
+    """
+    set_encode_threads()
+    if torch.cuda.is_available():
+        gpu_model = SentenceTransformer(MODEL_PATH)
+        gpu_model.half()
+        # 编译后的图本身融合注意力算子，不再叠加 BetterTransformer 转换
+        if not (USE_TORCH_COMPILE and hasattr(torch, "compile") and compile_encoder(gpu_model)):
+            use_fused_attention(gpu_model)
+        if PIN_TOKEN_MEMORY:
+            pin_tokenized_batches(gpu_model)
+        return gpu_model
+    if USE_ONNX_ON_CPU:
+        try:
+            return SentenceTransformer(MODEL_PATH, backend="onnx")
+        except (TypeError, ImportError, ValueError, OSError) as e:
+            print(f"⚠️ ONNX 后端不可用，使用 PyTorch 推理: {e}")
+    cpu_model = SentenceTransformer(MODEL_PATH)
+    use_fused_attention(cpu_model)
+    return cpu_model
+
+
+# 已建索引的内存缓存：文本元组 -> (index, embeddings)，同一文档的后续检索不再重新编码（LRU，最多 INDEX_CACHE_SIZE 份）
+INDEX_CACHE_SIZE = 16
+_index_cache = OrderedDict()
+
+# 文本条数超过 HNSW_MIN_TEXTS 时改用 HNSW 图索引（近似检索），条数少时暴力检索更快也更准
+HNSW_MIN_TEXTS = 2000
+HNSW_M = 32  # 每个节点的邻居数
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64  # 检索时的候选队列长度，随索引一起持久化
+
+# 小语料且 top_k 不大时，在 CPU 上直接用 numpy 计算内积并取前 k（精确结果，省去 FAISS 的检索调度开销）
+DIRECT_TOPK_MAX_TEXTS = HNSW_MIN_TEXTS
+DIRECT_TOPK_MAX_K = 16
+
+# CUDA 可用时把检索用的索引复制到 GPU（持久化与 build_faiss_index 返回的仍是 CPU 索引）
+USE_GPU_INDEX = True
+_gpu_resources = None  # StandardGpuResources 单例，各索引共用一份显存工作区
+
+# 大语料（超过 HNSW_MIN_TEXTS 条）在 GPU 上改用 cuVS 的 CAGRA 图索引检索；faiss 未编译 cuVS 时仍用 CPU 上的 HNSW
+USE_CUVS_INDEX = True
+
+# 文档输出目录下持久化索引的位置（与 batch_process.build_vector_index 的保存格式一致）
+INDEX_DIR_NAME = "vector_index"
+INDEX_SOURCE_FILE = "source_key.txt"  # 索引对应的 final_text.txt 标识，见 index_source_key
+
+# 持久化的向量矩阵以半精度保存（单位向量的分量在 [-1, 1]，半精度足以保持检索排序），文件与读取量减半
+EMBEDDINGS_DISK_DTYPE = np.float16
 
 
 def load_texts_from_output(output_dir):
@@ -14,21 +144,199 @@ def load_texts_from_output(output_dir):
     text_path = os.path.join(output_dir, 'final_text.txt')
     if not os.path.exists(text_path):
         return []
-    with open(text_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip()]
-    return lines
+    # 整个文件一次读入并整体解码，换行统一为 \n 后切分；去空白与滤空行用 map/filter 在 C 层完成，没有逐行的解释器循环
+    # （mmap 对象没有 splitlines，仍需整体拷贝，直接 read 即可）
+    with open(text_path, 'rb') as f:
+        text = f.read().decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return list(filter(None, map(str.strip, text.split('\n'))))
+
+def encode_texts(texts):
+    """将文本编码为归一化的 float32 向量矩阵（半精度模型的输出也转为 float32，供 FAISS 使用）"""
+    embeddings = get_model().encode(texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False,
+                              convert_to_numpy=True, normalize_embeddings=True)
+    return embeddings.astype(np.float32, copy=False)
 
 def build_faiss_index(texts):
-    """构建FAISS索引"""
-    embeddings = model.encode(texts, show_progress_bar=False)
-    index = faiss.IndexFlatL2(embeddings.shape[1])
+    """
+    构建FAISS索引：向量归一化为单位长度后用内积检索，即余弦相似度（内积核比 L2 少算范数项）
+
+    文本不超过 HNSW_MIN_TEXTS 条时为暴力检索的 IndexFlatIP（无需训练，检索时 retrieve_batch 多半直接用
+    numpy 计算内积，索引主要用于持久化），更多时为 IndexHNSWFlat
+    """
+    # 重复的文本行只编码一次，再按原顺序展开，索引行号仍与 texts 一一对应
+    positions = {}
+    inverse = np.fromiter((positions.setdefault(text, len(positions)) for text in texts), dtype=np.intp, count=len(texts))
+    unique_embeddings = encode_texts(list(positions))
+    embeddings = unique_embeddings if len(positions) == len(texts) else unique_embeddings[inverse]
+    if len(texts) > HNSW_MIN_TEXTS:
+        index = faiss.IndexHNSWFlat(embeddings.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        index = faiss.IndexFlatIP(embeddings.shape[1])
     index.add(embeddings)
     return index, embeddings
 
-def retrieve(texts, question, top_k=3):
-    """根据问题检索相关文本"""
-    index, _ = build_faiss_index(texts)
-    query_vec = model.encode([question])
-    distances, indices = index.search(query_vec, top_k)
-    results = [texts[i] for i in indices[0]]
+def to_search_index(index, embeddings):
+    """
+    返回用于检索的索引：有 GPU 且 faiss 带 GPU 支持时，暴力检索索引由向量重建为 GPU 上的 float32 内积索引，
+    HNSW 索引在 faiss 带 cuVS 时由向量重建为 GPU 上的 CAGRA 索引；否则原样返回
+    """
+    global _gpu_resources
+    if not USE_GPU_INDEX or not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+        return index
+    if _gpu_resources is None:
+        _gpu_resources = faiss.StandardGpuResources()
+    if not isinstance(index, faiss.IndexHNSW):
+        # 暴力检索索引（含旧版本保存的标量量化索引）在 GPU 上直接由原始向量重建
+        gpu_index = faiss.GpuIndexFlatIP(_gpu_resources, embeddings.shape[1])
+        gpu_index.add(np.asarray(embeddings, dtype=np.float32))
+        return gpu_index
+    # HNSW 没有 GPU 实现：能用 CAGRA 时在 GPU 上建图，否则留在 CPU 上检索
+    if not USE_CUVS_INDEX or not hasattr(faiss, "GpuIndexCagra"):
+        return index
+    try:
+        cagra_index = faiss.GpuIndexCagra(_gpu_resources, embeddings.shape[1], faiss.METRIC_INNER_PRODUCT,
+                                          faiss.GpuIndexCagraConfig())
+        cagra_index.train(np.asarray(embeddings, dtype=np.float32))  # CAGRA 在 train 中由全部向量建图
+        return cagra_index
+    except RuntimeError as e:
+        print(f"⚠️ CAGRA 索引建立失败，使用 CPU 上的 HNSW 索引: {e}")
+        return index
+
+def _cache_index(key, entry):
+    """放入索引缓存，超出 INDEX_CACHE_SIZE 时淘汰最久未用的一份"""
+    _index_cache[key] = entry
+    _index_cache.move_to_end(key)
+    if len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+
+def get_index(texts):
+    """返回文本对应的 (index, embeddings)，相同文本只编码、建索引一次"""
+    key = tuple(texts)
+    entry = _index_cache.get(key)
+    if entry is not None:
+        _index_cache.move_to_end(key)
+        return entry
+    index, embeddings = build_faiss_index(list(key))
+    entry = (to_search_index(index, embeddings), embeddings)
+    _cache_index(key, entry)
+    return entry
+
+def save_embeddings(path, embeddings):
+    """以 EMBEDDINGS_DISK_DTYPE 保存向量矩阵"""
+    np.save(path, np.asarray(embeddings).astype(EMBEDDINGS_DISK_DTYPE, copy=False))
+
+def load_embeddings(path):
+    """以内存映射方式读取保存的半精度向量矩阵，不整体转回 float32（用到时再按需转换，见 topk_by_dot、to_search_index）"""
+    return np.load(path, mmap_mode='r')
+
+def index_source_key(output_dir):
+    """持久化索引的有效性标识：final_text.txt 的修改时间（纳秒）与大小，文本重新生成后随之变化"""
+    st = os.stat(os.path.join(output_dir, 'final_text.txt'))
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def mark_index_source(output_dir):
+    """索引文件全部写完后记录其对应的文本标识（最后写入，保存中断时索引按过期处理）"""
+    with open(os.path.join(output_dir, INDEX_DIR_NAME, INDEX_SOURCE_FILE), 'w', encoding='utf-8') as f:
+        f.write(index_source_key(output_dir))
+
+def read_index_mapped(index_path):
+    """以内存映射方式读取索引（不支持映射的索引类型按普通方式读取）"""
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(index_path)
+
+def get_or_build_index(output_dir):
+    """
+    加载文档文本并准备好索引：优先读取输出目录中已持久化的索引（文本标识一致且条数一致，
+    索引与半精度向量都以内存映射方式打开），否则编码建索引并写回磁盘，之后的进程直接读取、不再编码
+
+    Returns:
+        tuple: (文本元组, index)，没有文本时 index 为 None
+    """
+    texts = tuple(load_texts_from_output(output_dir))
+    if not texts:
+        return texts, None
+    entry = _index_cache.get(texts)
+    if entry is not None:
+        _index_cache.move_to_end(texts)
+        return texts, entry[0]
+
+    index_dir = os.path.join(output_dir, INDEX_DIR_NAME)
+    index_path = os.path.join(index_dir, "faiss.index")
+    embeddings_path = os.path.join(index_dir, "embeddings.npy")
+    entry = None
+    try:
+        with open(os.path.join(index_dir, INDEX_SOURCE_FILE), 'r', encoding='utf-8') as f:
+            saved_key = f.read()
+        if saved_key == index_source_key(output_dir):
+            index = read_index_mapped(index_path)
+            # 旧版本保存的 L2 索引不能与归一化的查询向量混用，按过期处理
+            if index.ntotal == len(texts) and index.metric_type == faiss.METRIC_INNER_PRODUCT:
+                entry = (index, load_embeddings(embeddings_path))
+    except (OSError, RuntimeError):
+        entry = None
+
+    if entry is None:
+        entry = build_faiss_index(list(texts))
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            faiss.write_index(entry[0], index_path)
+            save_embeddings(embeddings_path, entry[1])
+            with open(os.path.join(index_dir, "texts.pkl"), 'wb') as f:
+                pickle.dump(list(texts), f)
+            mark_index_source(output_dir)
+        except (OSError, RuntimeError) as e:
+            print(f"⚠️ 向量索引保存失败: {e}")
+
+    entry = (to_search_index(entry[0], entry[1]), entry[1])
+    _cache_index(texts, entry)
+    return texts, entry[0]
+
+def topk_by_dot(query_vecs, embeddings, top_k):
+    """
+    按内积取每个问题的前 top_k 个文本下标（按得分降序）
+
+    argpartition 只做部分排序（O(n)），再对选出的 k 个排序；半精度向量在此按需转为 float32 计算
+    """
+    scores = query_vecs @ np.asarray(embeddings, dtype=np.float32).T
+    k = min(top_k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+def retrieve(texts, questions, top_k=3):
+    """
+    根据问题检索相关文本
+
+    Args:
+        texts: 文本列表/元组
+        questions: 单个问题（str）或问题列表，多个问题一次编码、一次检索
+        top_k: 每个问题返回的文本数
+
+    Returns:
+        单个问题时为相关文本列表，问题列表时为每个问题的相关文本列表
+    """
+    if isinstance(questions, str):
+        return retrieve_batch(texts, [questions], top_k)[0]
+    return retrieve_batch(texts, questions, top_k)
+
+def retrieve_batch(texts, questions, top_k=3):
+    """根据多个问题批量检索相关文本：文本只建一次索引，所有问题一次编码、一次检索"""
+    index, embeddings = get_index(texts)
+    query_vecs = encode_texts(list(questions))
+    # 小语料在 CPU 上直接算内积（不超过 HNSW_MIN_TEXTS 条，本就是暴力检索）；已放到 GPU 上的索引仍交给 FAISS
+    on_gpu = hasattr(faiss, "GpuIndex") and isinstance(index, faiss.GpuIndex)
+    if len(texts) <= DIRECT_TOPK_MAX_TEXTS and top_k <= DIRECT_TOPK_MAX_K and not on_gpu:
+        indices = topk_by_dot(query_vecs, embeddings, top_k)
+    else:
+        scores, indices = index.search(query_vecs, top_k)
+    # 文本不足 top_k 条时 FAISS 以 -1 补位，不能当作下标
+    results = [[texts[i] for i in row if i >= 0] for row in indices.tolist()]
     return results